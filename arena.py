@@ -0,0 +1,189 @@
+"""
+Arena - many battles resolved concurrently in a single process with asyncio
+
+Duels are submitted to a bounded queue and fought by a pool of worker tasks. A worker fights a few rounds of its
+duel and yields to the event loop, so thousands of duels interleave and none of them holds the loop for long.
+Round events (plain dicts, as RecordingHerald makes them) are streamed to subscribers through bounded queues:
+
+    async with Arena() as arena:
+        duel = await arena.submit(attacker, defender, seed)
+        async for event in duel.subscribe():  # subscribe before awaiting anything else to get every event
+            ...
+        battle = await duel
+
+Backpressure works on both ends: submit() waits while the arena's queue is full and a duel waits for its slowest
+subscriber to make room for more events - for up to 'subscriber_timeout' seconds, then the subscriber is dropped.
+Duels fight copies of the warriors submitted, so one warrior may take part in many duels at once.
+"""
+
+import asyncio
+
+from herald import Herald, RecordingHerald
+from profiling import ProfilingHerald
+from warriors import Battle
+
+
+class Subscription(object):
+    """
+    Has: queue, closed
+    Async iterator of a duel's events, ends when the duel does
+    """
+
+    def __init__(self, maxsize):
+        super(Subscription, self).__init__()
+        self.queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):  # returns event dict
+        if self.closed and self.queue.empty():
+            raise StopAsyncIteration
+        event = await self.queue.get()
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+
+class Duel(object):
+    """
+    Has: battle, herald, result, subscriptions, subscriber_timeout
+    Awaiting a duel returns its commenced Battle (or raises whatever the battle raised)
+    The battle is fought by copies of the warriors, the ones passed in are never changed
+    Events are recorded by 'herald' only while somebody is subscribed, the battle stays headless otherwise
+    """
+
+    def __init__(self, attacker, defender, seed=None, keep_rounds=0, subscriber_timeout=1.0):
+        super(Duel, self).__init__()
+        self.herald = RecordingHerald()
+        self.battle = Battle(attacker.copy(), defender.copy(), Herald(), seed, keep_rounds)
+        self.subscriber_timeout = subscriber_timeout
+        self.result = asyncio.get_running_loop().create_future()
+        self.subscriptions = []
+
+    def __await__(self):
+        return asyncio.shield(self.result).__await__()
+
+    def subscribe(self, maxsize=100):  # returns Subscription
+        subscription = Subscription(maxsize)
+        self.subscriptions.append(subscription)
+        return subscription
+
+    async def publish(self):
+        """
+        Passes the events announced since the last call to all subscribers
+        A subscriber that doesn't make room for an event within 'subscriber_timeout' seconds is dropped
+        """
+        if not self.subscriptions:
+            return
+        events = self.herald.events
+        self.herald.events = []
+        for subscription in list(self.subscriptions):
+            try:
+                for event in events:
+                    await asyncio.wait_for(subscription.queue.put(event), self.subscriber_timeout)
+            except asyncio.TimeoutError:
+                self.subscriptions.remove(subscription)
+                end(subscription)
+
+    def announce(self):
+        """Starts recording events once somebody subscribes, inside any wrapper (like ProfilingHerald) of the herald"""
+        if not self.subscriptions:
+            return
+        owner = self.battle
+        while isinstance(owner.herald, ProfilingHerald):
+            owner = owner.herald
+        if owner.herald is not self.herald:
+            owner.herald = self.herald
+
+    def close(self):
+        """Ends all subscriptions"""
+        for subscription in self.subscriptions:
+            end(subscription)
+
+    async def fight(self, rounds_per_slice=4):
+        try:
+            self.announce()
+            self.battle.resolve_initiative()
+            await self.publish()
+            while not self.battle.finished:
+                self.announce()
+                for _ in range(rounds_per_slice):
+                    self.battle.fight_round()
+                    if self.battle.finished:
+                        break
+                await self.publish()
+                await asyncio.sleep(0)  # let other duels fight
+        except asyncio.CancelledError:
+            self.result.cancel()
+            raise
+        except Exception as error:
+            self.result.set_exception(error)
+        else:
+            self.result.set_result(self.battle)
+        finally:
+            self.close()
+
+
+def end(subscription):
+    """Ends a subscription without waiting for it (a full queue ends once it's drained)"""
+    subscription.closed = True
+    if not subscription.queue.full():
+        subscription.queue.put_nowait(None)
+
+
+class Arena(object):
+    """
+    Has: queue, workers, rounds_per_slice
+    'workers' tasks fight duels concurrently, every one of them yields to the event loop after 'rounds_per_slice'
+    rounds. At most 'max_pending' submitted duels wait for a worker, a duel's subscriber is dropped after it doesn't
+    take an event for 'subscriber_timeout' seconds
+    """
+
+    def __init__(self, workers=1000, max_pending=1000, rounds_per_slice=4, subscriber_timeout=1.0):
+        super(Arena, self).__init__()
+        self.workers_count = workers
+        self.max_pending = max_pending
+        self.rounds_per_slice = rounds_per_slice
+        self.subscriber_timeout = subscriber_timeout
+        self.queue = None
+        self.workers = []
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            await self.queue.join()
+        await self.stop()
+
+    def start(self):
+        self.queue = asyncio.Queue(self.max_pending)
+        self.workers = [asyncio.create_task(self.work()) for _ in range(self.workers_count)]
+
+    async def stop(self):
+        """Stops workers right away, duels that weren't fought yet are cancelled"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        while not self.queue.empty():
+            duel = self.queue.get_nowait()
+            duel.result.cancel()
+            duel.close()
+
+    async def submit(self, attacker, defender, seed=None, keep_rounds=0):  # returns Duel
+        """Queues a battle, waits while the queue is full"""
+        duel = Duel(attacker, defender, seed, keep_rounds, self.subscriber_timeout)
+        await self.queue.put(duel)
+        return duel
+
+    async def work(self):
+        while True:
+            duel = await self.queue.get()
+            try:
+                await duel.fight(self.rounds_per_slice)
+            finally:
+                self.queue.task_done()
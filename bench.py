@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks of battle simulation throughput and latency
+
+Covers whole battles (Battle.commence()) for representative loadouts, single phases, item data loading and
+herald rendering. Results can be saved as a baseline and later runs compared against it to catch regressions:
+
+    python bench.py --save          # run and save results as the baseline
+    python bench.py --compare       # run and fail if anything got slower than the baseline allows
+    python bench.py --check-import  # fail if importing warriors is over its budget or loads deferred modules
+
+The committed benchmarks/baseline.json was saved with the default settings on the maintainers' machine - timings
+elsewhere differ, so save a baseline of your own (--save, or --baseline for another file) before comparing.
+Without any baseline, --compare saves this run as the baseline and skips the comparison.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import items
+import profiling
+from herald import Herald, TextHerald, TemplateHerald, FULL, SUMMARY, WINNER
+from phases import Attack, Parry, DamageDealt
+from dice import Dice
+from warriors import Battle
+from tournament import build_warrior as build_loadout_warrior
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baseline.json")
+TOLERANCE = 0.25  # a benchmark more than 25% slower than its baseline is a regression
+IMPORT_BUDGET_MS = 40.0  # importing warriors in a fresh interpreter (on top of the interpreter's own startup)
+DEFERRED_MODULES = ("json", "pickle", "hashlib", "copy", "contextlib", "sqlite3", "asyncio", "concurrent.futures",
+                    "numpy")  # must not be imported by 'import warriors', only on first use
+
+LOADOUTS = {
+    "sword-and-board": ("Longsword", None, "Tower Shield", "Chainmail"),
+    "dual wield": ("Longsword", "Short Sword", None, "Chainmail"),
+    "bare hand": ("Bare Hand", None, None, "Adventurer's Garb"),
+}
+MATCHUPS = (
+    ("sword-and-board", "dual wield"),
+    ("dual wield", "dual wield"),
+    ("bare hand", "bare hand"),
+)
+
+
+def build_warrior(name, loadout, herald=None):  # returns Warrior
+    return build_loadout_warrior(name, LOADOUTS[loadout], herald)
+
+
+def percentile(values, fraction):  # returns value at 'fraction' of sorted values
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def bench_battles(first, second, fights, seed=0):  # returns dict of metrics
+    herald = Herald()
+    latencies = []
+    rounds = 0
+    started = time.perf_counter()
+    for index in range(fights):
+        battle = Battle(build_warrior("first", first, herald), build_warrior("second", second, herald), herald,
+                        seed + index, keep_rounds=0)
+        battle_started = time.perf_counter()
+        battle.commence()
+        latencies.append(time.perf_counter() - battle_started)
+        rounds += battle.rounds_count
+    elapsed = time.perf_counter() - started
+
+    # memory is measured in a separate run - tracing slows everything down considerably
+    tracemalloc.start()
+    for index in range(max(1, fights // 10)):
+        Battle(build_warrior("first", first, herald), build_warrior("second", second, herald), herald,
+               seed + index, keep_rounds=0).commence()
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "fights_per_sec": fights / elapsed,
+        "rounds_per_sec": rounds / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_memory_kb": peak_memory / 1024
+    }
+
+
+def bench_calls(function, repeats, runs=5):  # returns dict of metrics
+    """Times 'repeats' calls of 'function', the best of 'runs' runs counts (like timeit does)"""
+    elapsed = float("inf")
+    for _ in range(runs):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            function()
+        elapsed = min(elapsed, time.perf_counter() - started)
+    return {"calls_per_sec": repeats / elapsed, "us_per_call": elapsed / repeats * 1000000}
+
+
+def bench_phases(repeats):  # returns dict of benchmark name to metrics
+    dice = Dice(0)
+    attacker = build_warrior("attacker", "dual wield")
+    defender = build_warrior("defender", "dual wield")
+    parry = Parry(attacker, defender, 5, dice=dice)
+    dmg_dealt = DamageDealt(attacker, defender, 5, attacker.inventory.weapon, dice=dice)
+
+    def attack():
+        attacker.health = defender.health = 30
+        Attack(attacker, defender, dice=dice)
+
+    return {
+        "phase: Attack": bench_calls(attack, repeats),
+        "phase: Parry.calculate_parrying_bonus": bench_calls(parry.calculate_parrying_bonus, repeats),
+        "phase: DamageDealt.calculate_dmg_factors": bench_calls(dmg_dealt.calculate_dmg_factors, repeats)
+    }
+
+
+def bench_item_loading(repeats):  # returns dict of benchmark name to metrics
+    return {
+        "items: parse item data": bench_calls(lambda: items.load_catalog(cache=False), repeats),
+        "items: load cached snapshot": bench_calls(items.load_catalog, repeats)
+    }
+
+
+def bench_herald(fights):  # returns dict of benchmark name to metrics
+    output = io.StringIO()
+    text_herald = TextHerald()
+    lines = 0
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(output):
+        for seed in range(fights):
+            Battle(build_warrior("first", "dual wield", text_herald), build_warrior("second", "sword-and-board", text_herald),
+                   text_herald, seed, keep_rounds=0).commence()
+            lines += output.getvalue().count("\n")
+            output.seek(0)
+            output.truncate()
+    elapsed = time.perf_counter() - started
+    results = {"herald: full text": {"fights_per_sec": fights / elapsed, "lines_per_sec": lines / elapsed}}
+
+    for name, verbosity in (("full", FULL), ("summary", SUMMARY), ("winner", WINNER)):
+        output = io.StringIO()
+        template_herald = TemplateHerald(output, verbosity)
+        started = time.perf_counter()
+        for seed in range(fights):
+            Battle(build_warrior("first", "dual wield", template_herald),
+                   build_warrior("second", "sword-and-board", template_herald), template_herald, seed,
+                   keep_rounds=0).commence()
+        elapsed = time.perf_counter() - started
+        lines = output.getvalue().count("\n")
+        results["herald: templated " + name] = {"fights_per_sec": fights / elapsed, "lines_per_sec": lines / elapsed}
+    return results
+
+
+def import_time_ms(module="warriors"):  # returns float
+    """Cumulative import time of 'module' in a fresh interpreter, as reported by -X importtime"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", "import " + module],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+    for line in completed.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1000
+    raise ValueError("No import time reported for " + module)
+
+
+def eager_modules(module="warriors"):  # returns list of DEFERRED_MODULES imported along with 'module'
+    code = "import sys, {}; print(' '.join(name for name in {!r} if name in sys.modules))".format(module, DEFERRED_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                               capture_output=True, text=True, check=True)
+    return completed.stdout.split()
+
+
+def bench_import(repeats=5):  # returns dict of benchmark name to metrics
+    return {"import: warriors": {"import_ms": min(import_time_ms() for _ in range(repeats))}}
+
+
+def check_import(budget=IMPORT_BUDGET_MS, repeats=5):  # returns list of problem descriptions
+    """Enforces the import budget: 'import warriors' must fit in 'budget' ms and must not load DEFERRED_MODULES"""
+    problems = ["import warriors loads {} eagerly".format(name) for name in eager_modules()]
+    elapsed = bench_import(repeats)["import: warriors"]["import_ms"]
+    if elapsed > budget:
+        problems.append("import warriors takes {:.1f} ms, the budget is {:.1f} ms".format(elapsed, budget))
+    return problems
+
+
+def profile(fights):  # returns profiling.Profiler
+    """Where the time of whole battles goes, by phase, roll and herald call"""
+    profiler = profiling.Profiler()
+    text_herald = TextHerald()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in range(fights):
+            Battle(build_warrior("first", "dual wield", text_herald), build_warrior("second", "sword-and-board", text_herald),
+                   text_herald, seed, keep_rounds=0, profiler=profiler).commence()
+    return profiler
+
+
+def run(fights=200, repeats=20000):  # returns dict of benchmark name to metrics
+    results = {}
+    for first, second in MATCHUPS:
+        results["battle: {} vs {}".format(first, second)] = bench_battles(first, second, fights)
+    results.update(bench_phases(repeats))
+    results.update(bench_item_loading(max(1, repeats // 100)))
+    results.update(bench_herald(max(1, fights // 10)))
+    results.update(bench_import())
+    return results
+
+
+# for every metric: True if higher is better
+HIGHER_IS_BETTER = {
+    "fights_per_sec": True,
+    "rounds_per_sec": True,
+    "calls_per_sec": True,
+    "lines_per_sec": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "us_per_call": False,
+    "import_ms": False,
+    "peak_memory_kb": False
+}
+
+
+def compare(results, baseline, tolerance=TOLERANCE):  # returns list of regression descriptions
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            base = baseline.get(name, {}).get(metric)
+            if not base:
+                continue
+            change = value / base - 1 if HIGHER_IS_BETTER[metric] else base / value - 1
+            if change < -tolerance:
+                regressions.append("{} / {}: {:.3f} vs baseline {:.3f} ({:+.0%})".format(name, metric, value, base, change))
+    return regressions
+
+
+def report(results):
+    for name, metrics in results.items():
+        print("{:<45} {}".format(name, ", ".join("{}: {:.2f}".format(metric, value) for metric, value in metrics.items())))
+
+
+def main():
+    """Runs benchmarks, optionally saving or comparing against a baseline"""
+    parser = argparse.ArgumentParser(description="Benchmark battle simulation")
+    parser.add_argument("--fights", type=int, default=200, help="battles per matchup")
+    parser.add_argument("--repeats", type=int, default=20000, help="calls per phase benchmark")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file")
+    parser.add_argument("--save", action="store_true", help="save results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare results against the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed slowdown (fraction)")
+    parser.add_argument("--profile", metavar="PATH", help="profile battles instead, dump the profile to a JSON file")
+    parser.add_argument("--check-import", action="store_true", help="only check the import budget of warriors")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS, help="import budget (ms)")
+    args = parser.parse_args()
+
+    if args.check_import:
+        problems = check_import(args.import_budget)
+        for problem in problems:
+            print("IMPORT BUDGET:", problem)
+        if problems:
+            sys.exit(1)
+        print("import warriors fits the budget of {:.1f} ms".format(args.import_budget))
+        return
+
+    if args.profile:
+        profiler = profile(args.fights)
+        print(profiler)
+        profiler.dump(args.profile)
+        return
+
+    results = run(args.fights, args.repeats)
+    report(results)
+
+    if args.compare and not os.path.exists(args.baseline):
+        print("No baseline at {} yet, saving this run as one instead of comparing".format(args.baseline))
+        args.save, args.compare = True, False
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=4, sort_keys=True)
+        print("Baseline saved to", args.baseline)
+
+    if args.compare:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
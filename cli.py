@@ -0,0 +1,268 @@
+"""
+Command-line entry point for bulk simulation jobs
+
+Warriors are given by item names from the catalog, either on the command line as NAME:ITEM+ITEM+... (weapons in
+the order main hand, off hand, then shield and armor in any order) or in a JSON/CSV file of many warriors:
+
+    JSON - a list of objects with "name", "weapon", "offhand_weapon", "shield", "armor" and optionally "health",
+           "offense", "defense" (a missing weapon or armor means Bare Hand or Adventurer's Garb, a missing
+           off-hand weapon or shield an empty slot)
+    CSV  - a header row with the same columns
+
+Every pair of warriors fights 'fights' battles, matchups are spread over worker processes and every one of them
+gets a seed derived from the job's seed and the pair, so results don't depend on the number of workers:
+
+    python cli.py -w "Dagobert:Longsword+Tower Shield+Chainmail" -w "Rogbar:Longsword+Short Sword+Chainmail" -n 1000
+    python cli.py --file warriors.csv --fights 500 --workers 8 --format json > results.json
+"""
+
+import argparse
+import csv
+import io
+import json
+import random
+import sys
+import time
+
+from herald import Herald, TemplateHerald, FULL, SUMMARY, WINNER
+from items import get_catalog
+from resultcache import SimulationResult
+from tournament import calculate_chunksize, create_executor, is_stalemate, matchup_seed, loadout_name
+from warriors import Warrior, Battle
+
+SLOTS = ("weapon", "offhand_weapon", "shield", "armor")
+STATS = ("health", "offense", "defense")
+VERBOSITIES = {"quiet": None, "winner": WINNER, "summary": SUMMARY, "full": FULL}
+FORMATS = ("text", "json", "csv")
+
+
+def parse_warrior(spec):  # returns warrior description dict
+    """Parses NAME:ITEM+ITEM+..., every item is looked up in the catalog to find its slot"""
+    catalog = get_catalog()
+    name, separator, items = spec.partition(":")
+    if not separator or not name:
+        raise ValueError("Warrior '{}' isn't in the NAME:ITEM+ITEM+... form".format(spec))
+    description = {"name": name}
+    for item in (item.strip() for item in items.split("+") if item.strip()):
+        if item in catalog.weapons:
+            slot = "weapon" if "weapon" not in description else "offhand_weapon"
+        elif item in catalog.shields:
+            slot = "shield"
+        elif item in catalog.armors:
+            slot = "armor"
+        else:
+            raise ValueError("Unknown item '{}' of warrior {}".format(item, name))
+        if slot in description:
+            raise ValueError("Warrior {} has more than one {}".format(name, slot.replace("_", " ")))
+        description[slot] = item
+    return description
+
+
+def read_warriors(path):  # returns list of warrior description dicts
+    with open(path, newline="") as warriors_file:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(warriors_file))
+        else:
+            rows = json.load(warriors_file)
+    descriptions = []
+    for row in rows:
+        description = {"name": row["name"]}
+        for slot in SLOTS:
+            if row.get(slot):
+                description[slot] = row[slot]
+        for stat in STATS:
+            if row.get(stat) not in (None, ""):
+                description[stat] = int(row[stat])
+        descriptions.append(description)
+    return descriptions
+
+
+def build_warrior(description, herald):  # returns Warrior
+    """A warrior made from a description, its gear goes through the Inventory setters so illegal loadouts raise"""
+    catalog = get_catalog()
+    warrior = Warrior(description["name"], herald=herald,
+                      **{stat: description[stat] for stat in STATS if stat in description})
+    if "weapon" in description:
+        warrior.inventory.weapon = catalog.weapons[description["weapon"]]
+    if "armor" in description:
+        warrior.inventory.armor = catalog.armors[description["armor"]]
+    if "offhand_weapon" in description:
+        warrior.inventory.offhand_weapon = catalog.weapons[description["offhand_weapon"]]
+    if "shield" in description:
+        warrior.inventory.shield = catalog.shields[description["shield"]]
+    return warrior
+
+
+def run_job(task):  # returns (first index, second index, first's wins, second's wins, rounds in total, text, outcomes)
+    """
+    Runs all battles of a single matchup, executed in a worker process
+    'text' holds the battles as the herald rendered them at the job's verbosity ("" when quiet), 'outcomes' rows
+    of every battle for resultstore.ResultStore.add() without the loadout ids (None unless 'record' is set)
+    """
+    first, second, first_description, second_description, fights, seed, verbosity, record = task
+    output = io.StringIO()
+    herald = Herald() if verbosity is None else TemplateHerald(output, verbosity)
+    first_warrior = build_warrior(first_description, Herald())
+    second_warrior = build_warrior(second_description, Herald())
+    if is_stalemate(first_warrior, second_warrior):
+        return first, second, 0, 0, 0, "", [] if record else None
+    seeds = random.Random(seed)
+    battle = Battle(first_warrior, second_warrior, herald, keep_rounds=0)
+    wins = [0, 0]
+    rounds = 0
+    outcomes = [] if record else None
+    for _ in range(fights):
+        battle.reset(seeds.getrandbits(64))
+        battle.commence()
+        winner = 0 if first_warrior.health > 0 else 1
+        wins[winner] += 1
+        rounds += battle.rounds_count
+        if record:
+            outcomes.append((winner, battle.rounds_count, first_warrior.health, second_warrior.health,
+                             battle.stats.damage.get(first_warrior, 0),
+                             battle.stats.damage.get(second_warrior, 0), battle.seed))
+    return first, second, wins[0], wins[1], rounds, output.getvalue(), outcomes
+
+
+def run_jobs(tasks, workers=None, shared_catalog=None):  # returns iterator of run_job() results
+    if workers == 1:
+        return map(run_job, tasks)
+    return run_parallel(tasks, workers, shared_catalog)
+
+
+def run_parallel(tasks, workers, shared_catalog):
+    with create_executor(workers, shared_catalog) as executor:
+        for result in executor.map(run_job, tasks, chunksize=calculate_chunksize(len(tasks), workers)):
+            yield result
+
+
+class Progress(object):
+    """
+    Has: total, done, fights, started
+    Keeps a single status line of matchups done and fights/sec on 'stream' (standard error if not given)
+    """
+
+    def __init__(self, total, stream=None, enabled=True):
+        super(Progress, self).__init__()
+        self.total = total
+        self.stream = sys.stderr if stream is None else stream
+        self.enabled = enabled
+        self.done = 0
+        self.fights = 0
+        self.started = time.perf_counter()
+
+    @property
+    def fights_per_sec(self):
+        elapsed = time.perf_counter() - self.started
+        return self.fights / elapsed if elapsed else 0.0
+
+    def add(self, fights):
+        self.done += 1
+        self.fights += fights
+        if self.enabled:
+            self.stream.write("\r{}/{} matchups, {} fights, {:.0f} fights/s".format(
+                self.done, self.total, self.fights, self.fights_per_sec))
+            self.stream.flush()
+
+    def finish(self):
+        if self.enabled:
+            self.stream.write("\n")
+        self.stream.write("{} fights in {:.2f} s, {:.0f} fights/s\n".format(
+            self.fights, time.perf_counter() - self.started, self.fights_per_sec))
+
+
+def describe_loadout(description):  # returns str
+    return loadout_name(tuple(description.get(slot) for slot in SLOTS)) or "bare hands"
+
+
+def write_results(results, descriptions, output_format, stream):
+    """Writes (first index, second index, SimulationResult) triples in 'output_format'"""
+    rows = [{"first": result.names[0], "second": result.names[1],
+             "first_loadout": describe_loadout(descriptions[first]),
+             "second_loadout": describe_loadout(descriptions[second]),
+             "battles": result.battles, "first_wins": result.wins[0], "second_wins": result.wins[1],
+             "mean_rounds": result.mean_rounds if result.battles else None}
+            for first, second, result in results]
+    if output_format == "json":
+        json.dump(rows, stream, indent=4)
+        stream.write("\n")
+    elif output_format == "csv":
+        writer = csv.DictWriter(stream, fieldnames=list(rows[0]) if rows else ["first", "second"])
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        for _, _, result in results:
+            stream.write((str(result) if result.battles else "{} vs {}: stalemate, not fought".format(*result.names))
+                         + "\n")
+
+
+def main(argv=None):
+    """
+    Runs every pair of the given warriors, writes results to the standard output and progress to standard error
+    Battles rendered at the chosen verbosity precede text results, JSON and CSV ones keep them on standard error
+    """
+    parser = argparse.ArgumentParser(description="Run bulk battle simulations between warriors")
+    parser.add_argument("-w", "--warrior", action="append", default=[], metavar="NAME:ITEM+ITEM",
+                        help="a warrior and his gear by item names, may be repeated")
+    parser.add_argument("-f", "--file", help="JSON or CSV file of warriors")
+    parser.add_argument("-n", "--fights", type=int, default=100, help="battles per matchup")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (all CPUs if omitted)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the whole job")
+    parser.add_argument("--format", choices=FORMATS, default="text", help="output format of results")
+    parser.add_argument("-v", "--verbosity", choices=list(VERBOSITIES), default="quiet",
+                        help="how much of every battle is written before the results (to standard error unless the "
+                             "format is text, so JSON or CSV output stays valid)")
+    parser.add_argument("--share-catalog", action="store_true",
+                        help="workers attach to one catalog in shared memory instead of loading their own")
+    parser.add_argument("--store", metavar="PATH", help="also append every battle to a result store (a directory)")
+    parser.add_argument("--no-progress", action="store_true", help="don't show the progress line")
+    args = parser.parse_args(argv)
+
+    try:
+        descriptions = [parse_warrior(spec) for spec in args.warrior]
+        if args.file:
+            descriptions += read_warriors(args.file)
+        warriors = [build_warrior(description, Herald()) for description in descriptions]
+    except (ValueError, KeyError, OSError) as error:
+        parser.error(str(error))
+    if len(descriptions) < 2:
+        parser.error("at least two warriors are needed")
+
+    verbosity = VERBOSITIES[args.verbosity]
+    battles_stream = sys.stdout if args.format == "text" else sys.stderr
+    tasks = [(first, second, descriptions[first], descriptions[second], args.fights,
+              matchup_seed(args.seed, first, second), verbosity, args.store is not None)
+             for first in range(len(descriptions)) for second in range(first + 1, len(descriptions))]
+    progress = Progress(len(tasks), enabled=not args.no_progress and sys.stderr.isatty())
+    results = []
+    store = None
+    if args.store is not None:
+        from resultstore import ResultStore
+        store = ResultStore(args.store)
+        loadout_ids = [store.loadout_id(warrior) for warrior in warriors]
+    shared_catalog = None
+    if args.share_catalog and args.workers != 1:
+        import sharedcatalog
+        shared_catalog = sharedcatalog.export()
+    try:
+        for first, second, first_wins, second_wins, rounds, text, outcomes in run_jobs(tasks, args.workers,
+                                                                                       shared_catalog):
+            battles_stream.write(text)
+            if store is not None:
+                for outcome in outcomes:
+                    store.add(loadout_ids[first], loadout_ids[second], *outcome)
+            results.append((first, second, SimulationResult(
+                (descriptions[first]["name"], descriptions[second]["name"]),
+                (first_wins, second_wins), first_wins + second_wins, rounds)))
+            progress.add(first_wins + second_wins)
+    finally:
+        if shared_catalog is not None:
+            shared_catalog.close()
+        if store is not None:
+            store.close()
+    write_results(results, descriptions, args.format, sys.stdout)
+    progress.finish()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Seedable source of rolls owned by a single battle
+
+Rolls are pre-drawn in blocks (d20 rolls and uniform floats for weapon damage) instead of calling
+random.randrange() for every single roll. The same seed always produces the same sequence of rolls,
+so a battle can be reproduced from its seed and the warriors it started with.
+"""
+
+import math
+import random
+
+D20 = range(1, 21)
+
+
+class Dice(object):
+    """
+    Has: seed, block_size
+    'seed' may be an int (or anything random.Random accepts), None for a fresh random seed or a numpy.random.Generator
+    A battle with a Generator can't be replayed from 'seed' - the Generator's own seed has to be kept by the caller
+    """
+
+    def __init__(self, seed=None, block_size=256):
+        super(Dice, self).__init__()
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.seed = seed
+        self.block_size = block_size
+        self._d20s = []
+        self._floats = []
+        if hasattr(seed, "integers"):  # numpy.random.Generator
+            self._generator = seed
+            self._random = None
+        else:
+            self._generator = None
+            self._random = random.Random(seed)
+
+    def d20(self):  # returns int
+        if not self._d20s:
+            if self._generator is not None:
+                self._d20s = self._generator.integers(1, 21, self.block_size).tolist()
+            else:
+                self._d20s = self._random.choices(D20, k=self.block_size)
+        return self._d20s.pop()
+
+    def roll(self, low, high):  # returns int from low to high inclusive
+        if not self._floats:
+            if self._generator is not None:
+                self._floats = self._generator.random(self.block_size).tolist()
+            else:
+                uniform = self._random.random
+                self._floats = [uniform() for _ in range(self.block_size)]
+        return low + math.floor(self._floats.pop() * (high - low + 1))
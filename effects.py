@@ -14,8 +14,94 @@ EFFECTS = {
 
 
 class Effect(object):
-    """Has name"""
+    """Has name, duration (in rounds, None if it lasts until discarded)"""
 
-    def __init__(self, name):
+    def __init__(self, name, duration=None):
         super(Effect, self).__init__()
         self.name = name
+        self.duration = duration
+
+
+# stat modifiers ("offense", "defense", "health" per round) an effect applies while it lasts, keyed by effect name
+# none of the effects changes any stat yet (MISS is meant to be -1 to DEFENSE per consecutive miss, see core_mechanics.md)
+MODIFIERS = {}
+STATS = ("offense", "defense", "health")
+
+
+class Effects(object):
+    """
+    Has: modifiers
+    A warrior's effects indexed by name, each effect lasts until discarded or for its 'duration' in rounds.
+    Iterates over effects in the order they were gained. Counting, looking up and discarding by name, as well as
+    the summed 'modifiers' of all effects (a dict keyed by STATS), cost the same no matter how many effects there are
+    """
+
+    def __init__(self, effects=()):
+        super(Effects, self).__init__()
+        self.order = {}  # all effects (as keys) in the order they were gained
+        self.by_name = {}  # effect name -> {effect: None} in the same order
+        self.remaining = {}  # rounds left of effects with a duration
+        self.modifiers = dict.fromkeys(STATS, 0)
+        for effect in effects:
+            self.add(effect)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, effect):
+        return effect in self.order
+
+    def add(self, effect):
+        self.order[effect] = None
+        self.by_name.setdefault(effect.name, {})[effect] = None
+        if effect.duration is not None:
+            self.remaining[effect] = effect.duration
+        for stat, value in MODIFIERS.get(effect.name, {}).items():
+            self.modifiers[stat] += value
+
+    def remove(self, effect):
+        del self.order[effect]
+        named = self.by_name[effect.name]
+        del named[effect]
+        if not named:
+            del self.by_name[effect.name]
+        self.remaining.pop(effect, None)
+        for stat, value in MODIFIERS.get(effect.name, {}).items():
+            self.modifiers[stat] -= value
+
+    def count(self, name):  # returns int
+        return len(self.by_name.get(name, ()))
+
+    def of(self, name):  # returns list of effects named 'name' in the order they were gained
+        return list(self.by_name.get(name, ()))
+
+    def first(self, name):  # returns the earliest gained effect named 'name' (None if there's none)
+        return next(iter(self.by_name.get(name, ())), None)
+
+    def modifier(self, stat):  # returns int
+        return self.modifiers[stat]
+
+    def tick(self):  # returns list of effects that ran out
+        """Counts a round down for all effects with a duration, in a single pass, and removes the ones that ran out"""
+        if not self.remaining:
+            return []
+        expired = []
+        for effect, rounds in self.remaining.items():
+            if rounds <= 1:
+                expired.append(effect)
+            else:
+                self.remaining[effect] = rounds - 1
+        for effect in expired:
+            self.remove(effect)
+        return expired
+
+    def copy(self):  # returns Effects
+        effects = Effects.__new__(Effects)
+        effects.order = self.order.copy()
+        effects.by_name = {name: named.copy() for name, named in self.by_name.items()}
+        effects.remaining = self.remaining.copy()
+        effects.modifiers = self.modifiers.copy()
+        return effects
@@ -0,0 +1,542 @@
+"""
+Compact, structured battle event log
+
+EventLog is a herald that stores typed events (initiative, round, attack, block, parry, damage, effect gain/discard,
+end) as rows of append-only columns (array.array), one column per field. It can be flushed to a binary file as a
+chunk of raw columns, EventLogReader memory-maps such a file and renders the original herald text of any battle
+on demand. Text logs written by TextHerald can be converted with convert_text_log().
+
+Fields of a row by event kind ('actor' is a side: 0 for the battle's first warrior, 1 for the second one):
+    INITIATIVE: roll, other_roll - rolls of side 0 and 1, result - 1 (side 0 wins), 0 (draw), -1 (side 1 wins)
+    ROUND: actor - attacker, result - round's number, health, other_health - attacker's and defender's health
+    ATTACK: actor - attacker, roll, other_roll - attacker's and defender's roll, result - hit result, value - 1 if off-hand
+    BLOCK, PARRY: actor - defender, roll, result - 1 if succeeded, value - blocking/parrying bonus
+    DAMAGE: actor - attacker, roll - base damage roll, result - damage dealt, value - reduction, health - defender's health after
+    GAIN_EFFECT, DISCARD_EFFECT: actor - warrior, value - index of the effect in EFFECT_NAMES
+    END: actor - winner, result - rounds count, health, other_health - winner's and loser's health
+"""
+
+import ast
+import contextlib
+import io
+import json
+import mmap
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from types import SimpleNamespace
+
+import herald
+from herald import Herald
+from effects import Effect, EFFECTS
+from items import Item, get_catalog
+from matchup import calculate_dmg_factors
+from phases import OFFHAND_MODIFIER
+from warriors import Warrior
+
+INITIATIVE, ROUND, ATTACK, BLOCK, PARRY, DAMAGE, GAIN_EFFECT, DISCARD_EFFECT, END = range(9)
+EFFECT_NAMES = tuple(sorted(EFFECTS.values()))
+COLUMNS = (
+    ("battle", "I"),
+    ("kind", "b"),
+    ("actor", "b"),
+    ("roll", "h"),
+    ("other_roll", "h"),
+    ("result", "i"),
+    ("value", "i"),
+    ("health", "i"),
+    ("other_health", "i")
+)
+MAGIC = b"WRLOG\x01"
+CHUNK_HEADER = struct.Struct("<IQ")  # length of JSON battle specs, rows count
+BYTEORDER = {"little": b"<", "big": b">"}
+
+
+def describe(warrior):  # returns dict
+    """Battle spec of a warrior - everything needed to rebuild it for rendering"""
+    inventory = warrior.inventory
+    return {
+        "name": warrior.name,
+        "health": warrior.health,
+        "offense": warrior.offense,
+        "defense": warrior.defense,
+        "gear": [None if item is None else item.name
+                 for item in (inventory.weapon, inventory.offhand_weapon, inventory.shield, inventory.armor)],
+        "items": [item.name for item in inventory.items],
+        "effects": [effect.name for effect in warrior.effects]
+    }
+
+
+class EventLog(Herald):
+    """
+    Has: battles, columns, first_battle
+    'battles' holds specs (pairs of warrior descriptions) of battles started since the last flush,
+    'first_battle' is the index of battles[0] in the whole log
+    """
+
+    def __init__(self):
+        super(EventLog, self).__init__()
+        self.battles = []
+        self.columns = {name: array(typecode) for name, typecode in COLUMNS}
+        self.first_battle = 0
+        self._sides = {}
+        self._append = [self.columns[name].append for name, _ in COLUMNS]
+
+    def __len__(self):
+        return len(self.columns["kind"])
+
+    def append(self, kind, actor, roll=0, other_roll=0, result=0, value=0, health=0, other_health=0):
+        row = (self.first_battle + len(self.battles) - 1, kind, actor, roll, other_roll, result, value, health, other_health)
+        for append, field in zip(self._append, row):
+            append(field)
+
+    def introduce_battle(self, attacker, defender):
+        self.battles.append([describe(attacker), describe(defender)])
+        self._sides = {id(attacker): 0, id(defender): 1}
+
+    def report_initiative(self, initiative):
+        result = {"attacker": 1, "draw": 0, "defender": -1}[initiative.result]
+        side = self._sides[id(initiative.attacker)]
+        if side == 0:
+            self.append(INITIATIVE, 0, initiative.attacker_roll, initiative.defender_roll, result)
+        else:
+            self.append(INITIATIVE, 0, initiative.defender_roll, initiative.attacker_roll, -result)
+
+    def introduce_round(self, attacker, defender, rounds_count):
+        self.append(ROUND, self._sides[id(attacker)], result=rounds_count, health=attacker.health, other_health=defender.health)
+
+    def report_attack(self, attack):
+        attacker = self._sides[id(attack.attacker)]
+        self.append(ATTACK, attacker, attack.attacker_roll, attack.defender_roll, attack.result,
+                    0 if attack.offhand_modifier is None else 1)
+        if attack.block is not None:
+            self.append(BLOCK, 1 - attacker, attack.block.roll, result=int(attack.block.result), value=attack.block.blocking_bonus)
+        if attack.parry is not None:
+            self.append(PARRY, 1 - attacker, attack.parry.roll, result=int(attack.parry.result), value=attack.parry.parrying_bonus)
+        if attack.dmg_dealt is not None:
+            self.append(DAMAGE, attacker, attack.dmg_dealt.roll, result=attack.dmg_dealt.result,
+                        value=attack.dmg_dealt.reduction, health=attack.defender.health)
+
+    def report_gain_effect(self, warrior, effect):
+        self.append(GAIN_EFFECT, self._sides[id(warrior)], value=EFFECT_NAMES.index(effect.name))
+
+    def report_discard_effect(self, warrior, effect):
+        self.append(DISCARD_EFFECT, self._sides[id(warrior)], value=EFFECT_NAMES.index(effect.name))
+
+    def close_battle(self, attacker, defender, rounds_count):
+        winner, loser = (defender, attacker) if attacker.health <= 0 else (attacker, defender)
+        self.append(END, self._sides[id(winner)], result=rounds_count, health=winner.health, other_health=loser.health)
+
+    def flush(self, path):
+        """Appends all events stored so far to the file at 'path' as a new chunk and clears them"""
+        with open(path, "ab") as log_file:
+            if log_file.tell() == 0:
+                log_file.write(MAGIC + BYTEORDER[sys.byteorder])
+            write_chunk(log_file, self.first_battle, self.battles, [self.columns[name] for name, _ in COLUMNS])
+        if self.battles:  # a battle still going on keeps its spec and index
+            self.first_battle += len(self.battles) - 1
+            self.battles = self.battles[-1:]
+        for column in self.columns.values():
+            del column[:]
+
+    def render(self, battle):  # returns generator of text lines
+        """Renders the herald text of 'battle' (index in the whole log) from events that weren't flushed yet"""
+        battle_column = self.columns["battle"]
+        start, stop = bisect_left(battle_column, battle), bisect_right(battle_column, battle)
+        rows = zip(*(self.columns[name][start:stop] for name, _ in COLUMNS))
+        return render_battle(self.battles[battle - self.first_battle], rows)
+
+
+def write_chunk(log_file, first_battle, battles, columns):
+    specs = json.dumps({"first_battle": first_battle, "battles": battles}).encode("utf-8")
+    log_file.write(CHUNK_HEADER.pack(len(specs), len(columns[0])))
+    log_file.write(specs)
+    pad(log_file)
+    for column in columns:
+        column.tofile(log_file)
+        pad(log_file)
+
+
+def pad(log_file):  # keeps columns 8-byte aligned for memory-mapped reading
+    log_file.write(b"\0" * (-log_file.tell() % 8))
+
+
+class Chunk(object):
+    """Has: first_battle, battles, count, offsets (of columns in the file)"""
+
+    def __init__(self, first_battle, battles, count, offsets):
+        super(Chunk, self).__init__()
+        self.first_battle = first_battle
+        self.battles = battles
+        self.count = count
+        self.offsets = offsets
+
+
+class EventLogReader(object):
+    """
+    Has: path, chunks
+    Memory-maps an event log file, columns are exposed as zero-copy memoryviews read only on access
+    """
+
+    def __init__(self, path):
+        super(EventLogReader, self).__init__()
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not an event log: {}".format(path))
+        if self._map[len(MAGIC):len(MAGIC) + 1] != BYTEORDER[sys.byteorder]:
+            raise ValueError("Event log written on a machine with different byte order: {}".format(path))
+        self.chunks = []
+        offset = len(MAGIC) + 1
+        while offset < len(self._map):
+            specs_length, count = CHUNK_HEADER.unpack_from(self._map, offset)
+            offset += CHUNK_HEADER.size
+            specs = json.loads(self._map[offset:offset + specs_length].decode("utf-8"))
+            offset += specs_length
+            offset += -offset % 8
+            offsets = {}
+            for name, typecode in COLUMNS:
+                offsets[name] = offset
+                offset += count * array(typecode).itemsize
+                offset += -offset % 8
+            self.chunks.append(Chunk(specs["first_battle"], specs["battles"], count, offsets))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return sum(chunk.count for chunk in self.chunks)
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:  # columns are still referenced somewhere, the map goes away with them
+            pass
+        self._file.close()
+
+    @property
+    def battles_count(self):
+        if not self.chunks:
+            return 0
+        last = self.chunks[-1]
+        return last.first_battle + len(last.battles)
+
+    def column(self, chunk, name):  # returns memoryview
+        typecode = dict(COLUMNS)[name]
+        start = chunk.offsets[name]
+        return memoryview(self._map)[start:start + chunk.count * array(typecode).itemsize].cast(typecode)
+
+    def spec(self, battle):  # returns pair of warrior descriptions
+        for chunk in self.chunks:
+            if chunk.first_battle <= battle < chunk.first_battle + len(chunk.battles):
+                return chunk.battles[battle - chunk.first_battle]
+        raise IndexError("No such battle in the log: {}".format(battle))
+
+    def rows(self, battle):  # returns generator of rows (tuples ordered as COLUMNS)
+        for chunk in self.chunks:
+            if not chunk.first_battle <= battle < chunk.first_battle + len(chunk.battles):
+                continue
+            battle_column = self.column(chunk, "battle")
+            start, stop = bisect_left(battle_column, battle), bisect_right(battle_column, battle)
+            columns = [self.column(chunk, name)[start:stop] for name, _ in COLUMNS]
+            for row in zip(*columns):
+                yield row
+
+    def render(self, battle):  # returns generator of text lines
+        return render_battle(self.spec(battle), self.rows(battle))
+
+
+def build_warrior(description):  # returns Warrior
+    warrior = Warrior(description["name"], description["health"], description["offense"], description["defense"],
+                      effects=[Effect(name) for name in description["effects"]], herald=Herald())
+    catalog = get_catalog()
+    weapon, offhand_weapon, shield, armor = description["gear"]
+    warrior.inventory.weapon = None if weapon is None else catalog.weapons[weapon]
+    warrior.inventory.armor = None if armor is None else catalog.armors[armor]
+    if offhand_weapon is not None:
+        warrior.inventory.offhand_weapon = catalog.weapons[offhand_weapon]
+    if shield is not None:
+        warrior.inventory.shield = catalog.shields[shield]
+    warrior.inventory.items = [Item(name) for name in description["items"]]
+    return warrior
+
+
+def render_battle(spec, rows):  # returns generator of text lines
+    """Rebuilds the warriors and feeds TextHerald's functions with stand-ins for the phases"""
+    sides = [build_warrior(description) for description in spec]
+    output = io.StringIO()
+    attack = None  # reported once all of its block/parry/damage events are in
+    with contextlib.redirect_stdout(output):
+        herald.introduce_battle(sides[0], sides[1])
+    for line in drain(output):
+        yield line
+
+    for _, kind, actor, roll, other_roll, result, value, health, other_health in rows:
+        with contextlib.redirect_stdout(output):
+            if kind == BLOCK:
+                attack.block = SimpleNamespace(defender=sides[actor], roll=roll, hit_result=attack.result,
+                                               result=bool(result), blocking_bonus=value)
+            elif kind == PARRY:
+                attack.parry = SimpleNamespace(defender=sides[actor], roll=roll, hit_result=attack.result,
+                                               result=bool(result), parrying_bonus=value)
+            elif kind == DAMAGE:
+                inventory = attack.attacker.inventory
+                weapon = inventory.weapon if attack.offhand_modifier is None else inventory.offhand_weapon
+                augmenting, _ = calculate_dmg_factors(weapon, attack.defender.inventory.armor, attack.result)
+                attack.dmg_dealt = SimpleNamespace(attacker=attack.attacker, defender=attack.defender, roll=roll,
+                                                   augmenting=augmenting, reduction=value, result=result)
+                attack.defender.health = health
+            else:
+                if attack is not None:
+                    herald.report_attack(attack)
+                    attack = None
+                if kind == INITIATIVE:
+                    herald.report_initiative(SimpleNamespace(
+                        attacker=sides[0], defender=sides[1], attacker_roll=roll, defender_roll=other_roll,
+                        result={1: "attacker", 0: "draw", -1: "defender"}[result]))
+                elif kind == ROUND:
+                    sides[actor].health, sides[1 - actor].health = health, other_health
+                    herald.introduce_round(sides[actor], sides[1 - actor], result)
+                elif kind == ATTACK:
+                    attack = SimpleNamespace(
+                        attacker=sides[actor], defender=sides[1 - actor], attacker_roll=roll, defender_roll=other_roll,
+                        result=result, offhand_modifier=None if value == 0 else OFFHAND_MODIFIER,
+                        block=None, parry=None, dmg_dealt=None)
+                elif kind == GAIN_EFFECT:
+                    effect = Effect(EFFECT_NAMES[value])
+                    herald.report_gain_effect(sides[actor], effect)
+                    sides[actor].effects.add(effect)
+                elif kind == DISCARD_EFFECT:
+                    effect = sides[actor].effects.first(EFFECT_NAMES[value])
+                    herald.report_discard_effect(sides[actor], effect)
+                    sides[actor].effects.remove(effect)
+                elif kind == END:
+                    sides[actor].health, sides[1 - actor].health = health, other_health
+                    herald.close_battle(sides[actor], sides[1 - actor], result)
+        for line in drain(output):
+            yield line
+
+    if attack is not None:
+        with contextlib.redirect_stdout(output):
+            herald.report_attack(attack)
+        for line in drain(output):
+            yield line
+
+
+def drain(output):  # returns list of lines printed to 'output' so far and clears it
+    lines = output.getvalue().splitlines()
+    output.seek(0)
+    output.truncate()
+    return lines
+
+
+WARRIOR_PATTERN = r"(?P<name>.+) \(\*(?P<health>-?\d+)\*/(?P<offense>-?\d+)/(?P<defense>-?\d+)\), inventory: \[(?P<inventory>.*)\], effects: \[(?P<effects>.*)\]"
+TEXT_PATTERNS = (
+    ("intro", re.compile(r"^Two brave warriors came to fight today:$")),
+    ("attacker", re.compile(r"^Attacker is: " + WARRIOR_PATTERN + r"$")),
+    ("defender", re.compile(r"^Defender is: " + WARRIOR_PATTERN + r"$")),
+    ("warrior", re.compile(r"^" + WARRIOR_PATTERN + r"$")),
+    ("initiative_roll", re.compile(r"^(?P<name>.+) rolls \*(?P<roll>\d+)\* for initiative$")),
+    ("initiative", re.compile(r"^-?\d+ \+ \d+ (?P<sign>[<=>]) -?\d+ \+ \d+,")),
+    ("round", re.compile(r"^\*+ ROUND #(?P<round>\d+) \*+$")),
+    ("attack", re.compile(r"^\*\*\* (?P<offhand>OFF-HAND )?ATTACK \*\*\*$")),
+    ("attack_roll", re.compile(r"^He rolls \*(?P<roll>\d+)\* for (?:off-hand )?attack$")),
+    ("defense_roll", re.compile(r"^He rolls \*(?P<roll>\d+)\* for defense$")),
+    ("attack_result", re.compile(r"^The result of .+ is: .* = (?P<result>-?\d+)$")),
+    ("bonus", re.compile(r"^His (?:blocking|parrying) bonus is: (?P<bonus>-?\d+)$")),
+    ("deflect_roll", re.compile(r"^.+ rolls \*(?P<roll>\d+)\* for (?:block|parry)$")),
+    ("deflect_result", re.compile(r"(?:(?P<kind>block|parry) (?P<outcome>succeeded|failed)!|(?P<unarmed>has no weapon to parry with)\. Parry failed!)$")),
+    ("damage_roll", re.compile(r"^.+ rolls \*(?P<roll>\d+)\* for base weapon damage$")),
+    ("reduction", re.compile(r"^Damage Reduction of .+ is: (?P<reduction>-?\d+)$")),
+    ("damage", re.compile(r"(?:deals \*(?P<damage>\d+)\* of damage|<= 0, no damage dealt)$")),
+    ("gain_effect", re.compile(r"^(?P<name>.+) gains an effect: (?P<effect>.+)$")),
+    ("discard_effect", re.compile(r"^(?P<name>.+) discards an effect: (?P<effect>.+)$")),
+    ("health", re.compile(r"^(?P<name>.+)'s health is:  (?P<health>-?\d+)$")),
+    ("end", re.compile(r"^(?P<name>.+) wins after (?P<rounds>\d+) rounds of relentless battle\.$"))
+)
+
+
+def describe_text(match):  # returns dict
+    """Battle spec of a warrior from its herald text, gear is told apart by looking item names up in the catalog"""
+    catalog = get_catalog()
+    gear = [None, None, None, None]
+    items = []
+    for name in ast.literal_eval("[" + match.group("inventory") + "]"):
+        if name in catalog.weapons and gear[0] is None:
+            gear[0] = name
+        elif name in catalog.weapons and gear[1] is None:
+            gear[1] = name
+        elif name in catalog.shields and gear[2] is None:
+            gear[2] = name
+        elif name in catalog.armors and gear[3] is None:
+            gear[3] = name
+        else:
+            items.append(name)
+    return {
+        "name": match.group("name"),
+        "health": int(match.group("health")),
+        "offense": int(match.group("offense")),
+        "defense": int(match.group("defense")),
+        "gear": gear,
+        "items": items,
+        "effects": list(ast.literal_eval("[" + match.group("effects") + "]"))
+    }
+
+
+class TextLogParser(object):
+    """
+    Parses herald text line by line, keeping only the state of the battle being read
+    feed() returns a list of parsed entries: ("battle", spec) when a battle starts and ("event", row) for every event,
+    where row is a tuple ordered as COLUMNS without the leading 'battle' field
+    """
+
+    def __init__(self):
+        super(TextLogParser, self).__init__()
+        self.spec = None
+        self.sides = {}
+        self.healths = [0, 0]
+        self._intro = 0
+        self._initiative = {}
+        self._attacker = 0
+        self._row = {}
+        self._winner_health = {}
+
+    def feed(self, line):  # returns list of entries
+        line = line.rstrip("\n")
+        for name, pattern in TEXT_PATTERNS:
+            match = pattern.search(line)
+            if match is not None:
+                return getattr(self, "parse_" + name)(match)
+        return []
+
+    def event(self, kind, actor, roll=0, other_roll=0, result=0, value=0, health=0, other_health=0):
+        return [("event", (kind, actor, roll, other_roll, result, value, health, other_health))]
+
+    def parse_intro(self, match):
+        self.spec = []
+        self._intro = 2
+        return []
+
+    def parse_warrior(self, match):
+        if self._intro == 0:
+            return []
+        self.spec.append(describe_text(match))
+        self._intro -= 1
+        if self._intro > 0:
+            return []
+        self.sides = {description["name"]: index for index, description in enumerate(self.spec)}
+        self.healths = [description["health"] for description in self.spec]
+        return [("battle", self.spec)]
+
+    def parse_initiative_roll(self, match):
+        self._initiative[self.sides[match.group("name")]] = int(match.group("roll"))
+        return []
+
+    def parse_initiative(self, match):
+        result = {">": 1, "=": 0, "<": -1}[match.group("sign")]
+        return self.event(INITIATIVE, 0, self._initiative[0], self._initiative[1], result)
+
+    def parse_round(self, match):
+        self._row = {"round": int(match.group("round"))}
+        return []
+
+    def parse_attacker(self, match):
+        self._attacker = self.sides[match.group("name")]
+        self.healths[self._attacker] = int(match.group("health"))
+        return []
+
+    def parse_defender(self, match):
+        self.healths[1 - self._attacker] = int(match.group("health"))
+        return self.event(ROUND, self._attacker, result=self._row["round"],
+                          health=self.healths[self._attacker], other_health=self.healths[1 - self._attacker])
+
+    def parse_attack(self, match):
+        self._row = {"offhand": 0 if match.group("offhand") is None else 1}
+        return []
+
+    def parse_attack_roll(self, match):
+        self._row["roll"] = int(match.group("roll"))
+        return []
+
+    def parse_defense_roll(self, match):
+        self._row["other_roll"] = int(match.group("roll"))
+        return []
+
+    def parse_attack_result(self, match):
+        self._row["result"] = int(match.group("result"))
+        return self.event(ATTACK, self._attacker, self._row["roll"], self._row["other_roll"], self._row["result"], self._row["offhand"])
+
+    def parse_bonus(self, match):
+        self._row["bonus"] = int(match.group("bonus"))
+        self._row["deflect_roll"] = 0
+        return []
+
+    def parse_deflect_roll(self, match):
+        self._row["deflect_roll"] = int(match.group("roll"))
+        return []
+
+    def parse_deflect_result(self, match):
+        kind = BLOCK if match.group("kind") == "block" else PARRY
+        succeeded = 1 if match.group("outcome") == "succeeded" else 0
+        return self.event(kind, 1 - self._attacker, self._row["deflect_roll"], result=succeeded, value=self._row["bonus"])
+
+    def parse_damage_roll(self, match):
+        self._row["damage_roll"] = int(match.group("roll"))
+        return []
+
+    def parse_reduction(self, match):
+        self._row["reduction"] = int(match.group("reduction"))
+        return []
+
+    def parse_damage(self, match):
+        damage = 0 if match.group("damage") is None else int(match.group("damage"))
+        self.healths[1 - self._attacker] -= damage
+        return self.event(DAMAGE, self._attacker, self._row["damage_roll"], result=damage, value=self._row["reduction"],
+                          health=self.healths[1 - self._attacker])
+
+    def parse_gain_effect(self, match):
+        return self.event(GAIN_EFFECT, self.sides[match.group("name")], value=EFFECT_NAMES.index(match.group("effect")))
+
+    def parse_discard_effect(self, match):
+        return self.event(DISCARD_EFFECT, self.sides[match.group("name")], value=EFFECT_NAMES.index(match.group("effect")))
+
+    def parse_health(self, match):
+        self._winner_health[match.group("name")] = int(match.group("health"))
+        return []
+
+    def parse_end(self, match):
+        winner = self.sides[match.group("name")]
+        loser_name = self.spec[1 - winner]["name"]
+        return self.event(END, winner, result=int(match.group("rounds")),
+                          health=self._winner_health[match.group("name")], other_health=self._winner_health[loser_name])
+
+
+def parse_text(lines):  # returns generator of entries
+    """Streams ("battle", spec) and ("event", row) entries out of herald text lines"""
+    parser = TextLogParser()
+    for line in lines:
+        for entry in parser.feed(line):
+            yield entry
+
+
+def convert_text_log(text_path, log_path, flush_every=100000):  # returns number of battles converted
+    """Converts a text log written by TextHerald into an event log file, flushing a chunk every 'flush_every' events"""
+    log = EventLog()
+    battles = 0
+    with open(text_path) as text_file:
+        for entry_type, entry in parse_text(text_file):
+            if entry_type == "battle":
+                log.battles.append(entry)
+                battles += 1
+                continue
+            log.append(*entry)
+            if len(log) >= flush_every:
+                log.flush(log_path)
+    log.flush(log_path)
+    return battles
@@ -1,8 +1,18 @@
 """
 Functions bundled in this module make various announcements about the current game state to the standard output
+
+Heralds are pluggable sinks for the same announcements chosen per Battle:
+    Herald - does nothing (headless simulations)
+    TextHerald - prints everything using functions below
+    RecordingHerald - stores announcements as plain dict events
+    TemplateHerald - renders the same text as TextHerald from templates into a buffered writer, with verbosity levels
 """
 
 import math
+import os
+import sys
+
+LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
 
 
 def introduce_battle(attacker, defender):
@@ -41,12 +51,10 @@ def report_attack(attack):
     if attack.offhand_modifier is None:
         intro = "*** ATTACK ***"
         weapon_name = attack.attacker.inventory.weapon.name.lower()
-        offense_text = str(attack.attacker.offense)
         attack_text = "attack"
     else:
         intro = "*** OFF-HAND ATTACK ***"
         weapon_name = attack.attacker.inventory.offhand_weapon.name.lower()
-        offense_text = str(math.floor(attack.attacker.offense * attack.offhand_modifier))
         attack_text = "off-hand attack"
 
     print(intro)
@@ -54,7 +62,7 @@ def report_attack(attack):
     print("He rolls", "*" + str(attack.attacker_roll) + "*", "for", attack_text)
     print(attack.defender.name, "tries to fend off the attack")
     print("He rolls", "*" + str(attack.defender_roll) + "*", "for defense")
-    result_text = offense_text + " + " + str(attack.attacker_roll) + " - " + str(attack.defender.defense) + " - " + str(attack.defender_roll) + " ="
+    result_text = str(attack.offense) + " + " + str(attack.attacker_roll) + " - " + str(attack.defense) + " - " + str(attack.defender_roll) + " ="
     print("The result of", attack.attacker.name + "'s", attack_text, "is:", result_text, attack.result)
     if attack.result < 0:
         print("It's a miss!")
@@ -73,9 +81,9 @@ def report_attack(attack):
 def report_block(block):
     print("*** BLOCK ***")
     print(block.defender.name, "tries to block with his", block.defender.inventory.shield.name.lower())
-    print("His blocking bonus is:", block.defender.inventory.shield.to_block)
+    print("His blocking bonus is:", block.blocking_bonus)
     print(block.defender.name, "rolls", "*" + str(block.roll) + "*", "for block")
-    result_text = str(block.defender.inventory.shield.to_block) + " + " + str(block.roll) + " - " + str(block.hit_result)
+    result_text = str(block.blocking_bonus) + " + " + str(block.roll) + " - " + str(block.hit_result)
     if block.result:
         print(result_text, "> 0, block succeeded!")
     else:
@@ -136,6 +144,457 @@ def close_battle(attacker, defender, rounds_count):
     print()
 
 
+def introduce_melee(teams):
+    print()
+    print("********* MELEE *********")
+    print(len(teams), "sides came to fight today:")
+    for number, team in enumerate(teams, start=1):
+        print("Side #" + str(number) + ":")
+        for warrior in team:
+            print(str(warrior))
+
+
+def report_fall(warrior, rounds_count):
+    print(warrior.name, "falls in round", str(rounds_count) + ".")
+
+
+def close_melee(survivors, rounds_count):
+    print("***************************")
+    for warrior in survivors:
+        print(warrior.name + "'s health is: ", warrior.health)
+    print(", ".join(warrior.name for warrior in survivors), "prevail after", rounds_count, "rounds of relentless battle.")
+    print()
+    print("************************************************************************************")
+    print("*************************************** END ****************************************")
+    print("************************************************************************************")
+    print()
+
+
 def report(warrior):
     print()
     print("Hail, my good fellow. I am {}. My health is {}. My offense/defense rating is {}/{}. I'm affected by following effects: {}. I'm equipped with: \n{}".format(warrior.name, warrior.health, warrior.offense, warrior.defense, [effect.name for effect in warrior.effects], str(warrior.inventory)))
+
+
+def report_equip(warrior, slot, item):
+    print(warrior.name, "equips " + slot + ":", str(item))
+
+
+def report_drop(warrior, slot, item=None):
+    if item is None:
+        print(warrior.name, "drops " + slot)
+    else:
+        print(warrior.name, "drops " + slot + ":", str(item))
+
+
+def report_gain_effect(warrior, effect):
+    print(warrior.name, "gains an effect:", effect.name)
+
+
+def report_discard_effect(warrior, effect):
+    print(warrior.name, "discards an effect:", effect.name)
+
+
+class Herald(object):
+    """
+    Null sink - swallows all announcements, so a headless battle doesn't pay for any string building
+    The root for all heralds in this module
+    """
+
+    def introduce_battle(self, attacker, defender):
+        pass
+
+    def report_initiative(self, initiative):
+        pass
+
+    def introduce_round(self, attacker, defender, rounds_count):
+        pass
+
+    def report_attack(self, attack):
+        pass
+
+    def close_battle(self, attacker, defender, rounds_count):
+        pass
+
+    def introduce_melee(self, teams):
+        pass
+
+    def report_fall(self, warrior, rounds_count):
+        pass
+
+    def close_melee(self, survivors, rounds_count):
+        pass
+
+    def report(self, warrior):
+        pass
+
+    def report_equip(self, warrior, slot, item):
+        pass
+
+    def report_drop(self, warrior, slot, item=None):
+        pass
+
+    def report_gain_effect(self, warrior, effect):
+        pass
+
+    def report_discard_effect(self, warrior, effect):
+        pass
+
+
+class TextHerald(Herald):
+    """Prints announcements to the standard output"""
+
+    def introduce_battle(self, attacker, defender):
+        introduce_battle(attacker, defender)
+
+    def report_initiative(self, initiative):
+        report_initiative(initiative)
+
+    def introduce_round(self, attacker, defender, rounds_count):
+        introduce_round(attacker, defender, rounds_count)
+
+    def report_attack(self, attack):
+        report_attack(attack)
+
+    def close_battle(self, attacker, defender, rounds_count):
+        close_battle(attacker, defender, rounds_count)
+
+    def introduce_melee(self, teams):
+        introduce_melee(teams)
+
+    def report_fall(self, warrior, rounds_count):
+        report_fall(warrior, rounds_count)
+
+    def close_melee(self, survivors, rounds_count):
+        close_melee(survivors, rounds_count)
+
+    def report(self, warrior):
+        report(warrior)
+
+    def report_equip(self, warrior, slot, item):
+        report_equip(warrior, slot, item)
+
+    def report_drop(self, warrior, slot, item=None):
+        report_drop(warrior, slot, item)
+
+    def report_gain_effect(self, warrior, effect):
+        report_gain_effect(warrior, effect)
+
+    def report_discard_effect(self, warrior, effect):
+        report_discard_effect(warrior, effect)
+
+
+class RecordingHerald(Herald):
+    """
+    Has: events
+    Stores announcements as dicts of plain values (names, rolls, results), so they stay valid after the battle mutates warriors
+    """
+
+    def __init__(self):
+        super(RecordingHerald, self).__init__()
+        self.events = []
+
+    def introduce_battle(self, attacker, defender):
+        self.events.append({"event": "battle", "attacker": attacker.name, "defender": defender.name})
+
+    def report_initiative(self, initiative):
+        self.events.append({
+            "event": "initiative",
+            "attacker": initiative.attacker.name,
+            "defender": initiative.defender.name,
+            "attacker_roll": initiative.attacker_roll,
+            "defender_roll": initiative.defender_roll,
+            "result": initiative.result
+        })
+
+    def introduce_round(self, attacker, defender, rounds_count):
+        self.events.append({
+            "event": "round",
+            "round": rounds_count,
+            "attacker": attacker.name,
+            "defender": defender.name,
+            "attacker_health": attacker.health,
+            "defender_health": defender.health
+        })
+
+    def report_attack(self, attack):
+        self.events.append({
+            "event": "attack",
+            "attacker": attack.attacker.name,
+            "defender": attack.defender.name,
+            "offhand": attack.offhand_modifier is not None,
+            "attacker_roll": attack.attacker_roll,
+            "defender_roll": attack.defender_roll,
+            "result": attack.result
+        })
+        if attack.block is not None:
+            self.events.append({
+                "event": "block",
+                "defender": attack.block.defender.name,
+                "roll": attack.block.roll,
+                "hit_result": attack.block.hit_result,
+                "result": attack.block.result
+            })
+        if attack.parry is not None:
+            self.events.append({
+                "event": "parry",
+                "defender": attack.parry.defender.name,
+                "parrying_bonus": attack.parry.parrying_bonus,
+                "roll": attack.parry.roll,
+                "hit_result": attack.parry.hit_result,
+                "result": attack.parry.result
+            })
+        if attack.dmg_dealt is not None:
+            self.events.append({
+                "event": "damage",
+                "attacker": attack.dmg_dealt.attacker.name,
+                "defender": attack.dmg_dealt.defender.name,
+                "roll": attack.dmg_dealt.roll,
+                "augmenting": attack.dmg_dealt.augmenting,
+                "reduction": attack.dmg_dealt.reduction,
+                "result": attack.dmg_dealt.result
+            })
+
+    def close_battle(self, attacker, defender, rounds_count):
+        winner, loser = (defender, attacker) if attacker.health <= 0 else (attacker, defender)
+        self.events.append({
+            "event": "end",
+            "winner": winner.name,
+            "loser": loser.name,
+            "winner_health": winner.health,
+            "loser_health": loser.health,
+            "rounds": rounds_count
+        })
+
+    def introduce_melee(self, teams):
+        self.events.append({"event": "melee", "teams": [[warrior.name for warrior in team] for team in teams]})
+
+    def report_fall(self, warrior, rounds_count):
+        self.events.append({"event": "fall", "warrior": warrior.name, "round": rounds_count})
+
+    def close_melee(self, survivors, rounds_count):
+        self.events.append({
+            "event": "melee_end",
+            "survivors": [warrior.name for warrior in survivors],
+            "healths": [warrior.health for warrior in survivors],
+            "rounds": rounds_count
+        })
+
+    def report_gain_effect(self, warrior, effect):
+        self.events.append({"event": "gain_effect", "warrior": warrior.name, "effect": effect.name})
+
+    def report_discard_effect(self, warrior, effect):
+        self.events.append({"event": "discard_effect", "warrior": warrior.name, "effect": effect.name})
+
+
+# templates of TemplateHerald - each renders exactly what the function of the same name prints
+FULL, SUMMARY, WINNER = 2, 1, 0  # verbosity levels of TemplateHerald
+END_BANNER = "\n".join(("*" * 84, "*" * 39 + " END " + "*" * 40, "*" * 84))
+INTRODUCE_BATTLE = "\n********* BATTLE *********\nTwo brave warriors came to fight today:\n{}\n{}\n".format
+INITIATIVE = "{} rolls *{}* for initiative\n{} rolls *{}* for initiative\n{} + {} {} {} + {}, {}\n".format
+INTRODUCE_ROUND = "\n******** ROUND #{} ********\nAttacker is: {}\nDefender is: {}\n".format
+ATTACK = ("{intro}\n{attacker} swings his {weapon} at {defender}\nHe rolls *{attacker_roll}* for {kind}\n"
+          "{defender} tries to fend off the attack\nHe rolls *{defender_roll}* for defense\n"
+          "The result of {attacker}'s {kind} is: {offense} + {attacker_roll} - {defense} - {defender_roll} = {result}\n"
+          "{verdict}\n").format
+BLOCK = ("*** BLOCK ***\n{0} tries to block with his {1}\nHis blocking bonus is: {2}\n{0} rolls *{3}* for block\n"
+         "{2} + {3} - {4} {5}\n").format
+PARRY_WITH = "{} tries to parry with his {}\n".format
+PARRY_WITH_BOTH = "{} tries to parry with both his weapons\n".format
+PARRY_WITH_OFFHAND = "{} tries to parry with his off-hand {}\n".format
+PARRY_NO_WEAPON = "His parrying bonus is: {}\n{} has no weapon to parry with. Parry failed!\n".format
+PARRY = "His parrying bonus is: {0}\n{1} rolls *{2}* for parry\n{0} + {2} - {3} {4}\n".format
+DAMAGE = ("*** DAMAGE ***\n{0} rolls *{1}* for base weapon damage\nAugmenting Factor of {0}'s attack is: {2}\n"
+          "Damage Reduction of {3}'s {4} is: {5}\n{6} - {5} ").format
+CLOSE_BATTLE = ("***************************\n{0}'s health is:  {1}\n{2}'s health is:  {3}\n"
+                "{0} wins after {4} rounds of relentless battle.\n\n" + END_BANNER + "\n\n").format
+WINNER_LINE = "{} wins after {} rounds of relentless battle.\n".format
+MELEE_WINNERS_LINE = "{} prevail after {} rounds of relentless battle.\n".format
+GAIN_EFFECT = "{} gains an effect: {}\n".format
+DISCARD_EFFECT = "{} discards an effect: {}\n".format
+
+
+class TemplateHerald(Herald):
+    """
+    Has: writer, verbosity
+    Renders the same text as TextHerald from precompiled templates into a buffer and passes it to 'writer'
+    (anything with write(), standard output if not given) with a single write per round
+    'verbosity' is FULL (everything), SUMMARY (battles' introductions and endings) or WINNER (only who won)
+    """
+
+    def __init__(self, writer=None, verbosity=FULL):
+        super(TemplateHerald, self).__init__()
+        self.writer = writer
+        self.verbosity = verbosity
+        self.buffer = []
+
+    def flush(self):
+        if self.buffer:
+            (sys.stdout if self.writer is None else self.writer).write("".join(self.buffer))
+            self.buffer = []
+
+    def introduce_battle(self, attacker, defender):
+        self.flush()
+        if self.verbosity >= SUMMARY:
+            self.buffer.append(INTRODUCE_BATTLE(attacker, defender))
+
+    def report_initiative(self, initiative):
+        if self.verbosity < FULL:
+            return
+        attacker, defender = initiative.attacker, initiative.defender
+        if initiative.result == "attacker":
+            sign, ending = ">", attacker.name + " wins initiative\nLet the battle begin!"
+        elif initiative.result == "draw":
+            sign, ending = "=", " Draw! Let's roll again"
+        else:
+            sign, ending = "<", defender.name + " wins initiative\nLet the battle begin!"
+        self.buffer.append(INITIATIVE(attacker.name, initiative.attacker_roll, defender.name, initiative.defender_roll,
+                                      attacker.offense, initiative.attacker_roll, sign, defender.offense,
+                                      initiative.defender_roll, ending))
+
+    def introduce_round(self, attacker, defender, rounds_count):
+        self.flush()
+        if self.verbosity >= FULL:
+            self.buffer.append(INTRODUCE_ROUND(rounds_count, attacker, defender))
+
+    def report_attack(self, attack):
+        if self.verbosity < FULL:
+            return
+        attacker, defender = attack.attacker, attack.defender
+        if attack.offhand_modifier is None:
+            intro, weapon, kind = "*** ATTACK ***", attacker.inventory.weapon, "attack"
+        else:
+            intro, weapon, kind = "*** OFF-HAND ATTACK ***", attacker.inventory.offhand_weapon, "off-hand attack"
+        append = self.buffer.append
+        append(ATTACK(intro=intro, attacker=attacker.name, weapon=weapon.name.lower(), defender=defender.name,
+                      attacker_roll=attack.attacker_roll, kind=kind, defender_roll=attack.defender_roll, offense=attack.offense,
+                      defense=attack.defense, result=attack.result,
+                      verdict="It's a miss!" if attack.result < 0 else "It's a hit!"))
+
+        block = attack.block
+        if block is not None:
+            append(BLOCK(block.defender.name, block.defender.inventory.shield.name.lower(), block.blocking_bonus,
+                         block.roll, block.hit_result, "> 0, block succeeded!" if block.result else "< 0, block failed!"))
+        parry = attack.parry
+        if parry is not None:
+            append("*** PARRY ***\n")
+            inventory = parry.defender.inventory
+            if inventory.weapon is not None and inventory.offhand_weapon is None:
+                append(PARRY_WITH(parry.defender.name, inventory.weapon.name.lower()))
+            elif inventory.weapon is not None and inventory.offhand_weapon is not None:
+                append(PARRY_WITH_BOTH(parry.defender.name))
+            elif inventory.weapon is None and inventory.offhand_weapon is not None:
+                append(PARRY_WITH_OFFHAND(parry.defender.name, inventory.offhand_weapon.name.lower()))
+            if parry.parrying_bonus <= 0:
+                append(PARRY_NO_WEAPON(parry.parrying_bonus, parry.defender.name))
+            else:
+                append(PARRY(parry.parrying_bonus, parry.defender.name, parry.roll, parry.hit_result,
+                             "> 0, parry succeeded!" if parry.result else "< 0, parry failed!"))
+        dmg_dealt = attack.dmg_dealt
+        if dmg_dealt is not None:
+            append(DAMAGE(dmg_dealt.attacker.name, dmg_dealt.roll, dmg_dealt.augmenting, dmg_dealt.defender.name,
+                          dmg_dealt.defender.inventory.armor.name.lower(), dmg_dealt.reduction,
+                          math.floor(dmg_dealt.roll * dmg_dealt.augmenting)))
+            if dmg_dealt.result <= 0:
+                append("<= 0, no damage dealt\n")
+            else:
+                append("> 0, {} deals *{}* of damage\n".format(dmg_dealt.attacker.name, dmg_dealt.result))
+
+    def close_battle(self, attacker, defender, rounds_count):
+        winner, loser = (defender, attacker) if attacker.health <= 0 else (attacker, defender)
+        if self.verbosity >= SUMMARY:
+            self.buffer.append(CLOSE_BATTLE(winner.name, winner.health, loser.name, loser.health, rounds_count))
+        else:
+            self.buffer.append(WINNER_LINE(winner.name, rounds_count))
+        self.flush()
+
+    def capture(self, function, *args):
+        """Buffers what one of the module functions prints - for announcements made once per battle or less"""
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            function(*args)
+        self.buffer.append(output.getvalue())
+
+    def introduce_melee(self, teams):
+        self.flush()
+        if self.verbosity >= SUMMARY:
+            self.capture(introduce_melee, teams)
+
+    def report_fall(self, warrior, rounds_count):
+        if self.verbosity >= SUMMARY:
+            self.buffer.append("{} falls in round {}.\n".format(warrior.name, rounds_count))
+
+    def close_melee(self, survivors, rounds_count):
+        if self.verbosity >= SUMMARY:
+            self.capture(close_melee, survivors, rounds_count)
+        else:
+            self.buffer.append(MELEE_WINNERS_LINE(", ".join(warrior.name for warrior in survivors), rounds_count))
+        self.flush()
+
+    def report(self, warrior):
+        if self.verbosity >= FULL:
+            self.capture(report, warrior)
+            self.flush()
+
+    def report_equip(self, warrior, slot, item):
+        if self.verbosity >= FULL:
+            self.capture(report_equip, warrior, slot, item)
+            self.flush()
+
+    def report_drop(self, warrior, slot, item=None):
+        if self.verbosity >= FULL:
+            self.capture(report_drop, warrior, slot, item)
+            self.flush()
+
+    def report_gain_effect(self, warrior, effect):
+        if self.verbosity >= FULL:
+            self.buffer.append(GAIN_EFFECT(warrior.name, effect.name))
+
+    def report_discard_effect(self, warrior, effect):
+        if self.verbosity >= FULL:
+            self.buffer.append(DISCARD_EFFECT(warrior.name, effect.name))
+
+
+class RotatingFileWriter(object):
+    """
+    Has: path, max_bytes, backups
+    Appends to a log file ('herald.log' in logs/ by default), once it would grow past 'max_bytes' it's renamed
+    to path.1 (path.1 to path.2 and so on, up to 'backups' of them) and a new one is started
+    """
+
+    def __init__(self, path=None, max_bytes=10 * 1024 * 1024, backups=5):
+        super(RotatingFileWriter, self).__init__()
+        self.path = os.path.join(LOGS_DIR, "herald.log") if path is None else path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.file = open(self.path, "a")
+        self.size = self.file.tell()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, text):
+        if self.size > 0 and self.size + len(text) > self.max_bytes:
+            self.rotate()
+        self.file.write(text)
+        self.size += len(text)
+
+    def rotate(self):
+        self.file.close()
+        for number in range(self.backups - 1, 0, -1):
+            if os.path.exists("{}.{}".format(self.path, number)):
+                os.replace("{}.{}".format(self.path, number), "{}.{}".format(self.path, number + 1))
+        if self.backups > 0:
+            os.replace(self.path, self.path + ".1")
+        self.file = open(self.path, "w")
+        self.size = 0
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
@@ -1,5 +1,12 @@
 from collections import namedtuple
-import json
+from bisect import bisect_left, bisect_right
+import os
+
+ITEM_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "item_data.json")
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "__pycache__")
+SNAPSHOT_VERSION = 2  # bump whenever item classes or Catalog change
+DEFAULT_WEAPON = "Bare Hand"
+DEFAULT_ARMOR = "Adventurer's Garb"
 
 DmgReduction = namedtuple("DmgReduction", ["slashing", "piercing", "bludgeoning"])
 
@@ -8,12 +15,34 @@ class Item(object):
     """
     Has: name
     This class is treated as an abstract class and shouldn't be instantiated
+    Items are definitions shared by every warrior wielding them, so copying returns the very same item.
+    Once frozen (all catalog items are) an item can't be changed at all
     """
 
     def __init__(self, name):
         super(Item, self).__init__()
         self.name = name
 
+    def __setattr__(self, name, value):
+        if self.__dict__.get("_frozen"):
+            raise AttributeError("Can't change {} - items are immutable".format(self.name))
+        super(Item, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if self.__dict__.get("_frozen"):
+            raise AttributeError("Can't change {} - items are immutable".format(self.name))
+        super(Item, self).__delattr__(name)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def freeze(self):  # returns self
+        self.__dict__["_frozen"] = True
+        return self
+
 
 class OffensiveGear(Item):
     """
@@ -89,10 +118,7 @@ class Shield(DefensiveGear, OffensiveGear):
 # item data parsing functions
 
 
-def parse_weapon_data():
-    with open("data/item_data.json") as json_file:
-        weapon_list = json.load(json_file)["weapons"]
-
+def parse_weapon_data(weapon_list):
     weapon_data = {}
     for weapon in weapon_list:
         weapon_data.update({
@@ -108,10 +134,7 @@ def parse_weapon_data():
     return weapon_data
 
 
-def parse_shield_data():
-    with open("data/item_data.json") as json_file:
-        shield_list = json.load(json_file)["shields"]
-
+def parse_shield_data(shield_list):
     shield_data = {}
     for shield in shield_list:
         shield_data.update({
@@ -126,10 +149,7 @@ def parse_shield_data():
     return shield_data
 
 
-def parse_armor_data():
-    with open("data/item_data.json") as json_file:
-        armor_list = json.load(json_file)["armors"]
-
+def parse_armor_data(armor_list):
     armor_data = {}
     for armor in armor_list:
         armor_data.update({
@@ -147,24 +167,171 @@ def parse_armor_data():
     return armor_data
 
 
-WEAPONS = parse_weapon_data()
-SHIELDS = parse_shield_data()
-ARMORS = parse_armor_data()
+class Catalog(object):
+    """
+    Has: weapons, shields, armors, by_dmg_type, by_handedness
+    'weapons', 'shields' and 'armors' map item names to items
+    'by_dmg_type' maps a damage type to offensive gear (weapons and shields), 'by_handedness' maps handedness to weapons
+    """
+
+    def __init__(self, weapons, shields, armors):
+        super(Catalog, self).__init__()
+        for item in list(weapons.values()) + list(shields.values()) + list(armors.values()):
+            item.freeze()
+        self.weapons = weapons
+        self.shields = shields
+        self.armors = armors
+        self.by_dmg_type = {}
+        self.by_handedness = {}
+        for item in list(weapons.values()) + list(shields.values()):
+            self.by_dmg_type.setdefault(item.dmg_type, []).append(item)
+        for weapon in weapons.values():
+            self.by_handedness.setdefault(weapon.handedness, []).append(weapon)
+        self._stat_indexes = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_stat_indexes"] = {}  # cheap to rebuild, only the ones in use get built
+        return state
+
+    def stat_index(self, kind, stat):  # returns (sorted stat values, items in the same order)
+        """'kind' is "weapons", "shields" or "armors", a tuple stat (like damage) is indexed by its mean"""
+        key = (kind, stat)
+        index = self._stat_indexes.get(key)
+        if index is None:
+            def value(item):
+                value = getattr(item, stat)
+                return sum(value) / len(value) if isinstance(value, tuple) else value
+
+            ordered = sorted(getattr(self, kind).values(), key=value)
+            index = self._stat_indexes[key] = ([value(item) for item in ordered], ordered)
+        return index
+
+    def select(self, kind, stat, low=None, high=None):  # returns list of items
+        """Items of 'kind' with 'stat' from 'low' to 'high' inclusive (either bound may be omitted)"""
+        values, ordered = self.stat_index(kind, stat)
+        start = 0 if low is None else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        return ordered[start:stop]
+
+
+def parse_item_data(path=ITEM_DATA_PATH):  # returns Catalog
+    """Reads and parses the item data file once"""
+    with open(path, "rb") as json_file:
+        return build_catalog(json_file.read())
+
+
+def build_catalog(data):  # returns Catalog
+    import json
+    item_data = json.loads(data)
+    return Catalog(parse_weapon_data(item_data["weapons"]),
+                   parse_shield_data(item_data["shields"]),
+                   parse_armor_data(item_data["armors"]))
+
+
+def snapshot_path(path):  # returns path of the compiled snapshot of item data at 'path'
+    import hashlib
+    digest = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:12]
+    return os.path.join(CACHE_DIR, "item_catalog-{}.pickle".format(digest))
+
+
+def load_catalog(path=ITEM_DATA_PATH, cache=True):  # returns Catalog
+    """
+    Loads item data through a compiled (pickled) snapshot cached in __pycache__
+    The snapshot is used if the data file's mtime and size match, or otherwise if its content hash does.
+    A snapshot that can't be read or written is simply ignored
+    """
+    if not cache:
+        return parse_item_data(path)
+    import hashlib
+    import pickle
+
+    stat = os.stat(path)
+    cached = snapshot_path(path)
+    snapshot = None
+    try:
+        with open(cached, "rb") as snapshot_file:
+            snapshot = pickle.load(snapshot_file)
+        if snapshot["version"] != SNAPSHOT_VERSION:
+            snapshot = None
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError, TypeError):
+        snapshot = None
+
+    if snapshot is not None and (snapshot["mtime"], snapshot["size"]) == (stat.st_mtime_ns, stat.st_size):
+        return snapshot["catalog"]
+
+    with open(path, "rb") as json_file:
+        data = json_file.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if snapshot is not None and snapshot["hash"] == digest:
+        catalog = snapshot["catalog"]
+    else:
+        catalog = build_catalog(data)
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temporary = "{}.{}.tmp".format(cached, os.getpid())
+        with open(temporary, "wb") as snapshot_file:
+            pickle.dump({"version": SNAPSHOT_VERSION, "mtime": stat.st_mtime_ns, "size": stat.st_size,
+                         "hash": digest, "catalog": catalog}, snapshot_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, cached)
+    except OSError:
+        pass
+    return catalog
+
+
+CATALOG = None
+
+
+def get_catalog():  # returns Catalog
+    """The catalog of the default item data, loaded on first use"""
+    global CATALOG
+    if CATALOG is None:
+        CATALOG = load_catalog()
+    return CATALOG
+
+
+def reload_catalog():  # returns Catalog
+    """Loads the default item data again after it was edited, warriors built before keep their old items"""
+    global CATALOG
+    CATALOG = load_catalog()
+    return CATALOG
+
+
+def __getattr__(name):
+    """WEAPONS, SHIELDS and ARMORS are materialized on first access"""
+    if name in ("WEAPONS", "SHIELDS", "ARMORS"):
+        return getattr(get_catalog(), name.lower())
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+DEFAULT = object()  # stands for the default weapon/armor, which is looked up only when an Inventory needs it
 
 
 class Inventory(object):
-    """Has: weapon, offhand_weapon, shield, armor and items"""
+    """
+    Has: weapon, offhand_weapon, shield, armor and items
+    'loadout' identifies the wielded gear (without items), it changes whenever any of it is equipped or dropped
+    """
 
     def __init__(self,  # no setting offhand and shield in constructor - only setters!
-                 weapon=WEAPONS["Bare Hand"],
-                 armor=ARMORS["Adventurer's Garb"],
+                 weapon=DEFAULT,
+                 armor=DEFAULT,
                  items=None):
 
         super(Inventory, self).__init__()
 
+        if weapon is DEFAULT:
+            weapon = get_catalog().weapons[DEFAULT_WEAPON]
+        if armor is DEFAULT:
+            armor = get_catalog().armors[DEFAULT_ARMOR]
+
+        self._loadout = None
+        self._weapon = None
         self.weapon = weapon
         self._offhand_weapon = None  # property TODO: tu powinna być zwykła nazwa bez '_' - wtedy również kontruktor używałby wrapperów 'property' i nie byłoby konieczności pomijania tych pól w liście argumentów (generalnie trochę źle to zrozumiałem, gdy to pisałem - za dużo myślenia javowego o 'deklarowaniu' pól i myśleniu o podkreślniku w nazwie jak o odpowiedniku 'private')
         self._shield = None  # property
+        self._armor = None
         self.armor = armor
         if items is None:
             self.items = []
@@ -187,6 +354,30 @@ class Inventory(object):
 
         return "\n".join(text)
 
+    @property
+    def loadout(self):  # returns tuple of wielded gear (compared by identity) usable as a dict key
+        if self._loadout is None:
+            self._loadout = (self._weapon, self._offhand_weapon, self._shield, self._armor)
+        return self._loadout
+
+    @property
+    def weapon(self):
+        return self._weapon
+
+    @weapon.setter
+    def weapon(self, value):
+        self._weapon = value
+        self._loadout = None
+
+    @property
+    def armor(self):
+        return self._armor
+
+    @armor.setter
+    def armor(self, value):
+        self._armor = value
+        self._loadout = None
+
     @property
     def offhand_weapon(self):
         return self._offhand_weapon
@@ -208,6 +399,9 @@ class Inventory(object):
             self._offhand_weapon = None
             raise
 
+        finally:
+            self._loadout = None
+
     @property
     def shield(self):
         return self._shield
@@ -226,3 +420,6 @@ class Inventory(object):
         except ValueError:
             self._shield = None
             raise
+
+        finally:
+            self._loadout = None
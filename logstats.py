@@ -0,0 +1,190 @@
+"""
+Streaming analytics over herald text logs
+
+Logs are read line by line through eventlog.TextLogParser and folded into per-warrior statistics, so memory
+stays constant no matter how big the logs are. Many log files can be processed concurrently, each in its own
+worker process, with a merged summary yielded as every file is done.
+"""
+
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from eventlog import parse_text, ROUND, ATTACK, BLOCK, PARRY, DAMAGE, GAIN_EFFECT, DISCARD_EFFECT, END, EFFECT_NAMES
+from effects import EFFECTS
+
+MISS = EFFECT_NAMES.index(EFFECTS["miss"])
+
+
+class WarriorStats(object):
+    """
+    Has: name, battles, wins, attack_rounds, attacks, hits, blocks, blocks_succeeded, parries, parries_succeeded,
+    damage, miss_streaks
+    'miss_streaks' maps the length of a streak of consecutive MISS effects to the number of such streaks
+    """
+
+    def __init__(self, name):
+        super(WarriorStats, self).__init__()
+        self.name = name
+        self.battles = 0
+        self.wins = 0
+        self.attack_rounds = 0
+        self.attacks = 0
+        self.hits = 0
+        self.blocks = 0
+        self.blocks_succeeded = 0
+        self.parries = 0
+        self.parries_succeeded = 0
+        self.damage = 0
+        self.miss_streaks = {}
+
+    def __str__(self):
+        return "{}: {} battles, win rate: {:.1%}, hit rate: {:.1%}, block: {:.1%}, parry: {:.1%}, damage/round: {:.2f}, longest MISS streak: {}".format(
+            self.name, self.battles, self.win_rate, self.hit_rate, self.block_rate, self.parry_rate,
+            self.damage_per_round, self.longest_miss_streak)
+
+    @property
+    def win_rate(self):
+        return self.wins / self.battles if self.battles else 0.0
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.attacks if self.attacks else 0.0
+
+    @property
+    def block_rate(self):
+        return self.blocks_succeeded / self.blocks if self.blocks else 0.0
+
+    @property
+    def parry_rate(self):
+        return self.parries_succeeded / self.parries if self.parries else 0.0
+
+    @property
+    def damage_per_round(self):
+        return self.damage / self.attack_rounds if self.attack_rounds else 0.0
+
+    @property
+    def longest_miss_streak(self):
+        return max(self.miss_streaks, default=0)
+
+    def add_miss_streak(self, length):
+        self.miss_streaks[length] = self.miss_streaks.get(length, 0) + 1
+
+    def merge(self, other):
+        for field in ("battles", "wins", "attack_rounds", "attacks", "hits", "blocks", "blocks_succeeded",
+                      "parries", "parries_succeeded", "damage"):
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        for length, count in other.miss_streaks.items():
+            self.miss_streaks[length] = self.miss_streaks.get(length, 0) + count
+
+
+class LogStats(object):
+    """
+    Has: warriors, battles, rounds
+    Folds parsed log entries into per-warrior statistics (warriors are told apart by name)
+    """
+
+    def __init__(self):
+        super(LogStats, self).__init__()
+        self.warriors = {}
+        self.battles = 0
+        self.rounds = 0
+        self._sides = None
+        self._streaks = [0, 0]
+
+    def __str__(self):
+        lines = ["{} battles, {} rounds".format(self.battles, self.rounds)]
+        lines += [str(stats) for stats in sorted(self.warriors.values(), key=lambda stats: stats.name)]
+        return "\n".join(lines)
+
+    def warrior(self, name):  # returns WarriorStats
+        stats = self.warriors.get(name)
+        if stats is None:
+            stats = self.warriors[name] = WarriorStats(name)
+        return stats
+
+    def feed(self, entry):
+        entry_type, value = entry
+        if entry_type == "battle":
+            self.battles += 1
+            self._sides = [self.warrior(description["name"]) for description in value]
+            self._streaks = [0, 0]
+            for stats in self._sides:
+                stats.battles += 1
+            return
+
+        kind, actor, _, _, result, effect, _, _ = value
+        stats = self._sides[actor]
+        if kind == ROUND:
+            self.rounds += 1
+            stats.attack_rounds += 1
+        elif kind == ATTACK:
+            stats.attacks += 1
+            if result >= 0:
+                stats.hits += 1
+        elif kind == BLOCK:
+            stats.blocks += 1
+            stats.blocks_succeeded += result
+        elif kind == PARRY:
+            stats.parries += 1
+            stats.parries_succeeded += result
+        elif kind == DAMAGE:
+            stats.damage += result
+        elif kind == GAIN_EFFECT and effect == MISS:
+            self._streaks[actor] += 1
+        elif kind == DISCARD_EFFECT and effect == MISS:
+            self.close_streak(actor)
+        elif kind == END:
+            stats.wins += 1
+            self.close_streak(0)
+            self.close_streak(1)
+
+    def close_streak(self, side):
+        if self._streaks[side] > 0:
+            self._sides[side].add_miss_streak(self._streaks[side])
+            self._streaks[side] = 0
+
+    def merge(self, other):
+        self.battles += other.battles
+        self.rounds += other.rounds
+        for name, stats in other.warriors.items():
+            self.warrior(name).merge(stats)
+
+
+def analyze(lines, every=None):  # returns generator of LogStats
+    """
+    Streams herald text 'lines' into statistics
+    Yields the running LogStats after every 'every' battles (if given) and once more at the end
+    """
+    stats = LogStats()
+    for entry in parse_text(lines):
+        if every is not None and entry[0] == "battle" and stats.battles > 0 and stats.battles % every == 0:
+            yield stats
+        stats.feed(entry)
+    yield stats
+
+
+def analyze_file(path):  # returns LogStats
+    with open(path) as log_file:
+        for stats in analyze(log_file):
+            pass
+    return stats
+
+
+def analyze_files(paths, workers=None):  # returns generator of LogStats
+    """Processes log files concurrently, yields the summary merged so far each time a file is done"""
+    summary = LogStats()
+    with ProcessPoolExecutor(workers) as executor:
+        for future in as_completed([executor.submit(analyze_file, path) for path in paths]):
+            summary.merge(future.result())
+            yield summary
+
+
+def main():
+    """Prints statistics of logs given as arguments"""
+    for summary in analyze_files(sys.argv[1:] or ["logs/battle.log"]):
+        pass
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Compiled matchups - everything about an attack that depends only on the attacker's and the defender's inventories
+
+A Matchup is built once per pair of loadouts and shared by all warriors wielding them. Inventory changes
+its loadout key whenever a weapon, off-hand weapon, shield or armor is equipped or dropped, so a changed
+inventory simply resolves to another Matchup.
+"""
+
+import math
+
+from phases import OFFHAND_MODIFIER, BLUDGEONING_MODIFIER, SLASHING_MODIFIER, PIERCING_MODIFIER
+
+DMG_TYPE_MODIFIERS = {
+    "bludgeoning": BLUDGEONING_MODIFIER,
+    "slashing": SLASHING_MODIFIER,
+    "piercing": PIERCING_MODIFIER
+}
+
+MAX_MATCHUPS = 4096  # compiled matchups kept in cache, it's cleared when this is exceeded
+MATCHUPS = {}
+
+
+def calculate_parrying_bonus(inventory, offhand_modifier=OFFHAND_MODIFIER):  # returns int
+    """Same three cases as in phases.Parry.calculate_parrying_bonus()"""
+    if inventory.weapon is not None and inventory.offhand_weapon is None:
+        return inventory.weapon.to_parry
+    elif inventory.weapon is not None and inventory.offhand_weapon is not None:
+        return inventory.weapon.to_parry + math.floor(inventory.offhand_weapon.to_parry * offhand_modifier)
+    elif inventory.weapon is None and inventory.offhand_weapon is not None:
+        return math.floor(inventory.offhand_weapon.to_parry * offhand_modifier)
+    return 0
+
+
+def calculate_dmg_factors(weapon, armor, hit_result):  # returns (float, int)
+    """Damage augmenting factor and armor reduction of a hit, phases.DamageDealt falls back on it as well"""
+    augmenting = 0.0
+    reduction = 0
+    if weapon.dmg_type == "bludgeoning":
+        augmenting += (1 + hit_result / 20) * BLUDGEONING_MODIFIER
+        reduction += armor.dmg_reduction.bludgeoning
+    elif weapon.dmg_type == "slashing":
+        augmenting += 1 + hit_result / 20 * SLASHING_MODIFIER
+        reduction += armor.dmg_reduction.slashing
+    elif weapon.dmg_type == "piercing":
+        augmenting += (1 + hit_result / 20) * PIERCING_MODIFIER
+        reduction += armor.dmg_reduction.piercing
+
+    return augmenting, reduction
+
+
+class Matchup(object):
+    """
+    Has: weapons, armor, blocking_bonus, parrying_bonus, parries, can_deflect, deflect_bonus
+
+    'weapons' holds the attacker's (main weapon, off-hand weapon) - index 0 or 1 is the 'hand' used by methods below
+    'blocking_bonus' is None if the defender has no shield, 'parries' tells if the defender parries instead
+    'can_deflect' and 'deflect_bonus' sum it up: a block succeeds on any bonus, a parry needs a positive one
+    """
+
+    def __init__(self, attacker_inventory, defender_inventory):
+        super(Matchup, self).__init__()
+        self.weapons = (attacker_inventory.weapon, attacker_inventory.offhand_weapon)
+        self.armor = defender_inventory.armor
+        shield = defender_inventory.shield
+        self.blocking_bonus = None if shield is None else shield.to_block
+        self.parrying_bonus = calculate_parrying_bonus(defender_inventory)
+        self.parries = shield is None and (defender_inventory.weapon is not None or defender_inventory.offhand_weapon is not None)
+        if self.blocking_bonus is not None:
+            self.can_deflect = True
+            self.deflect_bonus = self.blocking_bonus
+        elif self.parries:
+            self.can_deflect = self.parrying_bonus > 0
+            self.deflect_bonus = self.parrying_bonus
+        else:
+            self.can_deflect = False
+            self.deflect_bonus = 0
+        self._dmg_factors = ({}, {})
+        self._damage_pmfs = ({}, {})
+        self._attack_pmfs = ({}, {})
+
+    def reduction(self, hand):  # returns int
+        weapon = self.weapons[hand]
+        if self.armor is None:
+            return 0
+        return getattr(self.armor.dmg_reduction, weapon.dmg_type)
+
+    def dmg_factors(self, hand, hit_result):  # returns (float, int)
+        table = self._dmg_factors[hand]
+        factors = table.get(hit_result)
+        if factors is None:
+            factors = table[hit_result] = calculate_dmg_factors(self.weapons[hand], self.armor, hit_result)
+        return factors
+
+    def damage_pmf(self, hand, hit_result):  # returns tuple of (damage, probability)
+        """Distribution of damage dealt by a hit of 'hit_result' quality that wasn't blocked/parried"""
+        table = self._damage_pmfs[hand]
+        pmf = table.get(hit_result)
+        if pmf is None:
+            weapon = self.weapons[hand]
+            augmenting, reduction = self.dmg_factors(hand, hit_result)
+            span = weapon.damage[1] - weapon.damage[0] + 1
+            distribution = {}
+            for roll in range(weapon.damage[0], weapon.damage[1] + 1):
+                dealt = max(math.floor(roll * augmenting) - reduction, 0)
+                distribution[dealt] = distribution.get(dealt, 0.0) + 1 / span
+            pmf = table[hit_result] = tuple(sorted(distribution.items()))
+        return pmf
+
+    def deflect_probability(self, hit_result):  # returns float
+        if not self.can_deflect:
+            return 0.0
+        # deflect_bonus + roll - hit_result >= 0
+        return min(max(21 - max(hit_result - self.deflect_bonus, 1), 0), 20) / 20
+
+    def attack_pmf(self, hand, offense, defense):  # returns tuple of (damage, probability)
+        """Distribution of damage dealt by a single attack with 'offense' (already modified for off-hand) against 'defense'"""
+        table = self._attack_pmfs[hand]
+        pmf = table.get((offense, defense))
+        if pmf is None:
+            distribution = {}
+            for attacker_roll in range(1, 21):
+                for defender_roll in range(1, 21):
+                    hit_result = offense + attacker_roll - (defense + defender_roll)
+                    if hit_result < 0:
+                        distribution[0] = distribution.get(0, 0.0) + 1 / 400
+                        continue
+                    deflected = self.deflect_probability(hit_result)
+                    distribution[0] = distribution.get(0, 0.0) + deflected / 400
+                    for damage, probability in self.damage_pmf(hand, hit_result):
+                        distribution[damage] = distribution.get(damage, 0.0) + (1 - deflected) / 400 * probability
+            pmf = table[(offense, defense)] = tuple(sorted(distribution.items()))
+        return pmf
+
+
+def get_matchup(attacker_inventory, defender_inventory):  # returns Matchup
+    key = (attacker_inventory.loadout, defender_inventory.loadout)
+    matchup = MATCHUPS.get(key)
+    if matchup is None:
+        if len(MATCHUPS) >= MAX_MATCHUPS:
+            MATCHUPS.clear()
+        matchup = MATCHUPS[key] = Matchup(attacker_inventory, defender_inventory)
+    return matchup
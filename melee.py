@@ -0,0 +1,293 @@
+"""
+Melee - battles of many warriors, in teams or every one for himself
+
+Every warrior rolls for initiative once (offense + d20) and takes a turn every round in that order. Turns come from
+a heap keyed by (round, initiative), a fallen warrior's pending turn is simply skipped when it comes up. A turn is
+an ordinary BattleRound against a target picked by the melee's targeting strategy, so all phases and effects work
+exactly as in a duel. Alive warriors are kept in swap-remove pools (per team and overall), so picking a target and
+removing a fallen warrior don't scan the whole field.
+"""
+
+import heapq
+
+from herald import Herald, TextHerald
+from dice import Dice
+from items import get_catalog
+from warriors import Warrior, BattleRound
+
+
+class Targets(object):
+    """
+    Has: warriors, teams, alive, team_alive, standing
+    'teams[i]' is the team of warriors[i], 'alive' and 'team_alive[team]' are pools of alive warriors' indices,
+    'standing' is the number of teams with a warrior alive
+    """
+
+    def __init__(self, warriors, teams, teams_count):
+        super(Targets, self).__init__()
+        self.warriors = warriors
+        self.teams = teams
+        self.alive = list(range(len(warriors)))
+        self.positions = list(range(len(warriors)))  # index in 'alive'
+        self.team_alive = [[] for _ in range(teams_count)]
+        self.team_positions = [0] * len(warriors)  # index in 'team_alive[team]'
+        for index, team in enumerate(teams):
+            self.team_positions[index] = len(self.team_alive[team])
+            self.team_alive[team].append(index)
+        self.standing = sum(1 for pool in self.team_alive if pool)
+
+    def is_alive(self, index):  # returns boolean
+        return self.positions[index] is not None
+
+    def enemies_count(self, index):  # returns int
+        return len(self.alive) - len(self.team_alive[self.teams[index]])
+
+    def remove(self, index):
+        swap_remove(self.alive, self.positions, index)
+        pool = self.team_alive[self.teams[index]]
+        swap_remove(pool, self.team_positions, index)
+        if not pool:
+            self.standing -= 1
+
+    def random_enemy(self, index, dice):  # returns index of an alive enemy (None if there's none)
+        """Uniformly random enemy, drawn from the whole field unless the warrior's own team makes most of it"""
+        own = self.team_alive[self.teams[index]]
+        enemies = len(self.alive) - len(own)
+        if enemies <= 0:
+            return None
+        if len(own) * 2 <= len(self.alive):
+            while True:
+                target = self.alive[dice.roll(0, len(self.alive) - 1)]
+                if self.teams[target] != self.teams[index]:
+                    return target
+        pick = dice.roll(0, enemies - 1)
+        for team, pool in enumerate(self.team_alive):
+            if team == self.teams[index]:
+                continue
+            if pick < len(pool):
+                return pool[pick]
+            pick -= len(pool)
+
+
+def swap_remove(pool, positions, index):
+    """Removes 'index' from 'pool' in O(1) by moving the last element into its place"""
+    position = positions[index]
+    last = pool.pop()
+    if last != index:
+        pool[position] = last
+        positions[last] = position
+    positions[index] = None
+
+
+class TargetingStrategy(object):
+    """
+    Picks a target for every turn
+    The root for all strategies in this module, attacks a random enemy
+    One strategy may serve many melees one after another, start() is called as every one of them commences
+    """
+
+    def start(self, melee):
+        """Forgets whatever was kept about the previous melee"""
+        pass
+
+    def choose(self, melee, index):  # returns index of the target
+        return melee.targets.random_enemy(index, melee.dice)
+
+    def hit(self, melee, index):
+        """Called after warriors[index]'s health may have changed - it was attacked or its effects were resolved"""
+        pass
+
+
+class RandomTarget(TargetingStrategy):
+    """Attacks a random enemy every turn"""
+
+
+class WeakestTarget(TargetingStrategy):
+    """
+    Attacks the enemy with the lowest health
+    Every team has a heap of (health, index) of its warriors and there's a heap of (lowest health, team) of the teams.
+    hit() pushes new entries (Melee calls it after every attack and every resolution of effects), outdated ones are
+    dropped when they come up - or replaced if a warrior's health rose unreported, so none falls out of the heaps alive
+    """
+
+    def __init__(self):
+        super(WeakestTarget, self).__init__()
+        self.team_heaps = None
+        self.heap = None
+        self.pushed = None  # health of every warrior's newest entry
+        self.team_pushed = None  # lowest health of every team's newest entry (None if it has none)
+
+    def start(self, melee):
+        self.team_heaps = [[(melee.warriors[index].health, index) for index in pool] for pool in melee.targets.team_alive]
+        self.pushed = [warrior.health for warrior in melee.warriors]
+        self.team_pushed = [None] * len(self.team_heaps)
+        self.heap = []
+        for team, team_heap in enumerate(self.team_heaps):
+            heapq.heapify(team_heap)
+            if team_heap:
+                self.heap.append((team_heap[0][0], team))
+                self.team_pushed[team] = team_heap[0][0]
+        heapq.heapify(self.heap)
+
+    def team_top(self, melee, team):  # returns (health, index) of the team's weakest warrior alive (None if there's none)
+        team_heap = self.team_heaps[team]
+        while team_heap:
+            health, index = team_heap[0]
+            if melee.targets.is_alive(index):
+                current = melee.warriors[index].health
+                if current == health:
+                    return team_heap[0]
+                if current != self.pushed[index]:  # changed behind the strategy's back, there's no fresh entry yet
+                    self.pushed[index] = current
+                    heapq.heapreplace(team_heap, (current, index))
+                    continue
+            heapq.heappop(team_heap)
+        return None
+
+    def push_team(self, team, top):
+        """Adds the team's entry for its weakest warrior 'top' unless the newest entry already has its health"""
+        if top is not None and top[0] != self.team_pushed[team]:
+            self.team_pushed[team] = top[0]
+            heapq.heappush(self.heap, (top[0], team))
+
+    def choose(self, melee, index):
+        own_team = melee.targets.teams[index]
+        skipped = []
+        target = None
+        while self.heap:
+            health, team = self.heap[0]
+            top = self.team_top(melee, team)
+            if top is None or top[0] != health:
+                heapq.heappop(self.heap)
+                if health == self.team_pushed[team]:  # the newest entry is outdated, it's replaced
+                    self.team_pushed[team] = None
+                self.push_team(team, top)
+            elif team == own_team:
+                skipped.append(heapq.heappop(self.heap))
+            else:
+                target = top[1]
+                break
+        for entry in skipped:
+            heapq.heappush(self.heap, entry)
+        return target
+
+    def hit(self, melee, index):
+        team = melee.targets.teams[index]
+        health = melee.warriors[index].health
+        if melee.targets.is_alive(index) and health != self.pushed[index]:
+            self.pushed[index] = health
+            heapq.heappush(self.team_heaps[team], (health, index))
+        self.push_team(team, self.team_top(melee, team))
+
+
+class StickyTarget(TargetingStrategy):
+    """Keeps attacking the same enemy until it falls, then picks another one at random"""
+
+    def __init__(self):
+        super(StickyTarget, self).__init__()
+        self.chosen = {}
+
+    def start(self, melee):
+        self.chosen = {}
+
+    def choose(self, melee, index):
+        target = self.chosen.get(index)
+        if target is None or not melee.targets.is_alive(target):
+            target = self.chosen[index] = melee.targets.random_enemy(index, melee.dice)
+        return target
+
+
+class Melee(object):
+    """
+    Commences. Has: teams, warriors, herald, dice, seed, strategy, targets, rounds_count, turns_count, winner
+    'teams' is a list of lists of warriors, 'winner' the index of the last team standing
+    Rolls come from the melee's own dice.Dice made from 'seed', like in a Battle. TextHerald is used if not given
+    """
+
+    def __init__(self, teams, herald=None, seed=None, strategy=None):
+        super(Melee, self).__init__()
+        self.teams = [list(team) for team in teams]
+        if sum(1 for team in self.teams if team) < 2:
+            raise ValueError("at least two teams are required")
+        self.warriors = [warrior for team in self.teams for warrior in team]
+        if herald is None:
+            self.herald = TextHerald()
+        else:
+            self.herald = herald
+        if isinstance(seed, Dice):
+            self.dice = seed
+        else:
+            self.dice = Dice(seed)
+        self.seed = self.dice.seed
+        if strategy is None:
+            self.strategy = RandomTarget()
+        else:
+            self.strategy = strategy
+        self.targets = Targets(self.warriors, [team for team, members in enumerate(self.teams) for _ in members],
+                               len(self.teams))
+        self.rounds_count = 0
+        self.turns_count = 0
+        self.winner = None
+
+    @classmethod
+    def free_for_all(cls, warriors, herald=None, seed=None, strategy=None):  # returns Melee
+        return cls([[warrior] for warrior in warriors], herald, seed, strategy)
+
+    def resolve_initiative(self):  # returns heap of turns: (round, -initiative, index)
+        turns = [(1, -(warrior.offense + self.dice.d20()), index) for index, warrior in enumerate(self.warriors)]
+        heapq.heapify(turns)
+        return turns
+
+    def commence(self):
+        self.herald.introduce_melee(self.teams)
+        turns = self.resolve_initiative()
+        targets = self.targets
+        self.strategy.start(self)
+
+        while targets.standing > 1:
+            turn, initiative, index = heapq.heappop(turns)
+            if not targets.is_alive(index):
+                continue
+            self.rounds_count = turn
+            self.turns_count += 1
+            target = self.strategy.choose(self, index)
+            attacker = self.warriors[index]
+            defender = self.warriors[target]
+
+            self.herald.introduce_round(attacker, defender, self.rounds_count)
+            battle_round = BattleRound(attacker, defender, self.herald, self.dice)
+            if defender.health <= 0:
+                targets.remove(target)
+                self.herald.report_fall(defender, self.rounds_count)
+            self.strategy.hit(self, target)
+            if targets.standing > 1:
+                battle_round.resolve_effects()
+                if attacker.health <= 0:  # its own effects may take the attacker's health too
+                    targets.remove(index)
+                    self.herald.report_fall(attacker, self.rounds_count)
+                self.strategy.hit(self, index)
+            heapq.heappush(turns, (turn + 1, initiative, index))
+
+        self.winner = next(team for team, pool in enumerate(targets.team_alive) if pool)
+        self.herald.close_melee([self.warriors[index] for index in sorted(targets.team_alive[self.winner])],
+                                self.rounds_count)
+
+
+def main():
+    """Runs a free-for-all of eight warriors"""
+    catalog = get_catalog()
+    warriors = []
+    for number in range(8):
+        warrior = Warrior("Warrior #" + str(number + 1), herald=Herald())
+        warrior.equip_weapon(catalog.weapons["Longsword"])
+        warrior.equip_armor(catalog.armors["Chainmail"])
+        if number % 2:
+            warrior.equip_shield(catalog.shields["Tower Shield"])
+        else:
+            warrior.equip_offhand_weapon(catalog.weapons["Short Sword"])
+        warriors.append(warrior)
+    Melee.free_for_all(warriors).commence()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Vectorized Monte Carlo simulation of many independent battles between the same two warriors
+
+Every battle is a lane in NumPy arrays (health, rolls, block/parry outcomes, damage), so a whole round of all
+the battles is resolved with a handful of array operations instead of building phase objects for every roll.
+The mechanics mirror phases.py and Battle.commence() exactly (including an off-hand attack being performed
+after the main one has already dropped the defender). MISS effects don't influence any roll yet, so they're
+not tracked here.
+"""
+
+import math
+
+import numpy as np
+
+from phases import OFFHAND_MODIFIER
+from matchup import get_matchup, DMG_TYPE_MODIFIERS
+
+
+class Side(object):
+    """
+    Has: offense, offhand_offense, defense, health, inventory
+    A warrior's numbers taken at the start of the simulation
+    """
+
+    def __init__(self, warrior):
+        super(Side, self).__init__()
+        self.offense = warrior.offense
+        self.offhand_offense = math.floor(warrior.offense * OFFHAND_MODIFIER)
+        self.defense = warrior.defense
+        self.health = warrior.health
+        self.inventory = warrior.inventory
+
+
+class MonteCarloResult(object):
+    """
+    Has: names, battles, winners, rounds, damage_histograms
+    'winners' holds 0 (first warrior won) or 1 (second warrior won) per battle, 'rounds' the length of each battle
+    'damage_histograms' holds, per side, counts of damage values dealt by hits that weren't blocked/parried
+    """
+
+    def __init__(self, names, winners, rounds, damage_histograms):
+        super(MonteCarloResult, self).__init__()
+        self.names = names
+        self.battles = len(winners)
+        self.winners = winners
+        self.rounds = rounds
+        self.damage_histograms = damage_histograms
+
+    def __str__(self):
+        return "{} vs {}: {} battles, win rates: {:.4f}/{:.4f}, mean rounds: {:.2f}".format(
+            self.names[0], self.names[1], self.battles, self.win_rates[0], self.win_rates[1], self.mean_rounds)
+
+    @property
+    def wins(self):
+        second = int(np.count_nonzero(self.winners))
+        return self.battles - second, second
+
+    @property
+    def win_rates(self):
+        wins = self.wins
+        return wins[0] / self.battles, wins[1] / self.battles
+
+    @property
+    def mean_rounds(self):
+        return float(self.rounds.mean())
+
+    @property
+    def round_distribution(self):  # index is the number of rounds, value the number of battles that lasted that long
+        return np.bincount(self.rounds)
+
+
+def resolve_initiative(rng, first, second, battles):  # returns array of sides (0 or 1) that attack first
+    result = np.empty(battles, dtype=np.int8)
+    pending = np.arange(battles)
+    while len(pending) > 0:
+        difference = (first.offense + rng.integers(1, 21, len(pending))) - (second.offense + rng.integers(1, 21, len(pending)))
+        decided = difference != 0  # a draw means rolling again
+        result[pending[decided]] = np.where(difference[decided] > 0, 0, 1)
+        pending = pending[~decided]
+    return result
+
+
+class Attacks(object):
+    """
+    Has: attacker, defender, hand, offense, defense, can_deflect, deflect_bonus, min_dmg, dmg_span, modifier, reduction
+    One kind of attack (main or off-hand 'hand') of one side against the other compiled into plain numbers
+    """
+
+    def __init__(self, attacker, defender, hand, matchup):
+        super(Attacks, self).__init__()
+        self.attacker = attacker
+        self.defender = defender
+        self.hand = hand
+        self.offense = attacker.offhand_offense if hand else attacker.offense
+        self.defense = defender.defense
+        self.can_deflect = matchup.can_deflect
+        self.deflect_bonus = matchup.deflect_bonus
+        weapon = matchup.weapons[hand]
+        self.min_dmg = weapon.damage[0]
+        self.dmg_span = weapon.damage[1] - weapon.damage[0] + 1
+        self.modifier = DMG_TYPE_MODIFIERS[weapon.dmg_type]
+        self.reduction = matchup.reduction(hand)
+
+    def resolve(self, rng, size):  # returns (array of damage dealt, array of damage dealt by landed hits)
+        """Resolves one attack in each of 'size' lanes"""
+        rolls = rng.integers(1, 21, (3, size), dtype=np.int8)  # attacker, defender, block/parry
+        hit_result = (self.offense - self.defense) + rolls[0].astype(np.int32) - rolls[1]
+        landed = hit_result >= 0
+        if self.can_deflect:
+            landed &= self.deflect_bonus + rolls[2].astype(np.int32) - hit_result < 0
+        damage = np.zeros(size, dtype=np.int32)
+        lanes = np.flatnonzero(landed)
+        if len(lanes) > 0:
+            roll = self.min_dmg + (rng.random(len(lanes)) * self.dmg_span).astype(np.int32)
+            augmenting = (1 + hit_result[lanes] / 20) * self.modifier
+            dealt = np.maximum(np.floor(roll * augmenting).astype(np.int32) - self.reduction, 0)
+            damage[lanes] = dealt
+        else:
+            dealt = damage[:0]
+        return damage, dealt
+
+
+def simulate(first, second, battles, seed=None, chunk_size=250000):
+    """
+    Simulates 'battles' independent battles between warriors 'first' and 'second'. Returns MonteCarloResult
+    'seed' is passed to numpy.random.default_rng() (so a numpy.random.Generator can be passed, too)
+    Battles are resolved in chunks of 'chunk_size' lanes to keep memory bounded
+    """
+    rng = np.random.default_rng(seed)
+    sides = (Side(first), Side(second))
+    # attacks[side] lists attacks performed by that side in its round
+    attacks = []
+    for index, side in enumerate(sides):
+        matchup = get_matchup(side.inventory, sides[1 - index].inventory)
+        attacks.append([Attacks(side, sides[1 - index], hand, matchup) for hand in (0, 1) if matchup.weapons[hand] is not None])
+    winners = np.empty(battles, dtype=np.int8)
+    rounds = np.empty(battles, dtype=np.int64)
+    damage_histograms = [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)]
+
+    for start in range(0, battles, chunk_size):
+        size = min(chunk_size, battles - start)
+        first_movers = resolve_initiative(rng, sides[0], sides[1], size)
+        # lanes that started with the same side stay in lockstep, so each round has a single attacking side
+        for mover in (0, 1):
+            lanes = start + np.flatnonzero(first_movers == mover)
+            fight(rng, sides, attacks, mover, lanes, winners, rounds, damage_histograms)
+
+    return MonteCarloResult((first.name, second.name), winners, rounds, damage_histograms)
+
+
+def fight(rng, sides, attacks, mover, lanes, winners, rounds, damage_histograms):
+    attacker = mover
+    attacker_health = np.full(len(lanes), sides[attacker].health, dtype=np.int32)
+    defender_health = np.full(len(lanes), sides[1 - attacker].health, dtype=np.int32)
+    rounds_count = 0
+
+    while len(lanes) > 0:
+        rounds_count += 1
+        for attack in attacks[attacker]:
+            damage, dealt = attack.resolve(rng, len(lanes))
+            defender_health -= damage
+            damage_histograms[attacker] = add_counts(damage_histograms[attacker], dealt)
+
+        dead = defender_health <= 0
+        if dead.any():
+            winners[lanes[dead]] = attacker
+            rounds[lanes[dead]] = rounds_count
+            alive = ~dead
+            lanes = lanes[alive]
+            attacker_health = attacker_health[alive]
+            defender_health = defender_health[alive]
+
+        attacker_health, defender_health = defender_health, attacker_health
+        attacker = 1 - attacker
+
+
+def add_counts(histogram, values):  # returns histogram with values counted in
+    counts = np.bincount(values)
+    if len(counts) > len(histogram):
+        counts[:len(histogram)] += histogram
+        return counts
+    histogram[:len(counts)] += counts
+    return histogram
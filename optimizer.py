@@ -0,0 +1,165 @@
+"""
+Loadout optimizer - searches the catalog for the best counters to a given opponent
+
+The search narrows the item space in three steps:
+    1) items dominated by another item of their kind (no better in any stat, worse in at least one) are pruned
+    2) every remaining legal loadout is rated with the exact solver (cheap, but blind to effects)
+    3) the best rated loadouts are escalated to simulated battles by successive halving - every rung doubles
+       the battles per loadout and keeps the better half, all loadouts of a rung fight with the same seeds
+"""
+
+import random
+from items import get_catalog
+from herald import Herald
+from solver import solve
+from tournament import enumerate_loadouts, loadout_name
+from warriors import Warrior, Battle
+
+
+def weapon_dominates(weapon, other):  # returns boolean
+    if (weapon.dmg_type, weapon.handedness) != (other.dmg_type, other.handedness):
+        return False
+    stats = (weapon.damage[0], weapon.damage[1], weapon.to_parry)
+    other_stats = (other.damage[0], other.damage[1], other.to_parry)
+    return all(stat >= other_stat for stat, other_stat in zip(stats, other_stats)) and stats != other_stats
+
+
+def shield_dominates(shield, other):  # returns boolean
+    if (shield.dmg_type, shield.handedness) != (other.dmg_type, other.handedness):
+        return False
+    stats = (shield.damage[0], shield.damage[1], shield.to_block, -shield.encumbrance)
+    other_stats = (other.damage[0], other.damage[1], other.to_block, -other.encumbrance)
+    return all(stat >= other_stat for stat, other_stat in zip(stats, other_stats)) and stats != other_stats
+
+
+def armor_dominates(armor, other):  # returns boolean
+    stats = tuple(armor.dmg_reduction) + (-armor.encumbrance,)
+    other_stats = tuple(other.dmg_reduction) + (-other.encumbrance,)
+    return all(stat >= other_stat for stat, other_stat in zip(stats, other_stats)) and stats != other_stats
+
+
+def prune_dominated(items, dominates):  # returns list of items
+    """Drops items dominated by another one, of items with equal stats only the first one is kept"""
+    kept = []
+    for item in items:
+        if any(dominates(other, item) for other in items):
+            continue
+        if any(same_stats(item, other) for other in kept):
+            continue
+        kept.append(item)
+    return kept
+
+
+def same_stats(item, other):  # returns boolean
+    return {key: value for key, value in vars(item).items() if key != "name"} == \
+        {key: value for key, value in vars(other).items() if key != "name"}
+
+
+def build_challenger(template, loadout):  # returns Warrior
+    """A fresh copy of 'template' (name, stats and effects) wielding 'loadout'"""
+    catalog = get_catalog()
+    weapon, offhand_weapon, shield, armor = loadout
+    warrior = Warrior(template.name, template.health, template.offense, template.defense,
+                      effects=template.effects.copy(), herald=Herald())
+    warrior.inventory.weapon = None if weapon is None else catalog.weapons[weapon]
+    warrior.inventory.armor = None if armor is None else catalog.armors[armor]
+    if offhand_weapon is not None:
+        warrior.inventory.offhand_weapon = catalog.weapons[offhand_weapon]
+    if shield is not None:
+        warrior.inventory.shield = catalog.shields[shield]
+    return warrior
+
+
+class Counter(object):
+    """
+    Has: loadout, estimate, wins, battles, rung
+    'estimate' is the solver's win probability, 'wins' and 'battles' come from simulation, 'rung' is the last
+    successive halving rung the loadout made it to (-1 if it was never simulated)
+    """
+
+    def __init__(self, loadout, estimate):
+        super(Counter, self).__init__()
+        self.loadout = loadout
+        self.estimate = estimate
+        self.wins = 0
+        self.battles = 0
+        self.rung = -1
+
+    def __str__(self):
+        return "{:<45} estimate: {:.4f}, simulated: {:.4f} of {} battles".format(
+            loadout_name(self.loadout), self.estimate, self.win_rate, self.battles)
+
+    @property
+    def win_rate(self):
+        return self.wins / self.battles if self.battles else self.estimate
+
+
+def estimate(challenger, opponent):  # returns float
+    """Exact win probability ignoring effects, 0.0 if the battle could never end"""
+    try:
+        return solve(challenger, opponent).win_probabilities[0]
+    except ValueError:
+        return 0.0
+
+
+def simulate(counter, template, opponent, seeds):
+    """Adds battles with the given seeds to 'counter', the opponent is copied so it's never changed"""
+    herald = Herald()
+    challenger = build_challenger(template, counter.loadout)
+    rival = opponent.copy()
+    rival.herald = herald
+    battle = Battle(challenger, rival, herald, keep_rounds=0)
+    for seed in seeds:
+        battle.reset(seed)
+        battle.commence()
+        counter.wins += challenger.health > 0
+        counter.battles += 1
+
+
+def find_counters(opponent, challenger=None, candidates=16, fights=32, rungs=4, seed=0):  # returns list of Counter
+    """
+    Ranks loadouts for 'challenger' (a default Warrior if omitted) by their chance to beat 'opponent'
+    'candidates' best estimated loadouts are simulated, 'fights' battles each on the first rung
+    Simulated loadouts come first (the further they made it the better), then the rest by their estimate
+    """
+    if challenger is None:
+        challenger = Warrior("Challenger", herald=Herald())
+    catalog = get_catalog()
+    loadouts = enumerate_loadouts(prune_dominated(list(catalog.weapons.values()), weapon_dominates),
+                                  prune_dominated(list(catalog.shields.values()), shield_dominates),
+                                  prune_dominated(list(catalog.armors.values()), armor_dominates))
+
+    counters = [Counter(loadout, estimate(build_challenger(challenger, loadout), opponent)) for loadout in loadouts]
+    counters.sort(key=lambda counter: -counter.estimate)
+
+    seeds = random.Random(seed)
+    survivors = [counter for counter in counters[:candidates] if counter.estimate > 0.0]
+    for rung in range(rungs):
+        if not survivors:
+            break
+        rung_seeds = [seeds.getrandbits(64) for _ in range(fights << rung)]
+        for counter in survivors:
+            simulate(counter, challenger, opponent, rung_seeds)
+            counter.rung = rung
+        if len(survivors) == 1:
+            break
+        survivors.sort(key=lambda counter: -counter.win_rate)
+        survivors = survivors[:max(1, len(survivors) // 2)]
+
+    counters.sort(key=lambda counter: (-counter.rung, -counter.win_rate))
+    return counters
+
+
+def main():
+    """Finds counters to Rogbar, the dual wielder"""
+    catalog = get_catalog()
+    rogbar = Warrior("Rogbar", herald=Herald())
+    rogbar.equip_weapon(catalog.weapons["Longsword"])
+    rogbar.equip_offhand_weapon(catalog.weapons["Short Sword"])
+    rogbar.equip_armor(catalog.armors["Chainmail"])
+    for place, counter in enumerate(find_counters(rogbar)[:10], start=1):
+        print("{:>3}. {}".format(place, counter))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from random import randrange
 import math
 
+MECHANICS_VERSION = 1  # bump whenever a change to the rules changes battle outcomes (invalidates cached results)
 OFFHAND_MODIFIER = 0.75
 BLUDGEONING_MODIFIER = 0.75
 SLASHING_MODIFIER = 1.00
@@ -9,15 +10,20 @@ PIERCING_MODIFIER = 1.25
 
 class RoundPhase(object):
     """
-    Has: attacker, defender, result
+    Has: attacker, defender, result, dice
     The root for all classes in this module
     This class is treated as an abstract class and shouldn't be instantiated
+    Rolls come from 'dice' (a dice.Dice owned by the battle) or from the global random module if it's None
+    All phases are slotted - they're created a few times every round
     """
 
-    def __init__(self, attacker, defender):
+    __slots__ = ("attacker", "defender", "result", "dice")
+
+    def __init__(self, attacker, defender, dice=None):
         super(RoundPhase, self).__init__()
         self.attacker = attacker
         self.defender = defender
+        self.dice = dice
         self.result = None  # depends entirely on child class calculate_result() implementation
 
     def calculate_result(self):  # to be overriden in child (last generation!) classes
@@ -30,17 +36,29 @@ class TwoRollsPhase(RoundPhase):
     This class is treated as an abstract class and shouldn't be instantiated
     """
 
-    def __init__(self, attacker, defender):
-        super(TwoRollsPhase, self).__init__(attacker, defender)
-        self.attacker_roll = randrange(1, 21)
-        self.defender_roll = randrange(1, 21)
+    __slots__ = ("attacker_roll", "defender_roll")
+
+    def __init__(self, attacker, defender, dice=None):
+        # RoundPhase.__init__() inlined - phases are built on the hot path of every round
+        self.attacker = attacker
+        self.defender = defender
+        self.result = None
+        self.dice = dice
+        if dice is None:
+            self.attacker_roll = randrange(1, 21)
+            self.defender_roll = randrange(1, 21)
+        else:
+            self.attacker_roll = dice.d20()
+            self.defender_roll = dice.d20()
 
 
 class Initiative(TwoRollsPhase):
     """Has: implementation for result"""
 
-    def __init__(self, attacker, defender):
-        super(Initiative, self).__init__(attacker, defender)
+    __slots__ = ()
+
+    def __init__(self, attacker, defender, dice=None):
+        super(Initiative, self).__init__(attacker, defender, dice)
         self.result = self.calculate_result()
 
     def calculate_result(self):  # returns string
@@ -54,13 +72,17 @@ class Initiative(TwoRollsPhase):
 
 class Attack(TwoRollsPhase):
     """
-    Has: offhand_modifier, block, parry and dmg_dealt.
+    Has: offhand_modifier, matchup, block, parry and dmg_dealt.
+    Pass a compiled matchup.Matchup of the warriors' inventories to skip re-evaluating their gear on every swing
     """
 
+    __slots__ = ("offhand_modifier", "matchup", "block", "parry", "dmg_dealt")
+
     # if you want an off-hand attack, pass an offhand_modifier that is not None
-    def __init__(self, attacker, defender, offhand_modifier=None):
-        super(Attack, self).__init__(attacker, defender)
+    def __init__(self, attacker, defender, offhand_modifier=None, matchup=None, dice=None):
+        super(Attack, self).__init__(attacker, defender, dice)
         self.offhand_modifier = offhand_modifier
+        self.matchup = matchup
         self.result = self.calculate_result()
         self.block = None
         self.parry = None
@@ -68,26 +90,54 @@ class Attack(TwoRollsPhase):
         if self.result >= 0:
             self.resolve()
 
-    def calculate_result(self):  # returns int
+    @property
+    def offense(self):  # returns int - attacker's offense as modified by its effects (see effects.MODIFIERS)
+        offense = self.attacker.offense + self.attacker.effects.modifier("offense")
         if self.offhand_modifier is None:  # this is not an off-hand attack
-            return self.attacker.offense + self.attacker_roll - (self.defender.defense + self.defender_roll)
+            return offense
         else:  # this is an off-hand attack
-            return math.floor(self.attacker.offense * self.offhand_modifier) + self.attacker_roll - (self.defender.defense + self.defender_roll)
+            return math.floor(offense * self.offhand_modifier)
+
+    @property
+    def defense(self):  # returns int - defender's defense as modified by its effects
+        return self.defender.defense + self.defender.effects.modifier("defense")
+
+    def calculate_result(self):  # returns int
+        return self.offense + self.attacker_roll - (self.defense + self.defender_roll)
 
     def resolve(self):
+        if self.matchup is not None:
+            self.resolve_matchup()
+            return
+
         hit_deflected = False
         if self.defender.inventory.shield is not None:
-            self.block = Block(self.attacker, self.defender, self.result)
+            self.block = Block(self.attacker, self.defender, self.result, dice=self.dice)
             hit_deflected = self.block.result
-        elif self.defender.inventory.weapon is not None or self.defender.offhand_weapon is not None:
-            self.parry = Parry(self.attacker, self.defender, self.result)
+        elif self.defender.inventory.weapon is not None or self.defender.inventory.offhand_weapon is not None:
+            self.parry = Parry(self.attacker, self.defender, self.result, dice=self.dice)
             hit_deflected = self.parry.result
         if not hit_deflected:
             if self.offhand_modifier is None:  # this is not an off-hand attack
                 weapon = self.attacker.inventory.weapon
             else:  # this is an off-hand attack
                 weapon = self.attacker.inventory.offhand_weapon
-            self.dmg_dealt = DamageDealt(self.attacker, self.defender, self.result, weapon)
+            self.dmg_dealt = DamageDealt(self.attacker, self.defender, self.result, weapon, dice=self.dice)
+            self.defender.health -= self.dmg_dealt.result
+
+    def resolve_matchup(self):
+        matchup = self.matchup
+        hit_deflected = False
+        if matchup.blocking_bonus is not None:
+            self.block = Block(self.attacker, self.defender, self.result, matchup.blocking_bonus, self.dice)
+            hit_deflected = self.block.result
+        elif matchup.parries:
+            self.parry = Parry(self.attacker, self.defender, self.result, parrying_bonus=matchup.parrying_bonus, dice=self.dice)
+            hit_deflected = self.parry.result
+        if not hit_deflected:
+            hand = 0 if self.offhand_modifier is None else 1
+            self.dmg_dealt = DamageDealt(self.attacker, self.defender, self.result, matchup.weapons[hand],
+                                         matchup.dmg_factors(hand, self.result), self.dice)
             self.defender.health -= self.dmg_dealt.result
 
 
@@ -97,21 +147,36 @@ class OneRollAfterAttackPhase(RoundPhase):
     This class is treated as an abstract class and shouldn't be instantiated
     """
 
-    def __init__(self, attacker, defender, hit_result):
-        super(OneRollAfterAttackPhase, self).__init__(attacker, defender)
-        self.roll = randrange(1, 21)
+    __slots__ = ("roll", "hit_result")
+
+    def __init__(self, attacker, defender, hit_result, dice=None):
+        # RoundPhase.__init__() inlined - phases are built on the hot path of every round
+        self.attacker = attacker
+        self.defender = defender
+        self.result = None
+        self.dice = dice
+        if dice is None:
+            self.roll = randrange(1, 21)
+        else:
+            self.roll = dice.d20()
         self.hit_result = hit_result
 
 
 class Block(OneRollAfterAttackPhase):
-    """Has: implementation for result"""
+    """Has: blocking_bonus, implementation for result"""
+
+    __slots__ = ("blocking_bonus",)
 
-    def __init__(self, attacker, defender, hit_result):
-        super(Block, self).__init__(attacker, defender, hit_result)
+    # blocking_bonus is the defender's shield's to_block, unless precomputed one is passed
+    def __init__(self, attacker, defender, hit_result, blocking_bonus=None, dice=None):
+        super(Block, self).__init__(attacker, defender, hit_result, dice)
+        if blocking_bonus is None:
+            blocking_bonus = self.defender.inventory.shield.to_block
+        self.blocking_bonus = blocking_bonus
         self.result = self.calculate_result()
 
     def calculate_result(self):  # returns boolean
-        result = self.defender.inventory.shield.to_block + self.roll - self.hit_result
+        result = self.blocking_bonus + self.roll - self.hit_result
         if result < 0:
             return False
         else:
@@ -129,10 +194,15 @@ class Parry(OneRollAfterAttackPhase):
         3) defender can parry only with off-hand weapon ==> parrying bonus = OFFHAND_MODIFIER off-hand weapon's to_parry
     """
 
-    def __init__(self, attacker, defender, hit_result, offhand_modifier=OFFHAND_MODIFIER):
-        super(Parry, self).__init__(attacker, defender, hit_result)
+    __slots__ = ("offhand_modifier", "parrying_bonus")
+
+    # pass a precomputed parrying_bonus to skip the case analysis below
+    def __init__(self, attacker, defender, hit_result, offhand_modifier=OFFHAND_MODIFIER, parrying_bonus=None, dice=None):
+        super(Parry, self).__init__(attacker, defender, hit_result, dice)
         self.offhand_modifier = offhand_modifier
-        self.parrying_bonus = self.calculate_parrying_bonus()
+        if parrying_bonus is None:
+            parrying_bonus = self.calculate_parrying_bonus()
+        self.parrying_bonus = parrying_bonus
         self.result = self.calculate_result()
 
     def calculate_parrying_bonus(self):  # returns int
@@ -163,27 +233,24 @@ class Parry(OneRollAfterAttackPhase):
 class DamageDealt(OneRollAfterAttackPhase):
     """Has: weapon, augmenting, reduction"""
 
-    def __init__(self, attacker, defender, hit_result, weapon):
-        super(DamageDealt, self).__init__(attacker, defender, hit_result)
+    __slots__ = ("weapon", "augmenting", "reduction")
+
+    # pass precomputed (augmenting, reduction) dmg_factors to skip the damage type dispatch below
+    def __init__(self, attacker, defender, hit_result, weapon, dmg_factors=None, dice=None):
+        super(DamageDealt, self).__init__(attacker, defender, hit_result, dice)
         self.weapon = weapon
-        self.roll = randrange(self.weapon.damage[0], self.weapon.damage[1] + 1)
-        self.augmenting, self.reduction = self.calculate_dmg_factors()  # float, int
+        if dice is None:
+            self.roll = randrange(self.weapon.damage[0], self.weapon.damage[1] + 1)
+        else:
+            self.roll = dice.roll(self.weapon.damage[0], self.weapon.damage[1])
+        if dmg_factors is None:
+            dmg_factors = self.calculate_dmg_factors()
+        self.augmenting, self.reduction = dmg_factors  # float, int
         self.result = self.calculate_result()
 
     def calculate_dmg_factors(self):  # returns (float, int)
-        augmenting = 0.0
-        reduction = 0
-        if self.weapon.dmg_type == "bludgeoning":
-            augmenting += (1 + self.hit_result / 20) * BLUDGEONING_MODIFIER
-            reduction += self.defender.inventory.armor.dmg_reduction.bludgeoning
-        elif self.weapon.dmg_type == "slashing":
-            augmenting += 1 + self.hit_result / 20 * SLASHING_MODIFIER
-            reduction += self.defender.inventory.armor.dmg_reduction.slashing
-        elif self.weapon.dmg_type == "piercing":
-            augmenting += (1 + self.hit_result / 20) * PIERCING_MODIFIER
-            reduction += self.defender.inventory.armor.dmg_reduction.piercing
-
-        return augmenting, reduction
+        from matchup import calculate_dmg_factors  # matchup builds on this module, so it's imported on first use
+        return calculate_dmg_factors(self.weapon, self.defender.inventory.armor, self.hit_result)
 
     def calculate_result(self):  # returns int
         result = math.floor(self.roll * self.augmenting) - self.reduction
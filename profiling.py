@@ -0,0 +1,202 @@
+"""
+Opt-in profiling of the battle hot path - counts and cumulative time per phase type, rolls and herald calls
+
+Nothing is measured (and nothing costs anything but a single check per round) until profiling is switched on:
+    globally    - enable() makes every Battle created afterwards report to one Profiler, disable() stops it
+    per Battle  - Battle(..., profiler=Profiler()) reports only that battle
+
+While a profiled battle is fighting (or profiling is enabled globally), constructors of the phases (Initiative,
+Attack, Block, Parry, DamageDealt - a phase is resolved in its constructor), BattleRound.resolve_effects() and the
+Dice methods are replaced with timing wrappers. The wrappers are reference counted - a profiled battle holds them
+from its initiative until it's finished (or reset), so they're put in place once per battle and removed as soon as
+no profiled battle is being fought and profiling isn't enabled - unprofiled battles never pay for them.
+The wrappers report to the profiler of the battle the calling thread is fighting, so battles fought by several
+threads at once keep their profiles apart (the wrappers are shared though, so every thread pays for them).
+Times are inclusive - an Attack's time contains its Block, Parry and
+DamageDealt, every phase's time contains its rolls. A battle's herald is wrapped as well, so every herald call is
+timed on its own.
+"""
+
+import _thread  # threading.local is _thread._local, importing threading itself would slow down 'import warriors'
+from time import perf_counter
+
+from herald import Herald
+
+PROFILER = None  # profiler of all new battles while profiling is enabled globally
+PATCHES = []  # (owner, attribute name, original) of all installed wrappers
+USERS = 0  # profiled battles being fought plus 1 while profiling is enabled globally, the wrappers are installed while > 0
+USERS_LOCK = _thread.allocate_lock()
+
+HERALD_METHODS = ("introduce_battle", "report_initiative", "introduce_round", "report_attack", "close_battle",
+                  "introduce_melee", "report_fall", "close_melee", "report", "report_equip", "report_drop",
+                  "report_gain_effect", "report_discard_effect")
+
+
+class Profiler(object):
+    """
+    Has: counts, seconds - dicts keyed by the measured thing's name ("Attack", "Dice.d20", "herald.report_attack", ...)
+    """
+
+    def __init__(self):
+        super(Profiler, self).__init__()
+        self.counts = {}
+        self.seconds = {}
+
+    def __str__(self):
+        lines = []
+        for name, stats in sorted(self.snapshot().items(), key=lambda item: -item[1]["seconds"]):
+            lines.append("{:<40} {:>10} calls {:>10.4f} s {:>9.3f} us/call".format(
+                name, stats["count"], stats["seconds"], stats["us_per_call"]))
+        return "\n".join(lines)
+
+    def add(self, name, elapsed):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.seconds[name] = self.seconds.get(name, 0.0) + elapsed
+
+    def snapshot(self):  # returns dict of name to {"count", "seconds", "us_per_call"}
+        return {name: {"count": count, "seconds": self.seconds[name], "us_per_call": self.seconds[name] / count * 1000000}
+                for name, count in self.counts.items()}
+
+    def dump(self, path):
+        import json
+        with open(path, "w") as json_file:
+            json.dump(self.snapshot(), json_file, indent=4, sort_keys=True)
+
+    def reset(self):
+        self.counts = {}
+        self.seconds = {}
+
+
+class Active(_thread._local):
+    """Has: profiler - of the battle the thread is fighting right now (None if none), timing wrappers report to it"""
+
+    profiler = None
+
+
+ACTIVE = Active()
+
+
+class Activation(object):
+    """
+    Context manager making 'profiler' the ACTIVE one of this thread (battles may nest, e.g. a replay fought
+    mid-battle) - cheap enough to enter every round, the wrappers have to be installed by acquire() beforehand
+    """
+
+    def __init__(self, profiler):
+        super(Activation, self).__init__()
+        self.profiler = profiler
+        self.previous = None
+
+    def __enter__(self):
+        self.previous = ACTIVE.profiler
+        ACTIVE.profiler = self.profiler
+        return self.profiler
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ACTIVE.profiler = self.previous
+
+
+def timed(name, function):  # returns function reporting every call of 'function' to the ACTIVE profiler
+    def wrapper(*args, **kwargs):
+        profiler = ACTIVE.profiler
+        if profiler is None:
+            return function(*args, **kwargs)
+        started = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.add(name, perf_counter() - started)
+
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+
+def patch(owner, attribute, name):
+    PATCHES.append((owner, attribute, getattr(owner, attribute)))
+    setattr(owner, attribute, timed(name, getattr(owner, attribute)))
+
+
+def acquire():
+    """Installs the timing wrappers for one more user"""
+    global USERS
+    with USERS_LOCK:
+        if USERS == 0:
+            install()
+        USERS += 1
+
+
+def release():
+    """Removes the timing wrappers once their last user is done"""
+    global USERS
+    with USERS_LOCK:
+        USERS -= 1
+        if USERS == 0:
+            uninstall()
+
+
+def install():
+    """Puts timing wrappers in place (once) - use acquire() and release(), which keep track of their users"""
+    if PATCHES:
+        return
+    import phases
+    import warriors
+    from dice import Dice
+
+    for phase in ("Initiative", "Attack", "Block", "Parry", "DamageDealt"):  # a phase is resolved in its constructor
+        patch(getattr(phases, phase), "__init__", phase)
+    patch(warriors.BattleRound, "resolve_effects", "BattleRound.resolve_effects")
+    patch(Dice, "d20", "Dice.d20")
+    patch(Dice, "roll", "Dice.roll")
+
+
+def uninstall():
+    while PATCHES:
+        owner, attribute, original = PATCHES.pop()
+        setattr(owner, attribute, original)
+
+
+def enable(profiler=None):  # returns Profiler
+    """Profiles all battles created from now on (until disable()) with 'profiler' (a new one if not given)"""
+    global PROFILER
+    if PROFILER is None:
+        acquire()
+    PROFILER = Profiler() if profiler is None else profiler
+    return PROFILER
+
+
+def disable():
+    global PROFILER
+    if PROFILER is not None:
+        PROFILER = None
+        release()
+
+
+class ProfilingHerald(Herald):
+    """
+    Has: herald, profiler
+    Passes all announcements to 'herald', timing each of them
+    """
+
+    def __init__(self, herald, profiler):
+        super(ProfilingHerald, self).__init__()
+        self.herald = herald
+        self.profiler = profiler
+
+
+def profiled_call(method):  # returns ProfilingHerald method passing the call to the wrapped herald
+    name = "herald." + method
+
+    def call(self, *args):
+        started = perf_counter()
+        try:
+            return getattr(self.herald, method)(*args)
+        finally:
+            self.profiler.add(name, perf_counter() - started)
+
+    call.__name__ = method
+    return call
+
+
+for herald_method in HERALD_METHODS:
+    setattr(ProfilingHerald, herald_method, profiled_call(herald_method))
@@ -0,0 +1,273 @@
+"""
+Persistent cache of matchup results - solver solutions and simulated battle statistics
+
+Entries live in an SQLite file and are keyed by a canonical hash of both warriors (stats, effects and full stats of
+every piece of gear, not just item names) and phases.MECHANICS_VERSION, so a changed item or rule never hits a
+stale entry. The number of simulated battles isn't part of the key - asking for more battles than an entry holds
+simulates only the missing ones and adds them to it. The least recently used entries are evicted once the cache
+holds more than 'max_entries'.
+
+Every entry also records the items it depends on, and the cache remembers a content hash of every item it has
+seen. refresh_items() compares them to a (reloaded) catalog and drops the entries of changed items, so a sweep
+after a single item change knows which matchups it has to fight again - the rest are still hits.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import time
+
+from items import CACHE_DIR
+from herald import Herald
+from phases import MECHANICS_VERSION
+from solver import Solution, solve
+from tournament import is_stalemate
+from warriors import Battle
+
+DEFAULT_PATH = os.path.join(CACHE_DIR, "results.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    description TEXT NOT NULL,
+    first_wins REAL NOT NULL,
+    second_wins REAL NOT NULL,
+    battles INTEGER NOT NULL,
+    rounds REAL NOT NULL,
+    first_initiative REAL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS dependencies (
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (kind, item, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dependencies_key ON dependencies (key);
+CREATE TABLE IF NOT EXISTS item_hashes (
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (kind, item)
+);
+"""
+SLOT_KINDS = ("weapons", "weapons", "shields", "armors")  # catalog kinds of Inventory.loadout's slots
+
+
+def describe_item(item):  # returns list of an item's stats (None for an empty slot)
+    if item is None:
+        return None
+    return sorted((key, list(value) if isinstance(value, tuple) else value)
+                  for key, value in vars(item).items() if not key.startswith("_"))
+
+
+def describe(warrior):  # returns dict
+    """Everything about a warrior that can change the outcome of a battle, the name excluded"""
+    inventory = warrior.inventory
+    return {
+        "health": warrior.health,
+        "offense": warrior.offense,
+        "defense": warrior.defense,
+        "effects": sorted(effect.name for effect in warrior.effects),
+        "gear": [describe_item(item) for item in inventory.loadout],
+        "items": sorted(item.name for item in inventory.items)
+    }
+
+
+def item_hash(kind, item):  # returns hex digest of the item's definition
+    return hashlib.sha256(json.dumps([kind, describe_item(item)]).encode()).hexdigest()
+
+
+def catalog_hashes(catalog):  # returns dict of (kind, item name) to item_hash()
+    return {(kind, name): item_hash(kind, item)
+            for kind in ("weapons", "shields", "armors") for name, item in getattr(catalog, kind).items()}
+
+
+def dependencies(*warriors):  # returns set of (kind, item name) of the warriors' gear
+    return {(kind, item.name) for warrior in warriors
+            for kind, item in zip(SLOT_KINDS, warrior.inventory.loadout) if item is not None}
+
+
+def matchup_key(kind, first, second):  # returns (key, description JSON)
+    description = json.dumps({"kind": kind, "mechanics": MECHANICS_VERSION,
+                              "first": describe(first), "second": describe(second)}, sort_keys=True)
+    return hashlib.sha256(description.encode()).hexdigest(), description
+
+
+class SimulationResult(object):
+    """
+    Has: names, wins, battles, rounds
+    'wins' holds the pair of battles won (first warrior's, second warrior's), 'rounds' the total of all battles' rounds
+    """
+
+    def __init__(self, names, wins, battles, rounds):
+        super(SimulationResult, self).__init__()
+        self.names = names
+        self.wins = wins
+        self.battles = battles
+        self.rounds = rounds
+
+    def __str__(self):
+        return "{} vs {}: {} battles, win rates: {:.4f}/{:.4f}, mean rounds: {:.2f}".format(
+            self.names[0], self.names[1], self.battles, self.win_rates[0], self.win_rates[1], self.mean_rounds)
+
+    @property
+    def win_rates(self):
+        return self.wins[0] / self.battles, self.wins[1] / self.battles
+
+    @property
+    def mean_rounds(self):
+        return self.rounds / self.battles
+
+
+def simulate(first, second, battles, seed):  # returns (first's wins, second's wins, rounds in total)
+    """Fights 'battles' headless battles between copies of the warriors"""
+    herald = Herald()
+    first, second = first.copy(), second.copy()
+    first.herald = second.herald = herald
+    battle = Battle(first, second, herald, keep_rounds=0)
+    seeds = random.Random(seed)
+    wins = [0, 0]
+    rounds = 0
+    for _ in range(battles):
+        battle.reset(seeds.getrandbits(64))
+        battle.commence()
+        wins[0 if first.health > 0 else 1] += 1
+        rounds += battle.rounds_count
+    return wins[0], wins[1], rounds
+
+
+class ResultCache(object):
+    """
+    Has: path, max_entries, hits, misses
+    Use as a context manager or close() when done
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_entries=10000):
+        super(ResultCache, self).__init__()
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")  # a hit only updates 'last_used', no need to sync
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def lookup(self, key):  # returns row tuple (first_wins, second_wins, battles, rounds, first_initiative) or None
+        row = self.connection.execute(
+            "SELECT first_wins, second_wins, battles, rounds, first_initiative FROM results WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            with self.connection:
+                self.connection.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def store(self, key, kind, description, first_wins, second_wins, battles, rounds, first_initiative=None,
+              items=()):
+        """'items' are (kind, item name) pairs the entry depends on"""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, kind, description, first_wins, second_wins, battles, rounds, first_initiative, time.time()))
+            self.connection.executemany("INSERT OR IGNORE INTO dependencies VALUES (?, ?, ?)",
+                                        [(item_kind, name, key) for item_kind, name in items])
+            self.evict()
+
+    def evict(self):
+        excess = len(self) - self.max_entries
+        if excess > 0:
+            keys = [(key,) for key, in self.connection.execute(
+                "SELECT key FROM results ORDER BY last_used LIMIT ?", (excess,))]
+            self.delete(keys)
+
+    def delete(self, keys):
+        """Drops entries (a list of 1-tuples of keys) with their dependencies"""
+        self.connection.executemany("DELETE FROM results WHERE key = ?", keys)
+        self.connection.executemany("DELETE FROM dependencies WHERE key = ?", keys)
+
+    def dependents(self, items):  # returns set of keys of entries depending on any of the (kind, item name) pairs
+        keys = set()
+        for kind, name in items:
+            keys.update(key for key, in self.connection.execute(
+                "SELECT key FROM dependencies WHERE kind = ? AND item = ?", (kind, name)))
+        return keys
+
+    def invalidate(self, items):  # returns number of entries dropped
+        """Drops entries depending on any of the (kind, item name) pairs"""
+        keys = [(key,) for key in self.dependents(items)]
+        with self.connection:
+            self.delete(keys)
+        return len(keys)
+
+    def refresh_items(self, catalog):  # returns set of (kind, item name) changed since the last refresh
+        """
+        Compares item content hashes of 'catalog' to the ones seen last time, drops entries of changed (or removed)
+        items and remembers the new hashes. Items seen for the first time don't count as changed
+        """
+        hashes = catalog_hashes(catalog)
+        known = {(kind, name): digest for kind, name, digest in
+                 self.connection.execute("SELECT kind, item, hash FROM item_hashes")}
+        changed = {item for item, digest in known.items() if hashes.get(item) != digest}
+        self.invalidate(changed)
+        with self.connection:
+            self.connection.execute("DELETE FROM item_hashes")
+            self.connection.executemany("INSERT INTO item_hashes VALUES (?, ?, ?)",
+                                        [(kind, name, digest) for (kind, name), digest in hashes.items()])
+        return changed
+
+    def solve(self, first, second):  # returns solver.Solution
+        """Exact solution, computed once per matchup"""
+        key, description = matchup_key("solver", first, second)
+        row = self.lookup(key)
+        if row is not None:
+            self.hits += 1
+            first_wins, second_wins, _, expected_rounds, initiative = row
+        else:
+            self.misses += 1
+            solution = solve(first, second)
+            first_wins, second_wins = solution.win_probabilities
+            expected_rounds = solution.expected_rounds
+            initiative = solution.initiative_probabilities[0]
+            self.store(key, "solver", description, first_wins, second_wins, 0, expected_rounds, initiative,
+                       dependencies(first, second))
+        return Solution((first.name, second.name), (first_wins, second_wins), expected_rounds,
+                        (initiative, 1 - initiative))
+
+    def simulate(self, first, second, battles, seed=0):  # returns SimulationResult
+        """
+        Statistics of at least 'battles' simulated battles, only the battles the cached entry is missing are fought
+        Every batch of added battles gets its own seed derived from 'seed', the matchup and the battles already done
+        """
+        key, description = matchup_key("simulation", first, second)
+        row = self.lookup(key)
+        first_wins, second_wins, done, rounds = (0, 0, 0, 0) if row is None else row[:4]
+        if done >= battles:
+            self.hits += 1
+        else:
+            self.misses += 1
+            if is_stalemate(first, second):
+                raise ValueError("Neither of the warriors can deal any damage, the battle would never end")
+            batch_seed = random.Random("{}:{}:{}".format(seed, key, done)).getrandbits(64)
+            added = simulate(first, second, battles - done, batch_seed)
+            first_wins, second_wins, rounds = first_wins + added[0], second_wins + added[1], rounds + added[2]
+            done = battles
+            self.store(key, "simulation", description, first_wins, second_wins, done, rounds,
+                       items=dependencies(first, second))
+        return SimulationResult((first.name, second.name), (int(first_wins), int(second_wins)), done, int(rounds))
@@ -0,0 +1,216 @@
+"""
+Append-only columnar store of per-battle results
+
+A store is a directory. Every battle is a row of fixed-width columns (see COLUMNS), loadouts are stored once in
+'loadouts.json' and referenced by id. Rows are buffered in array.array columns and written as a chunk once
+'chunk_size' of them pile up: a chunk-NNNNNN directory with one .npy file per column, read back memory-mapped,
+so queries touch only the columns they need and never build Python objects per battle.
+
+Every chunk also keeps the sorted ids of loadouts it holds (its index), so queries by loadout, item or effect
+skip chunks without any matching loadout:
+
+    with ResultStore("results") as store:
+        store.add_battle(battle)
+    ResultStore("results").summary(by="loadout", item="Tower Shield")
+"""
+
+import json
+import os
+from array import array
+
+import numpy as np
+
+from tournament import loadout_name
+
+LOADOUTS_FILE = "loadouts.json"
+INDEX_FILE = "loadout_ids.npy"
+COLUMNS = (
+    ("first", "I"),  # loadout ids
+    ("second", "I"),
+    ("winner", "B"),  # 0 if the first warrior won, 1 if the second did
+    ("rounds", "I"),
+    ("first_health", "h"),  # health at the end
+    ("second_health", "h"),
+    ("first_damage", "I"),  # damage dealt in total
+    ("second_damage", "I"),
+    ("seed", "Q"),
+)
+GROUPINGS = ("loadout", "matchup", "item", "effect")
+
+
+def describe_loadout(warrior):  # returns (name, items, effects)
+    items = tuple(item.name for item in warrior.inventory.loadout if item is not None)
+    return loadout_name(tuple(None if item is None else item.name for item in warrior.inventory.loadout)), items, \
+        tuple(sorted(effect.name for effect in warrior.effects))
+
+
+class ResultStore(object):
+    """
+    Has: path, chunk_size, loadouts, chunks
+    'loadouts' lists (name, items, effects) by loadout id, 'chunks' paths of the chunks written so far
+    Rows added are readable only once flushed - close() (or leaving the context) flushes the rest
+    """
+
+    def __init__(self, path, chunk_size=1 << 20):
+        super(ResultStore, self).__init__()
+        self.path = path
+        self.chunk_size = chunk_size
+        os.makedirs(path, exist_ok=True)
+        loadouts_path = os.path.join(path, LOADOUTS_FILE)
+        self.loadouts = []
+        if os.path.exists(loadouts_path):
+            with open(loadouts_path) as loadouts_file:
+                self.loadouts = [(name, tuple(items), tuple(effects)) for name, items, effects in json.load(loadouts_file)]
+        self.loadout_ids = {loadout: loadout_id for loadout_id, loadout in enumerate(self.loadouts)}
+        self.chunks = sorted(os.path.join(path, name) for name in os.listdir(path) if name.startswith("chunk-"))
+        self.buffers = {name: array(typecode) for name, typecode in COLUMNS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return sum(len(np.load(os.path.join(chunk, "winner.npy"), mmap_mode="r")) for chunk in self.chunks)
+
+    def close(self):
+        self.flush()
+
+    def loadout_id(self, warrior):  # returns int
+        loadout = describe_loadout(warrior)
+        loadout_id = self.loadout_ids.get(loadout)
+        if loadout_id is None:
+            loadout_id = self.loadout_ids[loadout] = len(self.loadouts)
+            self.loadouts.append(loadout)
+        return loadout_id
+
+    def add(self, first, second, winner, rounds, first_health, second_health, first_damage, second_damage, seed):
+        """Adds a row, 'first' and 'second' are loadout ids"""
+        buffers = self.buffers
+        buffers["first"].append(first)
+        buffers["second"].append(second)
+        buffers["winner"].append(winner)
+        buffers["rounds"].append(rounds)
+        buffers["first_health"].append(first_health)
+        buffers["second_health"].append(second_health)
+        buffers["first_damage"].append(first_damage)
+        buffers["second_damage"].append(second_damage)
+        buffers["seed"].append(seed)
+        if len(buffers["winner"]) >= self.chunk_size:
+            self.flush()
+
+    def add_battle(self, battle):
+        """Adds a finished battle, its warriors are taken in the order they were passed in"""
+        first, second = battle.warriors
+        self.add(self.loadout_id(first), self.loadout_id(second), 0 if first.health > 0 else 1, battle.rounds_count,
+                 first.health, second.health, battle.stats.damage.get(first, 0),
+                 battle.stats.damage.get(second, 0), battle.seed)
+
+    def flush(self):
+        """Writes buffered rows as a new chunk (written aside and renamed, so readers never see half of it)"""
+        if self.buffers["winner"]:
+            chunk = os.path.join(self.path, "chunk-{:06d}".format(len(self.chunks)))
+            temporary = "{}.{}.tmp".format(chunk, os.getpid())
+            os.makedirs(temporary)
+            for name, _ in COLUMNS:
+                np.save(os.path.join(temporary, name + ".npy"), np.frombuffer(self.buffers[name], self.buffers[name].typecode))
+            np.save(os.path.join(temporary, INDEX_FILE), np.union1d(np.frombuffer(self.buffers["first"], "I"),
+                                                                     np.frombuffer(self.buffers["second"], "I")))
+            os.replace(temporary, chunk)
+            self.chunks.append(chunk)
+            self.buffers = {name: array(typecode) for name, typecode in COLUMNS}
+        temporary = os.path.join(self.path, LOADOUTS_FILE + ".tmp")
+        with open(temporary, "w") as loadouts_file:
+            json.dump(self.loadouts, loadouts_file)
+        os.replace(temporary, os.path.join(self.path, LOADOUTS_FILE))
+
+    def find_loadouts(self, loadout=None, item=None, effect=None):  # returns numpy array of loadout ids (None if any)
+        """Ids of loadouts with the given name, holding the given item and having the given effect"""
+        if loadout is None and item is None and effect is None:
+            return None
+        return np.array([loadout_id for loadout_id, (name, items, effects) in enumerate(self.loadouts)
+                         if (loadout is None or name == loadout) and (item is None or item in items)
+                         and (effect is None or effect in effects)], dtype=np.uint32)
+
+    def scan(self, columns, loadout=None, item=None, effect=None):  # returns iterator of dicts of column arrays
+        """
+        Matching rows chunk by chunk - rows where either warrior's loadout matches all the filters given
+        Chunks without any matching loadout aren't read at all, and neither are columns not asked for
+        """
+        ids = self.find_loadouts(loadout, item, effect)
+        for chunk in self.chunks:
+            if ids is not None:
+                if not len(ids) or not np.isin(ids, np.load(os.path.join(chunk, INDEX_FILE))).any():
+                    continue
+            read = set(columns) | ({"first", "second"} if ids is not None else set())
+            arrays = {name: np.load(os.path.join(chunk, name + ".npy"), mmap_mode="r") for name in read}
+            if ids is not None:
+                mask = np.isin(arrays["first"], ids) | np.isin(arrays["second"], ids)
+                if not mask.any():
+                    continue
+                arrays = {name: values[mask] for name, values in arrays.items()}
+            yield {name: arrays[name] for name in columns}
+
+    def query(self, columns=None, loadout=None, item=None, effect=None):  # returns dict of column arrays
+        """All matching rows at once, only for results that fit in memory - see scan()"""
+        columns = [name for name, _ in COLUMNS] if columns is None else list(columns)
+        parts = list(self.scan(columns, loadout, item, effect))
+        return {name: np.concatenate([part[name] for part in parts]) if parts else
+                np.empty(0, dict(COLUMNS)[name]) for name in columns}
+
+    def summary(self, by="loadout", loadout=None, item=None, effect=None):  # returns dict of group to aggregates
+        """
+        Aggregates battles matching the filters: battles, wins, win_rate, mean_rounds, mean_damage (dealt) per
+        group of 'by' (opponents of the matching loadouts are grouped as well):
+            loadout - per loadout name, from its own side of every battle it fought
+            item    - per item, over the loadouts holding it
+            effect  - per effect, over the loadouts having it
+            matchup - per (first loadout name, second loadout name), from the first side
+        Every chunk is reduced with numpy.bincount, so rows never become Python objects
+        """
+        if by not in GROUPINGS:
+            raise ValueError("Can't group by {}, only by one of: {}".format(by, ", ".join(GROUPINGS)))
+        totals = {}  # group id: [battles, wins, rounds, damage]
+        columns = ("first", "second", "winner", "rounds", "first_damage", "second_damage")
+        for arrays in self.scan(columns, loadout, item, effect):
+            if by == "matchup":
+                sides = [(arrays["first"].astype(np.int64) * len(self.loadouts) + arrays["second"],
+                          arrays["winner"] == 0, arrays["first_damage"])]
+            else:
+                sides = [(arrays["first"], arrays["winner"] == 0, arrays["first_damage"]),
+                         (arrays["second"], arrays["winner"] == 1, arrays["second_damage"])]
+            for ids, won, damage in sides:
+                if by == "matchup":  # too many possible pairs to count them all, only the ones present are
+                    group_ids, ids = np.unique(ids, return_inverse=True)
+                    size = len(group_ids)
+                else:
+                    group_ids, size = None, len(self.loadouts)
+                sums = (np.bincount(ids, minlength=size), np.bincount(ids, won, size),
+                        np.bincount(ids, arrays["rounds"], size), np.bincount(ids, damage, size))
+                present = np.flatnonzero(sums[0])
+                group_ids = present if group_ids is None else group_ids[present]
+                for group_id, *values in zip(group_ids.tolist(), *(values[present].tolist() for values in sums)):
+                    total = totals.setdefault(group_id, [0, 0, 0, 0])
+                    for index, value in enumerate(values):
+                        total[index] += int(value)
+
+        groups = {}
+        for group_id, values in totals.items():
+            for key in self.group_keys(by, group_id):
+                group = groups.setdefault(key, [0, 0, 0, 0])
+                for index, value in enumerate(values):
+                    group[index] += value
+        return {key: {"battles": battles, "wins": wins, "win_rate": wins / battles, "mean_rounds": rounds / battles,
+                      "mean_damage": damage / battles} for key, (battles, wins, rounds, damage) in groups.items()}
+
+    def group_keys(self, by, group_id):  # returns list of keys the group belongs to
+        if by == "matchup":
+            first, second = divmod(group_id, len(self.loadouts))
+            return [(self.loadouts[first][0], self.loadouts[second][0])]
+        name, items, effects = self.loadouts[group_id]
+        if by == "item":
+            return sorted(set(items))
+        if by == "effect":
+            return list(effects)
+        return [name]
@@ -0,0 +1,219 @@
+"""
+Adaptive sampling of matchup statistics - battles are fought in batches until the estimates are precise enough
+
+After every batch the confidence interval of the win rate (Wilson score interval) and, if asked for, of the mean
+rounds (normal approximation) is checked against the target precision, so a lopsided matchup stops after a few
+batches while a close one keeps going (up to 'max_battles').
+
+Battle seeds come from a stream made from 'seed', so the n-th battle of any matchup sampled with the same seed
+uses the same dice. compare() relies on it (common random numbers): both challengers fight the opponent with the
+same seeds and only the per-seed differences of their results count, which cancels most of the dice's noise.
+"""
+
+import math
+import random
+from statistics import NormalDist
+
+from herald import Herald
+from tournament import is_stalemate
+from warriors import Battle
+
+
+def z_score(confidence):  # returns float
+    return NormalDist().inv_cdf((1 + confidence) / 2)
+
+
+class Estimate(object):
+    """
+    Has: names, battles, wins, rounds, rounds_squares, confidence
+    Running totals of sampled battles: 'wins' of the first warrior, 'rounds' and 'rounds_squares' sums of lengths
+    """
+
+    def __init__(self, names, confidence=0.95):
+        super(Estimate, self).__init__()
+        self.names = names
+        self.confidence = confidence
+        self.battles = 0
+        self.wins = 0
+        self.rounds = 0
+        self.rounds_squares = 0
+
+    def __str__(self):
+        low, high = self.win_interval
+        return "{} vs {}: {} battles, win rate: {:.4f} [{:.4f}, {:.4f}], mean rounds: {:.2f} +/- {:.2f}".format(
+            self.names[0], self.names[1], self.battles, self.win_rate, low, high, self.mean_rounds,
+            self.rounds_half_width)
+
+    def add(self, won, rounds):
+        self.battles += 1
+        self.wins += won
+        self.rounds += rounds
+        self.rounds_squares += rounds * rounds
+
+    @property
+    def win_rate(self):
+        return self.wins / self.battles if self.battles else 0.5
+
+    @property
+    def win_interval(self):  # returns (low, high)
+        """Wilson score interval - stays sensible for win rates near 0 and 1, unlike the normal approximation"""
+        if not self.battles:
+            return 0.0, 1.0
+        z = z_score(self.confidence)
+        n = self.battles
+        p = self.wins / n
+        center = (p + z * z / (2 * n)) / (1 + z * z / n)
+        half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+        return max(0.0, center - half_width), min(1.0, center + half_width)
+
+    @property
+    def win_half_width(self):
+        low, high = self.win_interval
+        return (high - low) / 2
+
+    @property
+    def mean_rounds(self):
+        return self.rounds / self.battles if self.battles else 0.0
+
+    @property
+    def rounds_half_width(self):
+        if self.battles < 2:
+            return math.inf
+        variance = (self.rounds_squares - self.rounds * self.rounds / self.battles) / (self.battles - 1)
+        return z_score(self.confidence) * math.sqrt(max(0.0, variance) / self.battles)
+
+
+class Comparison(object):
+    """
+    Has: names, battles, first_wins, second_wins, differences_squares, confidence
+    Paired results of two challengers against the same opponent with the same seeds, 'differences_squares' is the
+    sum of squared per-seed differences (each of them -1, 0 or 1)
+    """
+
+    def __init__(self, names, confidence=0.95):
+        super(Comparison, self).__init__()
+        self.names = names
+        self.confidence = confidence
+        self.battles = 0
+        self.first_wins = 0
+        self.second_wins = 0
+        self.differences_squares = 0
+
+    def __str__(self):
+        low, high = self.difference_interval
+        return "{} vs {}: {} paired battles, win rates: {:.4f}/{:.4f}, difference: {:+.4f} [{:+.4f}, {:+.4f}]".format(
+            self.names[0], self.names[1], self.battles, self.first_wins / max(1, self.battles),
+            self.second_wins / max(1, self.battles), self.difference, low, high)
+
+    def add(self, first_won, second_won):
+        self.battles += 1
+        self.first_wins += first_won
+        self.second_wins += second_won
+        self.differences_squares += (first_won - second_won) ** 2
+
+    @property
+    def difference(self):  # returns first's win rate minus second's
+        return (self.first_wins - self.second_wins) / self.battles if self.battles else 0.0
+
+    @property
+    def difference_half_width(self):
+        if self.battles < 2:
+            return math.inf
+        total = self.first_wins - self.second_wins
+        variance = (self.differences_squares - total * total / self.battles) / (self.battles - 1)
+        return z_score(self.confidence) * math.sqrt(max(0.0, variance) / self.battles)
+
+    @property
+    def difference_interval(self):  # returns (low, high)
+        half_width = self.difference_half_width
+        return self.difference - half_width, self.difference + half_width
+
+    @property
+    def decided(self):  # returns boolean - the interval doesn't contain 0, one challenger is better
+        low, high = self.difference_interval
+        return low > 0 or high < 0
+
+
+class Sampler(object):
+    """
+    Has: first, second, battle, seeds
+    Fights battles between copies of two warriors one seed of the stream after another
+    """
+
+    def __init__(self, first, second, seed=0):
+        super(Sampler, self).__init__()
+        if is_stalemate(first, second):
+            raise ValueError("Neither of the warriors can deal any damage, the battle would never end")
+        herald = Herald()
+        self.first, self.second = first.copy(), second.copy()
+        self.first.herald = self.second.herald = herald
+        self.battle = Battle(self.first, self.second, herald, keep_rounds=0)
+        self.seeds = random.Random(seed)
+
+    def fight(self, battle_seed=None):  # returns (first won, rounds)
+        self.battle.reset(self.seeds.getrandbits(64) if battle_seed is None else battle_seed)
+        self.battle.commence()
+        return self.first.health > 0, self.battle.rounds_count
+
+
+def sample(first, second, precision=0.01, rounds_precision=None, confidence=0.95, batch=100, max_battles=100000,
+           seed=0):  # returns Estimate
+    """
+    Fights batches of 'batch' battles until the win rate's interval is at most +/- 'precision' wide (and the mean
+    rounds' one +/- 'rounds_precision' of the mean if given) or 'max_battles' were fought
+    """
+    sampler = Sampler(first, second, seed)
+    estimate = Estimate((first.name, second.name), confidence)
+    while estimate.battles < max_battles:
+        for _ in range(min(batch, max_battles - estimate.battles)):
+            estimate.add(*sampler.fight())
+        if estimate.win_half_width <= precision and \
+                (rounds_precision is None or estimate.rounds_half_width <= rounds_precision * estimate.mean_rounds):
+            break
+    return estimate
+
+
+def compare(first, second, opponent, precision=0.01, confidence=0.95, batch=100, max_battles=100000,
+            seed=0):  # returns Comparison
+    """
+    Which of two challengers does better against 'opponent' - both fight it with common seeds in batches until
+    the difference of their win rates is known to +/- 'precision' (see Comparison.decided for the verdict)
+    Stopping as soon as the interval first excludes 0 would test after every batch at the same z, which makes
+    false verdicts much likelier than 1 - 'confidence' - so only reaching the precision stops sampling early
+    """
+    first_sampler = Sampler(first, opponent, seed)
+    second_sampler = Sampler(second, opponent, seed)
+    seeds = random.Random(seed)
+    comparison = Comparison((first.name, second.name), confidence)
+    while comparison.battles < max_battles:
+        for _ in range(min(batch, max_battles - comparison.battles)):
+            battle_seed = seeds.getrandbits(64)
+            comparison.add(first_sampler.fight(battle_seed)[0], second_sampler.fight(battle_seed)[0])
+        if comparison.difference_half_width <= precision:
+            break
+    return comparison
+
+
+def main():
+    """Estimates Dagobert's chances against Rogbar and compares the sword-and-board against a bare-handed fighter"""
+    from items import get_catalog
+    from warriors import Warrior
+
+    catalog = get_catalog()
+    dagobert = Warrior("Dagobert", herald=Herald())
+    dagobert.equip_weapon(catalog.weapons["Longsword"])
+    dagobert.equip_shield(catalog.shields["Tower Shield"])
+    dagobert.equip_armor(catalog.armors["Chainmail"])
+    rogbar = Warrior("Rogbar", herald=Herald())
+    rogbar.equip_weapon(catalog.weapons["Longsword"])
+    rogbar.equip_offhand_weapon(catalog.weapons["Short Sword"])
+    rogbar.equip_armor(catalog.armors["Chainmail"])
+    brawler = Warrior("Brawler", herald=Herald())
+
+    print(sample(dagobert, rogbar, precision=0.02, rounds_precision=0.05))
+    print(sample(brawler, rogbar, precision=0.02))
+    print(compare(dagobert, brawler, rogbar, precision=0.02))
+
+
+if __name__ == "__main__":
+    main()
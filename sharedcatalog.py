@@ -0,0 +1,242 @@
+"""
+Read-only item catalog packed into shared memory, so worker processes don't each build and keep their own copy
+
+The exporting process packs a Catalog into a single multiprocessing.shared_memory block: a header, fixed-size
+records of every kind (sorted by name, an item's id is its position) and a table of UTF-8 names. Workers attach
+to the block by its name without copying it. An item is built from its record the first time it's looked up and
+cached, so a worker only ever holds the items it actually uses:
+
+    with sharedcatalog.export() as shared:
+        with ProcessPoolExecutor(initializer=sharedcatalog.install, initargs=(shared.name,)) as executor:
+            ...  # get_catalog() in workers returns the attached catalog
+
+Attached tables are Mappings of item names to items, like the dicts of a Catalog, and a SharedCatalog is a Catalog
+- by_dmg_type, by_handedness, stat_index() and select() work the same, built from the tables on first use.
+"""
+
+import struct
+from bisect import bisect_left
+from collections.abc import Mapping
+from multiprocessing import shared_memory
+
+import items
+from items import Weapon, Shield, Armor, DmgReduction
+
+MAGIC = b"HCAT"
+FORMAT_VERSION = 1
+DMG_TYPES = DmgReduction._fields  # dmg_type is stored as its index
+
+HEADER = struct.Struct("<4sI3I3I")  # magic, version, counts of weapons, shields, armors, offsets of their records
+WEAPON = struct.Struct("<IHiiBdi")  # name offset, name length, damage, dmg_type, handedness, to_parry
+SHIELD = struct.Struct("<IHiiBdii")  # name offset, name length, damage, dmg_type, handedness, encumbrance, to_block
+ARMOR = struct.Struct("<IHiiii")  # name offset, name length, dmg_reduction, encumbrance
+KINDS = (("weapons", WEAPON), ("shields", SHIELD), ("armors", ARMOR))
+
+
+def pack_weapon(weapon):  # returns tuple of record fields after the name
+    return weapon.damage[0], weapon.damage[1], DMG_TYPES.index(weapon.dmg_type), weapon.handedness, weapon.to_parry
+
+
+def pack_shield(shield):  # returns tuple of record fields after the name
+    return (shield.damage[0], shield.damage[1], DMG_TYPES.index(shield.dmg_type), shield.handedness,
+            shield.encumbrance, shield.to_block)
+
+
+def pack_armor(armor):  # returns tuple of record fields after the name
+    return tuple(armor.dmg_reduction) + (armor.encumbrance,)
+
+
+def unpack_weapon(name, fields):  # returns Weapon
+    low, high, dmg_type, handedness, to_parry = fields
+    return Weapon(name, (low, high), DMG_TYPES[dmg_type], handedness, to_parry)
+
+
+def unpack_shield(name, fields):  # returns Shield
+    low, high, dmg_type, handedness, encumbrance, to_block = fields
+    return Shield(name, (low, high), DMG_TYPES[dmg_type], handedness, encumbrance, to_block)
+
+
+def unpack_armor(name, fields):  # returns Armor
+    slashing, piercing, bludgeoning, encumbrance = fields
+    return Armor(name, encumbrance, DmgReduction(slashing, piercing, bludgeoning))
+
+
+PACKERS = {"weapons": pack_weapon, "shields": pack_shield, "armors": pack_armor}
+UNPACKERS = {"weapons": unpack_weapon, "shields": unpack_shield, "armors": unpack_armor}
+
+
+def pack(catalog):  # returns bytes
+    """The whole catalog as one packed table"""
+    names = bytearray()
+    blocks = []
+    for kind, record in KINDS:
+        block = bytearray()
+        for name, item in sorted(getattr(catalog, kind).items()):
+            encoded = name.encode()
+            block += record.pack(len(names), len(encoded), *PACKERS[kind](item))
+            names += encoded
+        blocks.append(block)
+    counts = [len(getattr(catalog, kind)) for kind, _ in KINDS]
+    offsets = []
+    offset = HEADER.size
+    for block in blocks:
+        offsets.append(offset)
+        offset += len(block)
+    # names follow the records, a record's name offset is relative to them
+    return HEADER.pack(MAGIC, FORMAT_VERSION, *(counts + offsets)) + b"".join(blocks) + bytes(names)
+
+
+class ItemTable(Mapping):
+    """
+    Has: kind, count
+    Items of one kind read from a packed table, looked up by name (binary search) or by id, built once and cached
+    """
+
+    def __init__(self, buffer, kind, record, count, offset, names_offset):
+        super(ItemTable, self).__init__()
+        self.buffer = buffer
+        self.kind = kind
+        self.record = record
+        self.count = count
+        self.offset = offset
+        self.names_offset = names_offset
+        self.unpack = UNPACKERS[kind]
+        self.cache = {}
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return (self.name(item_id) for item_id in range(self.count))
+
+    def __getitem__(self, name):
+        item_id = self.find(name)
+        if item_id is None:
+            raise KeyError(name)
+        return self.by_id(item_id)
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+    def fields(self, item_id):  # returns tuple of the record's fields
+        return self.record.unpack_from(self.buffer, self.offset + item_id * self.record.size)
+
+    def name(self, item_id):  # returns str
+        start, length = self.fields(item_id)[:2]
+        start += self.names_offset
+        return bytes(self.buffer[start:start + length]).decode()
+
+    def find(self, name):  # returns item id (None if there's no such item)
+        item_id = bisect_left(NameView(self), name)
+        if item_id < self.count and self.name(item_id) == name:
+            return item_id
+        return None
+
+    def by_id(self, item_id):  # returns item
+        item = self.cache.get(item_id)
+        if item is None:
+            if not 0 <= item_id < self.count:
+                raise IndexError("No {} with id {}".format(self.kind, item_id))
+            fields = self.fields(item_id)
+            item = self.cache[item_id] = self.unpack(self.name(item_id), fields[2:]).freeze()
+        return item
+
+
+class NameView(object):
+    """Sequence of a table's names for bisect, decoding only the names it probes"""
+
+    def __init__(self, table):
+        super(NameView, self).__init__()
+        self.table = table
+
+    def __len__(self):
+        return self.table.count
+
+    def __getitem__(self, item_id):
+        return self.table.name(item_id)
+
+
+class SharedCatalog(items.Catalog):
+    """
+    Has: name, weapons, shields, armors, by_dmg_type, by_handedness
+    A packed catalog in shared memory - created by export() (the owner unlinks it on close) or attached by name
+    Unlike a Catalog's, its lookup dicts are built on first use, as that builds every item they hold
+    """
+
+    def __init__(self, name=None, data=None):
+        super(items.Catalog, self).__init__()  # Catalog's own __init__ would build every item right away
+        self.owner = data is not None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(name, create=True, size=len(data))
+            self.memory.buf[:len(data)] = data
+        else:
+            self.memory = attach_memory(name)
+        self.name = self.memory.name
+        buffer = self.memory.buf
+        header = HEADER.unpack_from(buffer, 0)
+        if header[0] != MAGIC or header[1] != FORMAT_VERSION:
+            raise ValueError("Shared memory {} doesn't hold a packed catalog of version {}".format(
+                self.name, FORMAT_VERSION))
+        counts, offsets = header[2:5], header[5:8]
+        names_offset = offsets[-1] + counts[-1] * ARMOR.size
+        tables = [ItemTable(buffer, kind, record, count, offset, names_offset)
+                  for (kind, record), count, offset in zip(KINDS, counts, offsets)]
+        self.weapons, self.shields, self.armors = tables
+        self._by_dmg_type = None
+        self._by_handedness = None
+        self._stat_indexes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def by_dmg_type(self):
+        if self._by_dmg_type is None:
+            self._by_dmg_type = {}
+            for item in list(self.weapons.values()) + list(self.shields.values()):
+                self._by_dmg_type.setdefault(item.dmg_type, []).append(item)
+        return self._by_dmg_type
+
+    @property
+    def by_handedness(self):
+        if self._by_handedness is None:
+            self._by_handedness = {}
+            for weapon in self.weapons.values():
+                self._by_handedness.setdefault(weapon.handedness, []).append(weapon)
+        return self._by_handedness
+
+    def close(self):
+        """Detaches (items already built stay valid), the owner also frees the shared memory"""
+        for table in (self.weapons, self.shields, self.armors):
+            table.buffer = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def attach_memory(name):  # returns SharedMemory
+    """Attaches without handing the block to this process' resource tracker, only the owner may unlink it"""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:  # before Python 3.13 every attached block is registered with the resource tracker
+        # Unregistering it afterwards would drop the owner's registration too when the tracker is shared
+        # (it is with child processes), so registration is skipped instead
+        register = shared_memory.resource_tracker.register
+        shared_memory.resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            shared_memory.resource_tracker.register = register
+
+
+def export(catalog=None, name=None):  # returns SharedCatalog
+    """Packs 'catalog' (the default one if not given) into a new shared memory block"""
+    return SharedCatalog(name, pack(items.get_catalog() if catalog is None else catalog))
+
+
+def install(name):
+    """Worker process initializer - makes get_catalog() return the shared catalog called 'name'"""
+    items.CATALOG = SharedCatalog(name)
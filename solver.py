@@ -0,0 +1,110 @@
+"""
+Exact win probabilities and expected battle length for a pair of warriors
+
+A round is a finite distribution of damage dealt by the attacker (every d20 and weapon damage roll enumerated),
+so a battle is a Markov chain over (first warrior's health, second warrior's health, side to move). The solver
+fills a table over those states bottom-up (smaller healths first). Rounds that deal no damage make the two sides
+depend on each other at the same healths, so that pair of equations is solved directly.
+
+MISS effects don't influence any roll yet, so the MISS state is collapsed out of the chain.
+"""
+
+import math
+
+from phases import OFFHAND_MODIFIER
+from matchup import get_matchup
+
+
+class Solution(object):
+    """
+    Has: names, win_probabilities, expected_rounds, initiative_probabilities
+    'win_probabilities' and 'initiative_probabilities' hold a pair of probabilities (first warrior's, second warrior's)
+    """
+
+    def __init__(self, names, win_probabilities, expected_rounds, initiative_probabilities):
+        super(Solution, self).__init__()
+        self.names = names
+        self.win_probabilities = win_probabilities
+        self.expected_rounds = expected_rounds
+        self.initiative_probabilities = initiative_probabilities
+
+    def __str__(self):
+        return "{} vs {}: win probabilities: {:.4f}/{:.4f}, expected rounds: {:.2f}".format(
+            self.names[0], self.names[1], self.win_probabilities[0], self.win_probabilities[1], self.expected_rounds)
+
+
+def initiative_probability(first_offense, second_offense):  # returns float
+    """Probability of the first warrior winning the initiative (draws are rolled again)"""
+    wins = 0
+    draws = 0
+    for first_roll in range(1, 21):
+        for second_roll in range(1, 21):
+            difference = first_offense + first_roll - (second_offense + second_roll)
+            if difference > 0:
+                wins += 1
+            elif difference == 0:
+                draws += 1
+    return wins / (400 - draws)
+
+
+def round_distribution(attacker, defender):  # returns tuple of (damage, probability)
+    """Distribution of damage dealt by all attacks 'attacker' performs in its round"""
+    matchup = get_matchup(attacker.inventory, defender.inventory)
+    distribution = {0: 1.0}
+    for hand, offense in ((0, attacker.offense), (1, math.floor(attacker.offense * OFFHAND_MODIFIER))):
+        if matchup.weapons[hand] is None:
+            continue
+        combined = {}
+        for dealt, probability in distribution.items():
+            for damage, attack_probability in matchup.attack_pmf(hand, offense, defender.defense):
+                combined[dealt + damage] = combined.get(dealt + damage, 0.0) + probability * attack_probability
+        distribution = combined
+    return tuple(sorted(distribution.items()))
+
+
+def solve(first, second):
+    """Returns Solution for a battle between warriors 'first' and 'second' as they are now"""
+    distributions = (round_distribution(first, second), round_distribution(second, first))
+    no_damage = tuple(dict(distribution).get(0, 0.0) for distribution in distributions)
+    if no_damage[0] == 1.0 and no_damage[1] == 1.0:
+        raise ValueError("Neither of the warriors can deal any damage, the battle would never end")
+    damaging = tuple(tuple((damage, probability) for damage, probability in distribution if damage > 0)
+                     for distribution in distributions)
+
+    # wins[side][a][b] - probability of the first warrior winning with 'side' to move and healths a and b
+    # rounds[side][a][b] - expected number of remaining rounds in that state
+    width = second.health + 1
+    wins = ([[0.0] * width for _ in range(first.health + 1)], [[0.0] * width for _ in range(first.health + 1)])
+    rounds = ([[0.0] * width for _ in range(first.health + 1)], [[0.0] * width for _ in range(first.health + 1)])
+    stall = 1 - no_damage[0] * no_damage[1]
+
+    for a in range(1, first.health + 1):
+        for b in range(1, width):
+            # first warrior to move - hits the second one
+            first_wins = 0.0
+            first_rounds = 1.0
+            for damage, probability in damaging[0]:
+                if damage >= b:
+                    first_wins += probability
+                else:
+                    first_wins += probability * wins[1][a][b - damage]
+                    first_rounds += probability * rounds[1][a][b - damage]
+            # second warrior to move - hits the first one
+            second_wins = 0.0
+            second_rounds = 1.0
+            for damage, probability in damaging[1]:
+                if damage < a:
+                    second_wins += probability * wins[0][a - damage][b]
+                    second_rounds += probability * rounds[0][a - damage][b]
+            # rounds without damage pass the move at the same healths
+            wins[0][a][b] = (first_wins + no_damage[0] * second_wins) / stall
+            wins[1][a][b] = second_wins + no_damage[1] * wins[0][a][b]
+            rounds[0][a][b] = (first_rounds + no_damage[0] * second_rounds) / stall
+            rounds[1][a][b] = second_rounds + no_damage[1] * rounds[0][a][b]
+
+    initiative = initiative_probability(first.offense, second.offense)
+    a, b = first.health, second.health
+    first_wins = initiative * wins[0][a][b] + (1 - initiative) * wins[1][a][b]
+    expected_rounds = initiative * rounds[0][a][b] + (1 - initiative) * rounds[1][a][b]
+    return Solution((first.name, second.name), (first_wins, 1 - first_wins), expected_rounds,
+                    (initiative, 1 - initiative))
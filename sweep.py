@@ -0,0 +1,105 @@
+"""
+Incremental round-robin sweeps - results are kept in a resultcache.ResultCache between runs
+
+A sweep first refreshes the cache's item hashes against the current catalog, which drops results of matchups
+depending on any changed item. Every matchup still cached with enough battles is reused, only the rest is fought
+(in worker processes, like tournament.round_robin()). After tweaking a single item only the matchups of loadouts
+holding it are fought again:
+
+    python sweep.py --fights 200        # first run fights everything
+    (edit to_parry of Short Sword in data/item_data.json)
+    python sweep.py --fights 200        # fights only matchups with a Short Sword
+"""
+
+import argparse
+import time
+
+from items import get_catalog
+from resultcache import ResultCache, DEFAULT_PATH, matchup_key, dependencies
+from tournament import TournamentReport, enumerate_loadouts, build_warrior, matchup_seed, run_tasks, is_stalemate
+
+
+class SweepReport(TournamentReport):
+    """
+    Has: changed, fought, reused, stalemates
+    'changed' are (kind, item name) pairs changed since the last sweep, 'fought' and 'reused' the numbers of
+    matchups simulated now and taken from the cache
+    """
+
+    def __init__(self, loadouts):
+        super(SweepReport, self).__init__(loadouts)
+        self.changed = set()
+        self.fought = 0
+        self.reused = 0
+        self.stalemates = 0
+
+
+def sweep(loadouts=None, fights=100, workers=None, seed=0, cache=None):  # returns SweepReport
+    """
+    Round-robin of 'loadouts' (all legal ones by default), 'fights' battles per matchup, results come from and go
+    to 'cache' (the default ResultCache if not given)
+    """
+    own_cache = cache is None
+    if own_cache:
+        cache = ResultCache(DEFAULT_PATH)
+    try:
+        catalog = get_catalog()
+        if loadouts is None:
+            loadouts = enumerate_loadouts()
+        report = SweepReport(loadouts)
+        report.changed = cache.refresh_items(catalog)
+
+        tasks = []
+        pending = {}  # (first, second) of tasks: (key, description, items)
+        for first in range(len(loadouts)):
+            first_warrior = build_warrior("first", loadouts[first])
+            for second in range(first + 1, len(loadouts)):
+                second_warrior = build_warrior("second", loadouts[second])
+                if is_stalemate(first_warrior, second_warrior):
+                    report.stalemates += 1
+                    continue
+                key, description = matchup_key("simulation", first_warrior, second_warrior)
+                row = cache.lookup(key)
+                if row is not None and row[2] >= fights:
+                    first_wins, second_wins, _, rounds = row[:4]  # an entry may hold more battles than asked for
+                    report.add((first, second, int(first_wins), int(second_wins), int(rounds)))
+                    report.reused += 1
+                    continue
+                pending[(first, second)] = (key, description, dependencies(first_warrior, second_warrior))
+                tasks.append((first, second, loadouts[first], loadouts[second], fights,
+                              matchup_seed(seed, first, second)))
+
+        for result in run_tasks(tasks, workers):
+            first, second, first_wins, second_wins, rounds = result
+            key, description, items = pending[(first, second)]
+            cache.store(key, "simulation", description, first_wins, second_wins, fights, rounds, items=items)
+            report.add(result)
+            report.fought += 1
+        report.fit_ratings()
+        return report
+    finally:
+        if own_cache:
+            cache.close()
+
+
+def main():
+    """Runs an incremental round-robin sweep of all legal loadouts"""
+    parser = argparse.ArgumentParser(description="Round-robin sweep fighting only matchups not cached yet")
+    parser.add_argument("-n", "--fights", type=int, default=100, help="battles per matchup")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (all CPUs if omitted)")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the sweep")
+    parser.add_argument("--cache", default=DEFAULT_PATH, help="result cache file")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    with ResultCache(args.cache) as cache:
+        report = sweep(fights=args.fights, workers=args.workers, seed=args.seed, cache=cache)
+    print(report)
+    print()
+    print("Changed items:", ", ".join(sorted(name for _, name in report.changed)) or "none")
+    print("{} matchups fought, {} reused, {} stalemates skipped in {:.2f} s".format(
+        report.fought, report.reused, report.stalemates, time.perf_counter() - started))
+
+
+if __name__ == "__main__":
+    main()
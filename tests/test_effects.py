@@ -0,0 +1,53 @@
+"""Effect modifiers registered in effects.MODIFIERS change the stats phases and rounds work with"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import effects  # noqa: E402
+from effects import Effect  # noqa: E402
+from herald import Herald  # noqa: E402
+from items import get_catalog  # noqa: E402
+from phases import Attack, OFFHAND_MODIFIER  # noqa: E402
+from warriors import Warrior, BattleRound  # noqa: E402
+
+
+class FixedDice(object):
+    """Rolls 'd20' on every d20 and the lowest value of every other roll"""
+
+    def __init__(self, d20):
+        super(FixedDice, self).__init__()
+        self.value = d20
+
+    def d20(self):
+        return self.value
+
+    def roll(self, low, high):
+        return low
+
+
+def test_attack_uses_offense_and_defense_modifiers(monkeypatch):
+    monkeypatch.setitem(effects.MODIFIERS, "blessed", {"offense": 3})
+    monkeypatch.setitem(effects.MODIFIERS, "cursed", {"defense": -2})
+    catalog = get_catalog()
+    attacker = Warrior("Attacker", offense=10, herald=Herald())
+    attacker.equip_weapon(catalog.weapons["Short Sword"])
+    attacker.equip_offhand_weapon(catalog.weapons["Short Sword"])
+    defender = Warrior("Defender", defense=10, herald=Herald())
+    assert Attack(attacker, defender, dice=FixedDice(10)).result == 0
+    attacker.gain_effect(Effect("blessed"))
+    defender.gain_effect(Effect("cursed"))
+    assert Attack(attacker, defender, dice=FixedDice(10)).result == 5
+    assert Attack(attacker, defender, OFFHAND_MODIFIER, dice=FixedDice(10)).result == int(13 * OFFHAND_MODIFIER) - 8
+
+
+def test_round_applies_health_modifier(monkeypatch):
+    monkeypatch.setitem(effects.MODIFIERS, "bleeding", {"health": -2})
+    attacker = Warrior("Attacker", health=30, herald=Herald())
+    defender = Warrior("Defender", herald=Herald())
+    attacker.gain_effect(Effect("bleeding", duration=1))
+    battle_round = BattleRound(attacker, defender, Herald(), FixedDice(1))  # misses, so no damage is dealt
+    battle_round.resolve_effects()
+    assert attacker.health == 28
+    assert attacker.effects.modifier("health") == 0  # ran out at the end of the round
@@ -0,0 +1,22 @@
+"""'import warriors' must stay cheap - within bench.IMPORT_BUDGET_MS and without loading bench.DEFERRED_MODULES"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import bench  # noqa: E402
+
+
+def test_import_fits_budget():
+    elapsed = min(bench.import_time_ms() for _ in range(5))  # the fastest of a few runs, to ride out a busy machine
+    assert elapsed <= bench.IMPORT_BUDGET_MS, "import warriors takes {:.1f} ms".format(elapsed)
+
+
+def test_import_defers_modules():
+    code = "import sys, warriors; print(' '.join(name for name in {!r} if name in sys.modules))".format(
+        bench.DEFERRED_MODULES)
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert completed.stdout.split() == []
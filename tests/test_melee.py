@@ -0,0 +1,56 @@
+"""A targeting strategy serving one melee after another starts afresh every time"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from herald import Herald  # noqa: E402
+from items import get_catalog  # noqa: E402
+from melee import Melee, StickyTarget, WeakestTarget  # noqa: E402
+from warriors import Warrior  # noqa: E402
+
+
+def build_warriors(count):  # returns list of Warriors
+    catalog = get_catalog()
+    warriors = []
+    for number in range(count):
+        warrior = Warrior("Warrior #" + str(number + 1), herald=Herald())
+        warrior.equip_weapon(catalog.weapons["Longsword"])
+        warriors.append(warrior)
+    return warriors
+
+
+class TargetCheck(object):
+    """Wraps a strategy, recording (attacker, target) of every turn"""
+
+    def __init__(self, strategy):
+        super(TargetCheck, self).__init__()
+        self.strategy = strategy
+        self.turns = []
+
+    def start(self, melee):
+        self.turns = []
+        self.strategy.start(melee)
+
+    def choose(self, melee, index):
+        target = self.strategy.choose(melee, index)
+        self.turns.append((index, target))
+        return target
+
+    def hit(self, melee, index):
+        self.strategy.hit(melee, index)
+
+
+@pytest.mark.parametrize("strategy", [WeakestTarget, StickyTarget])
+def test_reused_strategy_targets_enemies(strategy):
+    check = TargetCheck(strategy())
+    Melee.free_for_all(build_warriors(4), Herald(), seed=1, strategy=check).commence()
+    warriors = build_warriors(4)
+    melee = Melee([warriors[:2], warriors[2:]], Herald(), seed=2, strategy=check)
+    melee.commence()
+    assert check.turns
+    for attacker, target in check.turns:
+        assert melee.targets.teams[attacker] != melee.targets.teams[target]
@@ -0,0 +1,225 @@
+"""
+Round-robin and Swiss tournaments between all legal loadouts
+
+Loadouts are passed to worker processes as tuples of item names and rebuilt there from the catalog.
+Every matchup gets its own seed derived from the tournament's seed and the pair of loadouts, so results
+don't depend on the number of workers or on how matchups are scheduled among them.
+"""
+
+import math
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from items import Inventory, get_catalog
+from warriors import Warrior, Battle
+from herald import Herald
+from solver import round_distribution
+
+ELO_BASE = 1500
+
+
+def enumerate_loadouts(weapons=None, shields=None, armors=None):  # returns list of (weapon, offhand weapon, shield, armor) item names (None if empty)
+    """All combinations of gear (the whole catalog's by default) the Inventory setters accept"""
+    catalog = get_catalog()
+    weapons = list(catalog.weapons.values()) if weapons is None else list(weapons)
+    shields = list(catalog.shields.values()) if shields is None else list(shields)
+    armors = list(catalog.armors.values()) if armors is None else list(armors)
+    loadouts = []
+    for weapon in weapons:
+        for offhand_weapon in [None] + weapons:
+            for shield in [None] + shields:
+                for armor in armors:
+                    inventory = Inventory(weapon, armor)
+                    try:
+                        if offhand_weapon is not None:
+                            inventory.offhand_weapon = offhand_weapon
+                        if shield is not None:
+                            inventory.shield = shield
+                    except ValueError:
+                        continue
+                    loadouts.append(tuple(None if item is None else item.name for item in (weapon, offhand_weapon, shield, armor)))
+    return loadouts
+
+
+def loadout_name(loadout):
+    return "+".join(name for name in loadout if name is not None)
+
+
+def build_warrior(name, loadout, herald=None):  # returns Warrior
+    catalog = get_catalog()
+    weapon, offhand_weapon, shield, armor = loadout
+    warrior = Warrior(name, herald=Herald() if herald is None else herald)
+    warrior.inventory.weapon = None if weapon is None else catalog.weapons[weapon]
+    warrior.inventory.armor = None if armor is None else catalog.armors[armor]
+    if offhand_weapon is not None:
+        warrior.inventory.offhand_weapon = catalog.weapons[offhand_weapon]
+    if shield is not None:
+        warrior.inventory.shield = catalog.shields[shield]
+    return warrior
+
+
+def matchup_seed(seed, first, second):  # returns int
+    return random.Random("{}:{}:{}".format(seed, first, second)).getrandbits(64)
+
+
+def is_stalemate(first, second):  # returns boolean
+    return all(damage == 0 for damage, _ in round_distribution(first, second) + round_distribution(second, first))
+
+
+def run_matchup(task):  # returns (first index, second index, first's wins, second's wins, rounds in total)
+    """
+    Runs all battles of a single matchup, executed in a worker process
+    A matchup where neither loadout can ever deal damage would never end, so it's not played at all
+    """
+    first, second, first_loadout, second_loadout, fights, seed = task
+    seeds = random.Random(seed)
+    herald = Herald()
+    wins = [0, 0]
+    rounds = 0
+    first_warrior = build_warrior("first", first_loadout, herald)
+    second_warrior = build_warrior("second", second_loadout, herald)
+    if is_stalemate(first_warrior, second_warrior):
+        return first, second, 0, 0, 0
+    battle = Battle(first_warrior, second_warrior, herald, keep_rounds=0)
+    for _ in range(fights):
+        battle.reset(seeds.getrandbits(64))
+        battle.commence()
+        wins[0 if first_warrior.health > 0 else 1] += 1
+        rounds += battle.rounds_count
+    return first, second, wins[0], wins[1], rounds
+
+
+class TournamentReport(object):
+    """
+    Has: loadouts, wins, rounds, ratings
+    'wins[i][j]' is the number of battles loadout i won against loadout j, 'rounds[i][j]' the total of their rounds
+    'ratings' are Elo-scale ratings fitted to the whole win matrix (so they don't depend on the matchups' order)
+    """
+
+    def __init__(self, loadouts):
+        super(TournamentReport, self).__init__()
+        self.loadouts = loadouts
+        size = len(loadouts)
+        self.wins = [[0] * size for _ in range(size)]
+        self.rounds = [[0] * size for _ in range(size)]
+        self.ratings = [float(ELO_BASE)] * size
+
+    def __str__(self):
+        lines = []
+        for place, index in enumerate(self.standings(), start=1):
+            won = sum(self.wins[index])
+            played = won + sum(row[index] for row in self.wins)
+            lines.append("{:>3}. {:<45} {:>7.1f}  {:>6.1%} of {} battles".format(
+                place, loadout_name(self.loadouts[index]), self.ratings[index], won / played if played else 0.0, played))
+        return "\n".join(lines)
+
+    def add(self, result):
+        first, second, first_wins, second_wins, rounds = result
+        self.wins[first][second] += first_wins
+        self.wins[second][first] += second_wins
+        self.rounds[first][second] += rounds
+        self.rounds[second][first] += rounds
+
+    def score(self, index):  # returns fraction of battles won
+        won = sum(self.wins[index])
+        played = won + sum(row[index] for row in self.wins)
+        return won / played if played else 0.0
+
+    def standings(self):  # returns loadout indices ordered from the best
+        return sorted(range(len(self.loadouts)), key=lambda index: -self.ratings[index])
+
+    def fit_ratings(self, iterations=200):
+        """
+        Fits Bradley-Terry strengths to the win matrix with the MM algorithm and puts them on the Elo scale
+        Every played pair gets half a virtual win each way, so a loadout that never lost keeps a finite rating
+        """
+        size = len(self.loadouts)
+        games = [[self.wins[i][j] + self.wins[j][i] for j in range(size)] for i in range(size)]
+        wins = [[self.wins[i][j] + (0.5 if games[i][j] else 0.0) for j in range(size)] for i in range(size)]
+        strengths = [1.0] * size
+        for _ in range(iterations):
+            updated = []
+            for i in range(size):
+                denominator = sum((games[i][j] + (1.0 if games[i][j] else 0.0)) / (strengths[i] + strengths[j])
+                                  for j in range(size) if j != i)
+                updated.append(sum(wins[i]) / denominator if denominator else strengths[i])
+            mean = math.exp(sum(math.log(strength) for strength in updated) / size)
+            strengths = [strength / mean for strength in updated]
+        self.ratings = [ELO_BASE + 400 * math.log10(strength) for strength in strengths]
+
+
+def round_robin(loadouts=None, fights=100, workers=None, seed=0, chunksize=None, shared_catalog=None):
+    """
+    Plays every loadout against every other one 'fights' times. Returns TournamentReport
+    Matchups are fanned out to a pool of 'workers' processes in chunks of 'chunksize' matchups
+    Workers attach to 'shared_catalog' (a sharedcatalog.SharedCatalog) if given instead of loading their own catalog
+    """
+    if loadouts is None:
+        loadouts = enumerate_loadouts()
+    tasks = [(first, second, loadouts[first], loadouts[second], fights, matchup_seed(seed, first, second))
+             for first in range(len(loadouts)) for second in range(first + 1, len(loadouts))]
+    report = TournamentReport(loadouts)
+    for result in run_tasks(tasks, workers, chunksize, shared_catalog):
+        report.add(result)
+    report.fit_ratings()
+    return report
+
+
+def swiss(loadouts=None, rounds=7, fights=100, workers=None, seed=0, chunksize=None, shared_catalog=None):
+    """
+    Plays 'rounds' of a Swiss tournament: loadouts with similar scores are paired, rematches are avoided if possible
+    Returns TournamentReport. Workers attach to 'shared_catalog' if given, as in round_robin()
+    """
+    if loadouts is None:
+        loadouts = enumerate_loadouts()
+    report = TournamentReport(loadouts)
+    played = set()
+    order = list(range(len(loadouts)))
+    random.Random(seed).shuffle(order)  # initial seeding
+    with create_executor(workers, shared_catalog) as executor:
+        for _ in range(rounds):
+            ranked = sorted(order, key=lambda index: -report.score(index))
+            tasks = []
+            while len(ranked) > 1:
+                first = ranked.pop(0)
+                opponent = next((index for index in ranked if (min(first, index), max(first, index)) not in played), ranked[0])
+                ranked.remove(opponent)
+                pair = (min(first, opponent), max(first, opponent))
+                played.add(pair)
+                tasks.append((pair[0], pair[1], loadouts[pair[0]], loadouts[pair[1]], fights, matchup_seed(seed, *pair)))
+            for result in executor.map(run_matchup, tasks, chunksize=chunksize or calculate_chunksize(len(tasks), workers)):
+                report.add(result)
+    report.fit_ratings()
+    return report
+
+
+def calculate_chunksize(tasks_count, workers):  # returns int
+    workers = workers or os.cpu_count() or 1
+    return max(1, tasks_count // (workers * 4))  # a few chunks per worker balance uneven matchups
+
+
+def create_executor(workers=None, shared_catalog=None):  # returns ProcessPoolExecutor
+    if shared_catalog is None:
+        return ProcessPoolExecutor(workers)
+    import sharedcatalog
+    return ProcessPoolExecutor(workers, initializer=sharedcatalog.install, initargs=(shared_catalog.name,))
+
+
+def run_tasks(tasks, workers=None, chunksize=None, shared_catalog=None):  # returns iterator of run_matchup() results
+    if workers == 1:
+        return map(run_matchup, tasks)
+    executor = create_executor(workers, shared_catalog)
+    try:
+        return list(executor.map(run_matchup, tasks, chunksize=chunksize or calculate_chunksize(len(tasks), workers)))
+    finally:
+        executor.shutdown()
+
+
+def main():
+    """Runs a round-robin tournament of all legal loadouts"""
+    print(round_robin(fights=20))
+
+
+if __name__ == "__main__":
+    main()
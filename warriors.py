@@ -4,18 +4,24 @@
 Warriors fight
 """
 
-from items import Inventory, WEAPONS, SHIELDS, ARMORS
-from effects import Effect, EFFECTS
+from items import Inventory, get_catalog
+from effects import Effect, Effects, EFFECTS
 from phases import Initiative, Attack, OFFHAND_MODIFIER
+from matchup import get_matchup
+from dice import Dice
 import herald
-from copy import deepcopy
+import profiling
+from herald import TextHerald
+from collections import deque
 
 # TODO: get rid of Python2 style super() calls in constructors
 
 
 class Warrior(object):
     """
-    Equips, drops, gains, discards. Has: name, health, offense, defense, inventory, effects
+    Equips, drops, gains, discards. Has: name, health, offense, defense, inventory, effects, herald
+    'effects' are effects.Effects (a list of Effect may be passed instead)
+    snapshot() and restore() save and bring back the state a battle changes (health, offense, defense, effects)
     """
 
     def __init__(self, name,
@@ -23,7 +29,8 @@ class Warrior(object):
                  offense=10,
                  defense=10,
                  inventory=None,  # Inventory accepts only weapon, armor and items in constructor
-                 effects=None):
+                 effects=None,
+                 herald=None):  # announces equipping/dropping, TextHerald if not given
 
         super(Warrior, self).__init__()
 
@@ -36,9 +43,15 @@ class Warrior(object):
         else:
             self.inventory = inventory
         if effects is None:
-            self.effects = []
-        else:
+            self.effects = Effects()
+        elif isinstance(effects, Effects):
             self.effects = effects
+        else:
+            self.effects = Effects(effects)
+        if herald is None:
+            self.herald = TextHerald()
+        else:
+            self.herald = herald
 
     def __str__(self):
         inv_list = [self.inventory.weapon,
@@ -47,99 +60,213 @@ class Warrior(object):
                     self.inventory.armor] + self.inventory.items
         return "{} (*{}*/{}/{}), inventory: {}, effects: {}".format(self.name, self.health, self.offense, self.defense, [item.name for item in inv_list if item is not None], [effect.name for effect in self.effects])
 
+    def snapshot(self):  # returns (health, offense, defense, effects) to be passed to restore()
+        return self.health, self.offense, self.defense, self.effects.copy()
+
+    def restore(self, snapshot):
+        self.health, self.offense, self.defense, effects = snapshot
+        self.effects = effects.copy()
+
+    def copy(self):  # returns Warrior
+        """A copy with its own inventory and effects, items themselves are shared"""
+        import copy
+        inventory = copy.copy(self.inventory)
+        inventory.items = list(self.inventory.items)
+        return Warrior(self.name, self.health, self.offense, self.defense, inventory, self.effects.copy(), self.herald)
+
     def equip_weapon(self, weapon):
-        print(self.name, "equips a weapon:", str(weapon))
+        self.herald.report_equip(self, "a weapon", weapon)
         self.inventory.weapon = weapon
 
     def drop_weapon(self):
-        print(self.name, "drops a weapon")
+        self.herald.report_drop(self, "a weapon")
         self.inventory.weapon = None
 
     def equip_offhand_weapon(self, offhand_weapon):
-        print(self.name, "equips an off-hand weapon:", str(offhand_weapon))
+        self.herald.report_equip(self, "an off-hand weapon", offhand_weapon)
         self.inventory.offhand_weapon = offhand_weapon
 
     def drop_offhand_weapon(self):
-        print(self.name, "drops an off-hand weapon")
+        self.herald.report_drop(self, "an off-hand weapon")
         self.inventory.offhand_weapon = None
 
     def equip_shield(self, shield):
-        print(self.name, "equips a shield:", str(shield))
+        self.herald.report_equip(self, "a shield", shield)
         self.inventory.shield = shield
 
     def drop_shield(self):
-        print(self.name, "drops a shield")
+        self.herald.report_drop(self, "a shield")
         self.inventory.shield = None
 
     def equip_armor(self, armor):
-        print(self.name, "equips an armor:", str(armor))
+        self.herald.report_equip(self, "an armor", armor)
         self.inventory.armor = armor
 
     def drop_armor(self):
-        print(self.name, "drops an armor")
+        self.herald.report_drop(self, "an armor")
         self.inventory.armor = None
 
     def equip_item(self, item):
-        print(self.name, "equips an inventory item:", str(item))
+        self.herald.report_equip(self, "an inventory item", item)
         self.inventory.items.append(item)
 
     def drop_item(self, item):
-        print(self.name, "drops an inventory item:", str(item))
+        self.herald.report_drop(self, "an inventory item", item)
         self.inventory.items.remove(item)
 
-    def gain_effect(self, effect):
-        print(self.name, "gains an effect:", effect.name)
-        self.effects.append(effect)
+    # a battle passes its own herald here, so that a headless battle stays silent
+    def gain_effect(self, effect, herald=None):
+        (self.herald if herald is None else herald).report_gain_effect(self, effect)
+        self.effects.add(effect)
 
-    def discard_effect(self, effect):
-        print(self.name, "discards an effect:", effect.name)
+    def discard_effect(self, effect, herald=None):
+        (self.herald if herald is None else herald).report_discard_effect(self, effect)
         self.effects.remove(effect)
 
+    def discard_effects(self, name, herald=None):
+        """Discards all effects named 'name' in the order they were gained"""
+        for effect in self.effects.of(name):
+            self.discard_effect(effect, herald)
+
 
 class Battle(object):
-    """Commences. Has: attacker, defender, rounds, base_attacker, base_defender"""
+    """
+    Commences, resets, replays. Has: attacker, defender, rounds, rounds_count, stats, finished, warriors, snapshots, herald, dice, seed, profiler
+    Pass a herald.Herald() for a silent (headless) battle, TextHerald is used if not given
+    All rolls come from the battle's own dice.Dice made from 'seed' (int, numpy.random.Generator or Dice instance),
+    a fresh seed is drawn if not given. The same seed and the same warriors always make the same battle
+    All rounds are kept in 'rounds' unless 'keep_rounds' limits them to the last K (0 keeps none, only 'stats')
+    'warriors' are the attacker and the defender as passed in, 'snapshots' their states at the start, so reset()
+    can rerun the battle with the same warriors without copying them
+    commence() fights the whole battle, a caller that needs to interleave it with other work can instead call
+    resolve_initiative() and then fight_round() until 'finished'
+    Phases, rolls and herald calls are timed by 'profiler' (profiling.Profiler) if given or if profiling is enabled,
+    the timing wrappers stay installed from resolve_initiative() until the battle is finished (or reset())
+    """
 
-    def __init__(self, attacker, defender):
+    def __init__(self, attacker, defender, herald=None, seed=None, keep_rounds=None, profiler=None):
         super(Battle, self).__init__()
 
         self.attacker = attacker
         self.defender = defender
-        self.rounds = []
-        # for future use
-        self.base_attacker = deepcopy(attacker)
-        self.base_defender = deepcopy(defender)
+        if herald is None:
+            self.herald = TextHerald()
+        else:
+            self.herald = herald
+        self.keep_rounds = keep_rounds
+        self.profiler = profiling.PROFILER if profiler is None else profiler
+        if self.profiler is not None:
+            self.herald = profiling.ProfilingHerald(self.herald, self.profiler)
+        # for resets and replays
+        self.warriors = (attacker, defender)
+        self.snapshots = (attacker.snapshot(), defender.snapshot())
+        self.profiling = False  # holds the profiling wrappers (see profiling.acquire()) from initiative to its end
+        self.start(seed)
+
+    def start(self, seed):
+        self.stop_profiling()
+        if isinstance(seed, Dice):
+            self.dice = seed
+        else:
+            self.dice = Dice(seed)
+        self.seed = self.dice.seed
+        if self.keep_rounds is None:
+            self.rounds = []
+        else:
+            self.rounds = deque(maxlen=self.keep_rounds)
+        self.rounds_count = 0
+        self.stats = BattleStats()
+        self.finished = False
+
+    def start_profiling(self):
+        if not self.profiling:
+            profiling.acquire()
+            self.profiling = True
+
+    def stop_profiling(self):
+        if self.profiling:
+            self.profiling = False
+            profiling.release()
 
     def resolve_initiative(self):
-        herald.introduce_battle(self.attacker, self.defender)
+        if self.profiler is not None:
+            self.start_profiling()
+            with profiling.Activation(self.profiler):
+                self.roll_initiative()
+        else:
+            self.roll_initiative()
+
+    def roll_initiative(self):
+        self.herald.introduce_battle(self.attacker, self.defender)
 
         while True:
-            initiative = Initiative(self.attacker, self.defender)
+            initiative = Initiative(self.attacker, self.defender, self.dice)
 
             if initiative.result == "attacker":
-                herald.report_initiative(initiative)
+                self.herald.report_initiative(initiative)
                 break
             elif initiative.result == "draw":
-                herald.report_initiative(initiative)
+                self.herald.report_initiative(initiative)
                 continue
             elif initiative.result == "defender":
-                herald.report_initiative(initiative)
+                self.herald.report_initiative(initiative)
                 self.swap_sides()
                 break
 
     def commence(self):
         self.resolve_initiative()
 
-        while True:
-            herald.introduce_round(self.attacker, self.defender, len(self.rounds) + 1)
-            battle_round = BattleRound(self.attacker, self.defender)
-            self.rounds.append(battle_round)
-
-            if self.attacker.health <= 0 or self.defender.health <= 0:
-                herald.close_battle(self.attacker, self.defender, len(self.rounds))
-                break
-
-            battle_round.resolve_effects()
+        while not self.finished:
+            self.fight_round()
+
+    def fight_round(self):  # returns BattleRound
+        if self.profiler is None:
+            return self.play_round()
+        self.start_profiling()
+        try:
+            with profiling.Activation(self.profiler):
+                return self.play_round()
+        finally:
+            if self.finished:
+                self.stop_profiling()
+
+    def play_round(self):  # returns BattleRound
+        self.rounds_count += 1
+        self.herald.introduce_round(self.attacker, self.defender, self.rounds_count)
+        battle_round = BattleRound(self.attacker, self.defender, self.herald, self.dice)
+        self.rounds.append(battle_round)
+        self.stats.add(battle_round)
+
+        if self.attacker.health <= 0 or self.defender.health <= 0:
+            self.herald.close_battle(self.attacker, self.defender, self.rounds_count)
+            self.finished = True
+            return battle_round
+        battle_round.resolve_effects()
+        if self.attacker.health <= 0:  # its own effects may take the attacker's health too
+            self.herald.close_battle(self.attacker, self.defender, self.rounds_count)
+            self.finished = True
+        else:
             self.swap_sides()
+        return battle_round
+
+    def reset(self, seed=None):
+        """
+        Brings the warriors back to their states at the start, ready to commence again
+        The same seed (if not given) fights the same battle again, another one makes a new battle
+        """
+        for warrior, snapshot in zip(self.warriors, self.snapshots):
+            warrior.restore(snapshot)
+        self.attacker, self.defender = self.warriors
+        self.start(self.seed if seed is None else seed)
+
+    def replay(self, herald=None):  # returns new, commenced Battle
+        """Fights this battle again from copies of the warriors it started with"""
+        attacker, defender = (warrior.copy() for warrior in self.warriors)
+        attacker.restore(self.snapshots[0])
+        defender.restore(self.snapshots[1])
+        battle = Battle(attacker, defender, herald, self.seed)
+        battle.commence()
+        return battle
 
     def swap_sides(self):
         temp = self.attacker
@@ -147,51 +274,86 @@ class Battle(object):
         self.defender = temp
 
 
+class BattleStats(object):
+    """
+    Has: attacks, hits, damage - dicts keyed by the attacking warrior (not by name, two warriors may share one)
+    Aggregates of all rounds of a battle that are kept even if the rounds themselves aren't
+    """
+
+    def __init__(self):
+        super(BattleStats, self).__init__()
+        self.attacks = {}
+        self.hits = {}
+        self.damage = {}
+
+    def add(self, battle_round):
+        attacker = battle_round.attacker
+        for attack in (battle_round.attack, battle_round.offhand_attack):
+            if attack is None:
+                continue
+            self.attacks[attacker] = self.attacks.get(attacker, 0) + 1
+            if attack.result >= 0:
+                self.hits[attacker] = self.hits.get(attacker, 0) + 1
+            if attack.dmg_dealt is not None:
+                self.damage[attacker] = self.damage.get(attacker, 0) + attack.dmg_dealt.result
+
+
 class BattleRound(object):
-    """Has: attacker, defender, attack, offhand_attack"""
+    """Has: attacker, defender, matchup, attack, offhand_attack, herald"""
+
+    __slots__ = ("attacker", "defender", "matchup", "attack", "offhand_attack", "herald")
 
-    def __init__(self, attacker, defender):
+    def __init__(self, attacker, defender, herald=None, dice=None):
         super(BattleRound, self).__init__()
         self.attacker = attacker
         self.defender = defender
-        self.attack = Attack(self.attacker, self.defender)
-        herald.report_attack(self.attack)
-        if self.attacker.inventory.offhand_weapon is not None:
-            self.offhand_attack = Attack(self.attacker, self.defender, OFFHAND_MODIFIER)
-            herald.report_attack(self.offhand_attack)
+        if herald is None:
+            self.herald = TextHerald()
+        else:
+            self.herald = herald
+        self.matchup = get_matchup(self.attacker.inventory, self.defender.inventory)
+        self.attack = Attack(self.attacker, self.defender, None, self.matchup, dice)
+        self.herald.report_attack(self.attack)
+        if self.matchup.weapons[1] is not None:
+            self.offhand_attack = Attack(self.attacker, self.defender, OFFHAND_MODIFIER, self.matchup, dice)
+            self.herald.report_attack(self.offhand_attack)
         else:
             self.offhand_attack = None
 
     def resolve_effects(self):
         # TODO: delegate effects parsing logic to a seperate class
         # MISS effect - remove all if there was at least one hit, apply if otherwise
-        if self.offhand_attack is None:
-            if self.attack.result < 0:
-                self.attacker.gain_effect(Effect(EFFECTS["miss"]))
-            else:
-                # clear all MISS effects on the attacker
-                for miss in [effect for effect in self.attacker.effects if effect.name == EFFECTS["miss"]]:
-                    self.attacker.discard_effect(miss)
-        else:
-            if self.attack.result < 0 and self.offhand_attack.result < 0:
-                self.attacker.gain_effect(Effect(EFFECTS["miss"]))
-            else:
-                # clear all MISS effects on the attacker
-                for miss in [effect for effect in self.attacker.effects if effect.name == EFFECTS["miss"]]:
-                    self.attacker.discard_effect(miss)
+        if self.attack.result < 0 and (self.offhand_attack is None or self.offhand_attack.result < 0):
+            self.attacker.gain_effect(Effect(EFFECTS["miss"]), self.herald)
+        elif self.attacker.effects.count(EFFECTS["miss"]) > 0:
+            self.attacker.discard_effects(EFFECTS["miss"], self.herald)
+
+        # attacker's effects change its health once per its round (see effects.MODIFIERS), then the ones with a
+        # duration run out
+        self.attacker.health += self.attacker.effects.modifier("health")
+        for effect in self.attacker.effects.tick():
+            self.herald.report_discard_effect(self.attacker, effect)
+
+
+def replay(seed, attacker, defender, herald=None):  # returns commenced Battle
+    """Reconstructs a battle from its seed and the warriors (in the same order and state) it started with"""
+    battle = Battle(attacker, defender, herald, seed)
+    battle.commence()
+    return battle
 
 
 def main():
     """Runs the game"""
+    catalog = get_catalog()
     dagobert = Warrior("Dagobert")
-    dagobert.equip_weapon(WEAPONS["Longsword"])
-    dagobert.equip_shield(SHIELDS["Tower Shield"])
-    dagobert.equip_armor(ARMORS["Chainmail"])
+    dagobert.equip_weapon(catalog.weapons["Longsword"])
+    dagobert.equip_shield(catalog.shields["Tower Shield"])
+    dagobert.equip_armor(catalog.armors["Chainmail"])
 
     rogbar = Warrior("Rogbar")
-    rogbar.equip_weapon(WEAPONS["Longsword"])
-    rogbar.equip_offhand_weapon(WEAPONS["Short Sword"])
-    rogbar.equip_armor(ARMORS["Chainmail"])
+    rogbar.equip_weapon(catalog.weapons["Longsword"])
+    rogbar.equip_offhand_weapon(catalog.weapons["Short Sword"])
+    rogbar.equip_armor(catalog.armors["Chainmail"])
 
     herald.report(dagobert)
     herald.report(rogbar)